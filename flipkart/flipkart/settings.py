@@ -45,6 +45,8 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
 MIDDLEWARE = [
+    'flipkart_app.instrumentation.RequestMetricsMiddleware',  # first, so it times everything below
+    'flipkart_app.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +60,7 @@ ROOT_URLCONF = 'flipkart.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'flipkart_app.instrumentation.InstrumentedTemplates',  # DjangoTemplates, timed
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,13 +80,113 @@ WSGI_APPLICATION = 'flipkart.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# SQLite by default. Set DJANGO_DB_ENGINE (e.g. django.db.backends.postgresql) with
+# DJANGO_DB_NAME/HOST/PORT/USER/PASSWORD to use a networked database instead.
+# Connections are kept open between requests for DJANGO_DB_CONN_MAX_AGE seconds and
+# checked before reuse. Django 4.2 has no built-in pool: put PgBouncer (transaction
+# pooling) in front of PostgreSQL and set DJANGO_DB_POOLER=1. DJANGO_DB_REPLICA_HOST
+# adds a read replica that serves the catalog pages (see flipkart_app/database.py).
+# Compare the setups with `manage.py benchmark_database`.
+
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 0)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'flipkart'),
+            'HOST': os.environ.get('DJANGO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Server-side cursors do not survive transaction pooling
+            'DISABLE_SERVER_SIDE_CURSORS': bool(os.environ.get('DJANGO_DB_POOLER')),
+        }
+    }
+    if os.environ.get('DJANGO_DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['DJANGO_DB_REPLICA_HOST'],
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['flipkart_app.database.CatalogReplicaRouter']
+
+# Database the catalog pages read from
+CATALOG_READ_DATABASE = 'replica' if 'replica' in DATABASES else 'default'
+
+# Run on every new SQLite connection: writers wait up to busy_timeout ms for the
+# lock instead of failing with "database is locked", and synchronous=NORMAL skips
+# an fsync per commit (durable under WAL except for the last commits before a
+# power loss). Negative cache_size is in KiB.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'busy_timeout': 10000,
+    'cache_size': -32000,
+    'mmap_size': 268435456,
+    'temp_store': 'memory',
+}
+# Journal mode is stored in the database file itself, so it is left alone unless
+# asked for: DJANGO_SQLITE_JOURNAL_MODE=wal on a deployment lets readers carry on
+# during a write (it keeps -wal and -shm files next to the database).
+SQLITE_JOURNAL_MODE = os.environ.get('DJANGO_SQLITE_JOURNAL_MODE')
+
+
+# Cache
+# Local memory by default; point DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) so all workers see the
+# same catalog invalidations.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'flipkart'),
     }
 }
 
+# Categories and home-page fragments are cached until a Category or Product changes,
+# or for CATALOG_CACHE_TIMEOUT seconds at most
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 600
+
+
+# Lower bounds of the product list's price and discount (percent) facet options
+FACET_PRICE_BANDS = [0, 500, 1000, 2500, 5000, 10000, 25000]
+FACET_DISCOUNT_BANDS = [0, 10, 25, 50]
+# Sellers listed in the seller facet: the ones with the most products, plus any ticked
+FACET_TOP_SELLERS = 10
+
+# Orders per order-history page (page and API)
+ORDER_HISTORY_PAGE_SIZE = 10
+
+# Orders per page of the seller dashboard's recent-orders list
+SELLER_ORDERS_PAGE_SIZE = 25
+
+# Reviews per page on the product detail page
+REVIEWS_PAGE_SIZE = 10
+
+# Per-request timings: per-view histograms served at /metrics/requests/, and
+# Server-Timing headers in DEBUG. Outside DEBUG both are only for staff and for
+# requests from INTERNAL_IPS that did not come through a proxy (see
+# flipkart_app/instrumentation.py).
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', '1') == '1'
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
+# N+1 query detection for development: '' (off), 'log' or 'raise'. Tests opt in per test
+# with flipkart_app.nplusone.detect_nplusone. A query shape counts as N+1 once it runs
+# NPLUSONE_THRESHOLD times in one request with different parameters.
+NPLUSONE_DETECTOR = os.environ.get('NPLUSONE_DETECTOR', '')
+NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 2))
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -127,6 +229,56 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# ML models
+# Checkpoints are loaded lazily on first use. Set ML_PRELOAD_MODELS=1 and run gunicorn
+# with --preload to load them once in the master so forked workers share the weights.
+
+ML_MODEL_DIR = BASE_DIR / 'flipkart_app' / 'ml_models'
+ML_MODEL_CHECKPOINTS = {
+    'object_detection': 'packed_and_unpacked.pt',
+    'expiry_check': 'expmrp.pt',
+    'freshness_check': 'fruit.pth',
+    # 'product_count': 'product_count_model.pt',
+}
+ML_PRELOAD_MODELS = os.environ.get('ML_PRELOAD_MODELS') == '1'
+
+# Stored verification results are keyed by image hash and model version; the version
+# is a hash of the checkpoint file unless pinned here, e.g. {'expiry_check': 'v2'}.
+ML_MODEL_VERSIONS = {}
+# Memory budget for decoded image tensors kept by each inference worker
+ML_TENSOR_CACHE_BYTES = 256 * 1024 * 1024
+
+# Single-order verifications arriving within ML_BATCH_MAX_WAIT seconds of each other
+# are run together, up to ML_BATCH_SIZE images per forward pass.
+ML_BATCH_SIZE = 32
+ML_BATCH_MAX_WAIT = 0.01
+ML_DECODE_THREADS = 4
+
+# Out-of-process inference (python manage.py run_inference_workers). Sellers get a
+# 503 once ML_QUEUE_MAX_SIZE verification jobs are waiting.
+ML_INFERENCE_WORKERS = int(os.environ.get('ML_INFERENCE_WORKERS', 2))
+ML_INFERENCE_THREADS = int(os.environ.get('ML_INFERENCE_THREADS', 1))
+ML_INFERENCE_POLL_INTERVAL = 0.2
+ML_QUEUE_MAX_SIZE = 500
+
+# Orders after the one a seller is looking at in the processing queue whose
+# verification is queued ahead of time
+ML_PREFETCH_DEPTH = 3
+
+# Packing scale on a serial port (e.g. '/dev/ttyUSB0' or 'COM4'); unset disables it
+SCALE_PORT = os.environ.get('SCALE_PORT')
+SCALE_BAUD_RATE = 9600
+# Packing stations with their own scales, as {station_id: port}
+SCALE_STATIONS = {}
+# The scales are read by `manage.py run_scales`, which serves their readings to the
+# web workers on this local address. The scale-reading endpoint waits at most
+# SCALE_READING_MAX_WAIT seconds for a newer reading.
+SCALE_FEED_ADDRESS = ('127.0.0.1', int(os.environ.get('SCALE_FEED_PORT', 8765)))
+SCALE_READING_MAX_WAIT = 1
+# Directory for binary recordings of every scale sample (see export_scale_samples);
+# per-sample text logs are only written at DEBUG level
+SCALE_RECORD_DIR = os.environ.get('SCALE_RECORD_DIR')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path
+from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
 from flipkart_app import views
@@ -12,7 +13,7 @@ urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),  # Class-based view for the homepage (product list)
 
     # Product Listings and Detail Views
-    path('products/', views.product_list, name='product_list'),  # Product list page with filtering
+    path('products/', views.ProductListView.as_view(), name='product_list'),  # Product list page with facet filters
     path('product/<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),  # Product detail page
 
     # Cart Management
@@ -27,6 +28,7 @@ urlpatterns = [
     # User Profile and Order History
     path('user_profile/', views.profile, name='profile'),  # User profile management
     path('order-history/', views.order_history, name='order_history'),  # View past orders
+    path('api/order-history/', views.order_history_api, name='order_history_api'),  # Past orders as JSON, cursor-paginated
 
     # User Authentication (Login, Register, Logout)
     path('login/', views.user_login, name='login'),  # User login
@@ -45,18 +47,27 @@ urlpatterns = [
     # Seller Dashboard and Product Management
     path('seller-dashboard/', views.seller_dashboard, name='seller_dashboard'),  # Seller dashboard page
     path('seller/manage-products/', views.manage_products, name='manage_products'),  # Manage seller's products
-    path('seller/add-product/', views.add_product, name='add_product'),  # Add new product
-    path('seller/edit-product/<int:product_id>/', views.edit_product, name='edit_product'),  # Edit existing product
-    path('seller/orders/', views.seller_orders, name='seller_orders'),  # View seller orders
+    path('seller/add-product/', views.add_edit_product, name='add_product'),  # Add new product
+    path('seller/edit-product/<int:product_id>/', views.add_edit_product, name='edit_product'),  # Edit existing product
+    path('seller/orders/', views.order_processing, name='seller_orders'),  # View seller orders
 
     # ML Integration for Seller (Order Processing)
-    path('seller/order-processing/<int:order_id>/', views.order_processing, name='order_processing'),  # Order processing view
-    path('seller/object-detection-result/<int:order_id>/', views.object_detection_result, name='object_detection_result'),  # Object detection result
-    path('seller/expiry-brand-detection/<int:order_id>/', views.expiry_brand_detection, name='expiry_brand_detection'),  # Expiry & brand detection result
-    path('seller/freshness-detection/<int:order_id>/', views.freshness_detection, name='freshness_detection'),  # Freshness detection result
-    path('seller/product-count-verification/<int:order_id>/', views.product_count_verification, name='product_count_verification'),  # Product count verification
-    path('seller/weight-verification/<int:order_id>/', views.weight_verification, name='weight_verification'),  # Weight verification result
-    path('seller/verification-summary/<int:order_id>/', views.verification_summary, name='verification_summary'),  # Final verification summary
+    path('seller/order-processing/', views.order_processing, name='order_processing'),  # Processing queue, one order at a time
+    path('seller/order-processing/<int:order_id>/complete/', views.complete_processing, name='complete_processing'),
+    path('seller/processing-metrics/', views.processing_metrics, name='processing_metrics'),  # Queue throughput and time-to-verdict
+    path('seller/object-detection-result/<int:order_id>/', TemplateView.as_view(template_name='Seller/object_detection_result.html'), name='object_detection_result'),  # Object detection result
+    path('seller/expiry-brand-detection/<int:order_id>/', TemplateView.as_view(template_name='Seller/expiry_brand_detection.html'), name='expiry_brand_detection'),  # Expiry & brand detection result
+    path('seller/freshness-detection/<int:order_id>/', TemplateView.as_view(template_name='Seller/freshness_detection.html'), name='freshness_detection'),  # Freshness detection result
+    path('seller/product-count-verification/<int:order_id>/', TemplateView.as_view(template_name='Seller/product_count.html'), name='product_count_verification'),  # Product count verification
+    path('seller/weight-verification/<int:order_id>/', TemplateView.as_view(template_name='Seller/weight_verification.html'), name='weight_verification'),  # Weight verification result
+    path('seller/verification-summary/<int:order_id>/', views.ml_integration, name='verification_summary'),  # Final verification summary
+
+    path('seller/verification-status/<int:job_id>/', views.verification_status, name='verification_status'),  # Polled by the summary page
+    path('seller/scale-reading/', views.scale_reading, name='scale_reading'),  # Latest stable weight on the scale
+    path('seller/stations/<str:station_id>/bind/<int:order_id>/', views.bind_station_order, name='bind_station_order'),
+
+    # Per-view timing histograms of this process
+    path('metrics/requests/', views.request_metrics, name='request_metrics'),
 
     # Static and Media Files (for media uploads like product images)
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
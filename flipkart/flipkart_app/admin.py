@@ -1,10 +1,66 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from django.utils.html import format_html
+
+from .database import estimated_count
 from .models import (
     User, UserProfile, Customer, Seller, Category, Product, ProductVariant, 
-    Cart, CartItem, Order, OrderItem, Review, WishlistItem, Registration
+    Cart, CartItem, Order, OrderItem, Review, WishlistItem, Registration, VerificationJob,
+    VerificationResult, SellerOrder, SellerDailyStats, OrderProcessingLog
 )
 
+# Unfiltered changelists of tables bigger than this show the database's row estimate instead of COUNT(*)
+ESTIMATED_COUNT_ABOVE = 100_000
+
+# Paginator that counts big unfiltered tables from the database's statistics
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > ESTIMATED_COUNT_ABOVE:
+            return estimate
+        return super().count
+
+# Admin for tables that grow without bound: estimated page counts, and no second
+# COUNT(*) for the "n total" link when a filter is applied
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+# List filter for a foreign key with too many targets to list: an autocomplete box
+# served by the related model's admin search instead of a link per related object.
+# The admin using it adds the box's scripts to its media (see ProductAdmin.media).
+class AutocompleteListFilter(admin.FieldListFilter):
+    template = 'admin/autocomplete_list_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        related_admin = model_admin.admin_site._registry[field.related_model]
+        self.form_field = forms.ModelChoiceField(
+            related_admin.get_queryset(request), required=False,
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={'onchange': 'this.form.submit()'}),
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'widget': self.form_field.widget.render(self.lookup_kwarg, self.lookup_val),
+            # The rest of the current filters, resubmitted with the form
+            'params': [(name, value) for name, value in changelist.params.items()
+                       if name not in (self.lookup_kwarg, PAGE_VAR)],
+        }
+
 # Custom Admin for User with customer and seller filtering
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -17,6 +73,7 @@ class UserAdmin(admin.ModelAdmin):
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'user_type', 'phone_number', 'city', 'state', 'pincode')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'phone_number', 'city')
     list_filter = ('user_type',)
 
@@ -24,6 +81,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('user_profile', 'loyalty_points')
+    list_select_related = ('user_profile__user',)
     search_fields = ('user_profile__user__username',)
     ordering = ('-loyalty_points',)
 
@@ -34,6 +92,10 @@ class SellerAdmin(admin.ModelAdmin):
     search_fields = ('company_name', 'gst_number', 'user_profile__user__username')
     list_filter = ('is_verified',)
 
+    def get_queryset(self, request):
+        # Seller.__str__ shows the username, in this list and in autocomplete results
+        return super().get_queryset(request).select_related('user_profile__user')
+
 # Custom Admin for Category with image preview
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -53,13 +115,19 @@ class ProductVariantInline(admin.TabularInline):
 
 # Custom Admin for Product with image preview and inlines for variants
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ('name', 'category', 'price', 'discounted_price', 'stock', 'is_featured', 'display_image')
-    list_filter = ('category', 'is_featured', 'seller')
+    list_filter = ('category', 'is_featured', ('seller', AutocompleteListFilter))
+    list_select_related = ('category',)
     search_fields = ('name', 'description', 'seller__company_name')
     list_editable = ('price', 'stock', 'is_featured')
+    autocomplete_fields = ('seller', 'category')
     inlines = [ProductVariantInline]
 
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(Product._meta.get_field('seller'), self.admin_site).media
+
     def display_image(self, obj):
         if obj.image:
             return format_html('<img src="{}" width="50" height="50" />', obj.image.url)
@@ -69,6 +137,7 @@ class ProductAdmin(admin.ModelAdmin):
     def discounted_price(self, obj):
         return obj.discounted_price()
     discounted_price.short_description = 'Discounted Price'
+    discounted_price.admin_order_field = 'effective_price'
 
 # Inline for Cart Items in the Cart admin
 class CartItemInline(admin.TabularInline):
@@ -76,15 +145,23 @@ class CartItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('product', 'quantity')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product__category')
+
 # Custom Admin for Cart with inline items
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdmin):
     list_display = ('user', 'get_total', 'created_at', 'updated_at')
+    list_select_related = ('user',)
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
     def get_total(self, obj):
         return obj.get_total()
     get_total.short_description = 'Total'
+    get_total.admin_order_field = 'total'
 
 # Inline for Order Items in the Order admin
 class OrderItemInline(admin.TabularInline):
@@ -92,14 +169,18 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('product', 'quantity', 'price', 'get_subtotal')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product__category')
+
     def get_subtotal(self, obj):
         return obj.get_subtotal()
     get_subtotal.short_description = 'Subtotal'
 
 # Custom Admin for Order with inline order items
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ('user', 'status', 'total_amount', 'created_at', 'updated_at')
+    list_select_related = ('user',)
     list_filter = ('status',)
     search_fields = ('user__username', 'shipping_address')
     inlines = [OrderItemInline]
@@ -108,10 +189,56 @@ class OrderAdmin(admin.ModelAdmin):
         return obj.total_amount
     total_amount.short_description = 'Total'
 
+# Custom Admin for ML verification jobs
+@admin.register(VerificationJob)
+class VerificationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('order__user',)
+    readonly_fields = ('claimed_by', 'result', 'error', 'started_at', 'finished_at')
+
+# Custom Admin for stored ML verification results
+@admin.register(VerificationResult)
+class VerificationResultAdmin(admin.ModelAdmin):
+    list_display = ('order', 'model_name', 'model_version', 'label', 'created_at')
+    list_filter = ('model_name', 'model_version')
+    list_select_related = ('order__user',)
+
+# Custom Admin for the seller dashboard's precomputed tables (maintained by signals
+# and `manage.py reconcile_seller_metrics`, so read-only here)
+@admin.register(SellerDailyStats)
+class SellerDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('seller', 'date', 'orders', 'revenue', 'units', 'pending', 'cancelled')
+    list_filter = ('date',)
+    list_select_related = ('seller__user_profile__user',)
+    raw_id_fields = ('seller',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(SellerOrder)
+class SellerOrderAdmin(admin.ModelAdmin):
+    list_display = ('order', 'seller', 'status', 'revenue', 'units', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('order__user', 'seller__user_profile__user')
+    raw_id_fields = ('seller', 'order')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# Custom Admin for the processing-queue log behind the throughput and time-to-verdict metrics
+@admin.register(OrderProcessingLog)
+class OrderProcessingLogAdmin(admin.ModelAdmin):
+    list_display = ('order', 'seller', 'opened_at', 'verdict_ready_at_open', 'completed_at')
+    list_filter = ('verdict_ready_at_open',)
+    list_select_related = ('order__user', 'seller__user_profile__user')
+    raw_id_fields = ('seller', 'order', 'job')
+
 # Custom Admin for Reviews
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('product', 'user', 'rating', 'created_at')
+    list_select_related = ('product__category', 'user')
     search_fields = ('product__name', 'user__username')
     list_filter = ('rating', 'created_at')
 
@@ -119,6 +246,7 @@ class ReviewAdmin(admin.ModelAdmin):
 @admin.register(WishlistItem)
 class WishlistItemAdmin(admin.ModelAdmin):
     list_display = ('user', 'product', 'added_at')
+    list_select_related = ('user', 'product__category')
     search_fields = ('user__username', 'product__name')
     list_filter = ('added_at',)
 
@@ -126,6 +254,7 @@ class WishlistItemAdmin(admin.ModelAdmin):
 @admin.register(Registration)
 class RegistrationAdmin(admin.ModelAdmin):
     list_display = ('user', 'get_first_name', 'get_last_name', 'get_email', 'date_registered')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email')
 
     def get_first_name(self, obj):
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FlipkartAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flipkart_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the signal receivers)
+
+        # Warm-up hook: load the ML models once before gunicorn forks its workers
+        if getattr(settings, 'ML_PRELOAD_MODELS', False):
+            from .ml_models import preload_models
+            preload_models()
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .instrumentation import count_cache
+from .models import Category
+
+_VERSION_KEY = 'catalog:version'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _count(name, hit):
+    with _stats_lock:
+        _stats[f'{name}.hits' if hit else f'{name}.misses'] += 1
+    count_cache(hit)
+
+
+def catalog_version():
+    """
+    Generation number of the cached catalog. Every cache key includes it, so
+    bumping it (invalidate_catalog) makes all cached catalog entries unreachable.
+    """
+    cache = _cache()
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        # A fresh, unique starting point so keys from before an eviction never match
+        cache.add(_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_VERSION_KEY, time.time_ns())
+    return version
+
+
+def invalidate_catalog():
+    cache = _cache()
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _get_or_set(name, key, compute):
+    cache = _cache()
+    key = f'catalog:{catalog_version()}:{key}'
+    value = cache.get(key)
+    _count(name, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.CATALOG_CACHE_TIMEOUT)
+    return value
+
+
+def get_categories():
+    """All categories, ordered by name, from the cache."""
+    return _get_or_set('categories', 'categories', lambda: list(Category.objects.order_by('name')))
+
+
+def get_fragment(name, vary_on, render):
+    """Rendered template fragment `name` for the given vary_on values, from the cache."""
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return _get_or_set('fragments', f'fragment:{name}:{digest}', render)
+
+
+def cache_stats():
+    """Hit and miss counters of this process since it started."""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,77 @@
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem, Order, OrderItem, Product
+from .seller_metrics import refresh_order
+
+
+class EmptyCart(Exception):
+    """Raised when checking out a cart with no items."""
+
+
+class CartChanged(Exception):
+    """Raised when some cart items were ordered or removed by a concurrent request; nothing is changed."""
+
+
+class OutOfStock(Exception):
+    """Raised when the stock of some cart products cannot cover the order; nothing is changed."""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"Not enough stock for: {', '.join(product.name for product in products)}")
+
+
+def place_order(user, shipping_address, phone_number, payment_method):
+    """
+    Turn the user's cart into an order in a single transaction.
+
+    Stock is reserved with one conditional UPDATE per product
+    (stock = stock - n WHERE stock >= n; see ProductQuerySet.reserve_stock), so
+    concurrent checkouts can never oversell: whichever transaction loses the race
+    sees no row updated and the whole checkout rolls back with OutOfStock.
+    Products are updated in id order so transactions that lock rows always take
+    the locks in the same order.
+    Order items are inserted with one bulk_create and the cart is emptied with
+    one DELETE. Items added to the cart while checking out stay in it.
+
+    The cart row is written before its items are read, so two submits of the
+    same cart (a double click) run one after the other and the second finds it
+    empty. Should any item be gone by the time the cart is emptied anyway, the
+    checkout rolls back with CartChanged.
+    """
+    with transaction.atomic():
+        # Write first: on SQLite this takes the write lock up front instead of
+        # upgrading a read lock later, which concurrent writers would deadlock on;
+        # elsewhere it locks the cart row until the order is placed
+        if not Cart.objects.filter(user=user).update(updated_at=timezone.now()):
+            raise EmptyCart()
+        items = list(CartItem.objects.filter(cart__user=user).with_prices())
+        if not items:
+            raise EmptyCart()
+        quantities = Counter()
+        for item in items:
+            quantities[item.product_id] += item.quantity
+
+        short = Product.objects.reserve_stock(quantities)
+        if short:
+            raise OutOfStock([item.product for item in items if item.product_id in short])
+
+        order = Order.objects.create(
+            user=user,
+            shipping_address=shipping_address,
+            phone_number=phone_number,
+            payment_method=payment_method,
+            total_amount=items[0].cart_total,
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=item.product_id, quantity=item.quantity, price=item.unit_price)
+            for item in items
+        )
+        _, deleted = CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+        if deleted.get(CartItem._meta.label, 0) < len(items):
+            raise CartChanged()
+        # bulk_create sends no signals, so update the sellers' metrics here
+        refresh_order(order)
+    return order
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Catalog tables, which only sellers and the admin write to; reads of them inside
+# catalog_reads() may be served by the read replica
+CATALOG_MODELS = {'category', 'product', 'productvariant', 'review', 'relatedproduct'}
+
+_catalog_reads = ContextVar('catalog_reads', default=False)
+
+
+def apply_sqlite_pragmas(connection, pragmas=None):
+    """
+    Run settings.SQLITE_PRAGMAS (or the given pragmas) on a new SQLite connection,
+    and switch to settings.SQLITE_JOURNAL_MODE if one is set.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        journal_mode = getattr(settings, 'SQLITE_JOURNAL_MODE', None)
+        if journal_mode:
+            cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+        for name, value in (settings.SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def estimated_count(queryset):
+    """
+    The database's own estimate of the rows in an unfiltered queryset's table, from
+    its planner statistics, or None if the queryset is filtered or there are no
+    statistics (SQLite only has them once ANALYZE or PRAGMA optimize has run).
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.is_sliced or query.combinator:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # -1 for a table that has never been vacuumed or analyzed
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            estimates = [rows for rows, in cursor.fetchall() if rows >= 0]
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+            estimates = [rows for rows, in cursor.fetchall() if rows is not None]
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if not cursor.fetchone():
+                return None
+            # One row per index, starting with the rows it covers; partial indexes cover fewer
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            estimates = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+        else:
+            return None
+    return max(estimates, default=None)
+
+
+@contextmanager
+def catalog_reads():
+    """Let catalog queries made inside the block go to settings.CATALOG_READ_DATABASE."""
+    token = _catalog_reads.set(True)
+    try:
+        yield
+    finally:
+        _catalog_reads.reset(token)
+
+
+class CatalogReplicaRouter:
+    """
+    Sends catalog reads made inside catalog_reads() to the read replica and every
+    write to the default database. Everything else reads from the default
+    database too, so a customer always sees their own cart and orders straight
+    after changing them; only product pages may lag behind by the replica's delay.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _catalog_reads.get() and model._meta.model_name in CATALOG_MODELS:
+            return settings.CATALOG_READ_DATABASE
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were loaded from the replica
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the default database, so objects from either may be related
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema through replication
+        return db == 'default'
@@ -0,0 +1,538 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q
+
+from .models import Product
+
+# In-memory bitmap index of the catalog for the product list's facets. Every facet
+# value has a compressed bitmap of its product ids (see Bitmap), so the products
+# matching any combination of facets and the counts next to the options are a few
+# ANDs, ORs and bit counts, with no GROUP BY per facet.
+#
+# Each process keeps its own index. After a product change commits, the signals in
+# signals.py re-read the product, and if that moves it to other facet options (most
+# stock changes do not) the new rows are published as change number N of a shared
+# version counter in the catalog cache. Every process replays the changes it has not
+# seen into its index in place, and only rebuilds from the database when it is too
+# far behind or the changes have expired.
+
+_VERSION_KEY = 'facets:version'
+_CHANGE_KEY = 'facets:change:{}'
+# Seconds a published change is kept for the other processes to replay
+_CHANGE_TIMEOUT = 600
+# A process further behind than this many changes rebuilds its index instead
+_REPLAY_LIMIT = 200
+
+# Product columns the facets are computed from (models.FACET_FIELDS lists the same fields)
+FIELDS = ('id', 'category_id', 'seller_id', 'effective_price', 'discount_percentage', 'stock', 'is_featured',
+          'rating_sum', 'review_count')
+
+# Changes to more products than this at once are not published; the other processes rebuild
+_REFRESH_LIMIT = 1000
+
+
+class Facet:
+    """One facet: the option key a product falls under, the filter for an option, and its label."""
+
+    def __init__(self, label, key, q, option_label=str, top=None):
+        self.label = label
+        self.key = key    # product values row -> option key (a string)
+        self.q = q        # option key -> Q matching that option's products
+        self.option_label = option_label
+        self.top = top    # only count this many options, the ones with the most products
+
+
+class BandFacet(Facet):
+    """Options are ranges of a number, from each lower bound up to the next."""
+
+    def __init__(self, label, field, bounds, unit='', suffix=''):
+        self.field, self.bounds, self.unit, self.suffix = field, bounds, unit, suffix
+        super().__init__(label, self._key, self._q, self._option_label)
+
+    def _key(self, row):
+        return str(self.bounds[bisect.bisect_right(self.bounds, row[self.field]) - 1])
+
+    def _range(self, key):
+        index = self.bounds.index(int(key))
+        return self.bounds[index], self.bounds[index + 1] if index + 1 < len(self.bounds) else None
+
+    def _q(self, key):
+        lower, upper = self._range(key)
+        q = Q(**{f'{self.field}__gte': lower})
+        if upper is not None:
+            q &= Q(**{f'{self.field}__lt': upper})
+        return q
+
+    def _option_label(self, key):
+        lower, upper = self._range(key)
+        if upper is None:
+            return f'{self.unit}{lower}{self.suffix} and more'
+        if not lower:
+            return f'Under {self.unit}{upper}{self.suffix}'
+        return f'{self.unit}{lower}{self.suffix} to {self.unit}{upper}{self.suffix}'
+
+
+def _rating_key(row):
+    # Whole stars of the average rating, '0' for unrated
+    return str(row['rating_sum'] // row['review_count']) if row['review_count'] else '0'
+
+
+def _rating_q(key):
+    stars = int(key)
+    if not stars:
+        return Q(review_count=0)
+    return Q(review_count__gt=0, rating_sum__gte=F('review_count') * stars,
+             rating_sum__lt=F('review_count') * (stars + 1))
+
+
+FACETS = {
+    'category': Facet('Category', lambda row: str(row['category_id']), lambda key: Q(category_id=key)),
+    'price': BandFacet('Price', 'effective_price', settings.FACET_PRICE_BANDS, unit='$'),
+    'discount': BandFacet('Discount', 'discount_percentage', settings.FACET_DISCOUNT_BANDS, suffix='%'),
+    'stock': Facet('Availability', lambda row: 'in' if row['stock'] > 0 else 'out',
+                   lambda key: Q(stock__gt=0) if key == 'in' else Q(stock=0),
+                   {'in': 'In stock', 'out': 'Out of stock'}.get),
+    'featured': Facet('Featured', lambda row: 'yes' if row['is_featured'] else 'no',
+                      lambda key: Q(is_featured=key == 'yes'), {'yes': 'Featured', 'no': 'Not featured'}.get),
+    'seller': Facet('Seller', lambda row: str(row['seller_id']), lambda key: Q(seller_id=key),
+                    top=settings.FACET_TOP_SELLERS),
+    'rating': Facet('Customer rating', _rating_key, _rating_q,
+                    lambda key: f'{key} star' + ('s' if key != '1' else '') if key != '0' else 'Not yet rated'),
+}
+
+
+# Bitmaps are split into chunks of 2**16 ids, roaring style. A chunk holding few ids
+# is a sorted array of their low 16 bits (2 bytes per id); a fuller one is a bitset
+# (an int, 8 KiB at most), which makes ANDs, ORs and counts single C operations. A
+# seller with a handful of products therefore costs a few bytes per product instead
+# of a bit for every product id in the catalog.
+_CHUNK_BITS = 16
+_LOW_MASK = (1 << _CHUNK_BITS) - 1
+# Chunks with more ids than this are bitsets. Roaring switches at 4096, where the two
+# take the same space; Python is much quicker at ANDing bitsets than arrays, so the
+# index trades some memory for speed and only keeps the sparsest chunks as arrays.
+_ARRAY_MAX = 256
+
+
+def _bits(container):
+    if isinstance(container, int):
+        return container
+    if not container:
+        return 0
+    bits = bytearray((container[-1] >> 3) + 1)
+    for low in container:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _lows(container):
+    if not isinstance(container, int):
+        return container
+    data = container.to_bytes((container.bit_length() + 7) // 8, 'little')
+    return array('H', [offset << 3 | bit for offset, byte in enumerate(data) if byte
+                       for bit in range(8) if byte >> bit & 1])
+
+
+def _pack(container):
+    # Stored chunks are arrays up to _ARRAY_MAX ids and bitsets above
+    if isinstance(container, int):
+        return container if container.bit_count() > _ARRAY_MAX else _lows(container)
+    return _bits(container) if len(container) > _ARRAY_MAX else container
+
+
+def _size(container):
+    return container.bit_count() if isinstance(container, int) else len(container)
+
+
+def _and(a, b):
+    if isinstance(a, int) or isinstance(b, int):
+        return _bits(a) & _bits(b)
+    return array('H', sorted(set(a).intersection(b)))
+
+
+def _or(a, b):
+    if isinstance(a, int) or isinstance(b, int) or len(a) + len(b) > _ARRAY_MAX:
+        return _bits(a) | _bits(b)
+    return array('H', sorted(set(a).union(b)))
+
+
+class Bitmap:
+    """Compressed set of product ids. The ones in the index are packed; query results need not be."""
+
+    __slots__ = ('chunks',)
+
+    def __init__(self, ids=(), packed=True):
+        self.chunks = {}  # id >> 16: array of low bits, or bitset
+        ids = ids if isinstance(ids, (list, array)) else list(ids)
+        if not ids:
+            return
+        top = max(ids)
+        if packed and len(ids) << _CHUNK_BITS < top * _ARRAY_MAX:
+            # Sparse: group the ids by chunk
+            grouped = defaultdict(list)
+            for product_id in ids:
+                grouped[product_id >> _CHUNK_BITS].append(product_id & _LOW_MASK)
+            for high, lows in grouped.items():
+                self.chunks[high] = _pack(array('H', sorted(set(lows))))
+        else:
+            # Dense: one bytearray over all the ids, cut into chunks
+            bits = bytearray((top >> 3) + 1)
+            for product_id in ids:
+                bits[product_id >> 3] |= 1 << (product_id & 7)
+            step = 1 << (_CHUNK_BITS - 3)
+            for high, start in enumerate(range(0, len(bits), step)):
+                chunk = int.from_bytes(bits[start:start + step], 'little')
+                if chunk:
+                    self.chunks[high] = _pack(chunk) if packed else chunk
+
+    def __and__(self, other):
+        result = Bitmap()
+        mine, theirs = (self.chunks, other.chunks) if len(self.chunks) <= len(other.chunks) else \
+            (other.chunks, self.chunks)
+        for high, container in mine.items():
+            if high in theirs:
+                both = _and(container, theirs[high])
+                if _size(both):
+                    result.chunks[high] = both
+        return result
+
+    def __or__(self, other):
+        result = Bitmap()
+        result.chunks = dict(self.chunks)
+        for high, container in other.chunks.items():
+            result.chunks[high] = _or(result.chunks[high], container) if high in result.chunks else container
+        return result
+
+    def and_count(self, other):
+        """len(self & other), without building the intersection."""
+        count = 0
+        for high, container in self.chunks.items():
+            if high in other.chunks:
+                count += _size(_and(container, other.chunks[high]))
+        return count
+
+    def __len__(self):
+        return sum(_size(container) for container in self.chunks.values())
+
+    def __iter__(self):
+        for high in sorted(self.chunks):
+            for low in _lows(self.chunks[high]):
+                yield high << _CHUNK_BITS | low
+
+    def __contains__(self, product_id):
+        container = self.chunks.get(product_id >> _CHUNK_BITS)
+        low = product_id & _LOW_MASK
+        if container is None:
+            return False
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        index = bisect.bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def add(self, product_id):
+        high, low = product_id >> _CHUNK_BITS, product_id & _LOW_MASK
+        container = self.chunks.get(high)
+        if container is None:
+            self.chunks[high] = array('H', [low])
+        elif isinstance(container, int):
+            self.chunks[high] = container | 1 << low
+        else:
+            index = bisect.bisect_left(container, low)
+            if index == len(container) or container[index] != low:
+                container.insert(index, low)
+                self.chunks[high] = _pack(container)
+
+    def discard(self, product_id):
+        high, low = product_id >> _CHUNK_BITS, product_id & _LOW_MASK
+        if product_id not in self:
+            return
+        container = self.chunks[high]
+        if isinstance(container, int):
+            container &= ~(1 << low)
+            if container.bit_count() <= _ARRAY_MAX // 2:
+                # Not straight back at _ARRAY_MAX, so a chunk at the limit does not flip on every change
+                container = _lows(container)
+        else:
+            del container[bisect.bisect_left(container, low)]
+        if _size(container):
+            self.chunks[high] = container
+        else:
+            del self.chunks[high]
+
+
+def _cents(price):
+    return int(price * 100)
+
+
+class FacetIndex:
+    """
+    Bitmaps of every facet option, plus every product's price, sorted, for
+    arbitrary price ranges. Per product it keeps each facet's option (as a
+    number in an array indexed by product id) to find what to take it out of.
+    """
+
+    def __init__(self, rows=()):
+        self.bitmaps = {name: {} for name in FACETS}  # facet: {key: Bitmap}
+        self.options = {name: [] for name in FACETS}  # facet: keys, by number - 1
+        self.option_codes = {name: {} for name in FACETS}  # facet: {key: number}
+        self.sizes = {name: {} for name in FACETS}  # facet: {key: products}, for the top options
+        self.codes = {name: array('I') for name in FACETS}  # facet: option number + 1 by product id
+        self.price_of = array('q')  # cents by product id, -1 for none
+        self.prices = array('q')    # cents, ascending
+        self.price_ids = array('q')  # the products of self.prices, by id within a price
+        members = {name: defaultdict(list) for name in FACETS}
+        ids, prices = [], []
+        for row in rows:
+            product_id = row['id']
+            ids.append(product_id)
+            prices.append((_cents(row['effective_price']), product_id))
+            for name, facet in FACETS.items():
+                members[name][facet.key(row)].append(product_id)
+        self._grow(max(ids, default=0))
+        prices.sort()
+        self.prices.extend(cents for cents, _ in prices)
+        self.price_ids.extend(product_id for _, product_id in prices)
+        for cents, product_id in prices:
+            self.price_of[product_id] = cents
+        for name, options in members.items():
+            for key, product_ids in options.items():
+                code = self._code(name, key)
+                self.bitmaps[name][key] = Bitmap(product_ids)
+                self.sizes[name][key] = len(product_ids)
+                codes = self.codes[name]
+                for product_id in product_ids:
+                    codes[product_id] = code
+        self.all = Bitmap(ids)
+
+    @classmethod
+    def build(cls):
+        return cls(Product.objects.values(*FIELDS).iterator(chunk_size=5000))
+
+    def _grow(self, product_id):
+        missing = product_id + 1 - len(self.price_of)
+        if missing > 0:
+            self.price_of.extend([-1] * missing)
+            for codes in self.codes.values():
+                codes.extend([0] * missing)
+
+    def _code(self, name, key):
+        codes = self.option_codes[name]
+        if key not in codes:
+            self.options[name].append(key)
+            codes[key] = len(self.options[name])
+            self.bitmaps[name][key] = Bitmap()
+            self.sizes[name][key] = 0
+        return codes[key]
+
+    def add(self, row):
+        product_id = row['id']
+        self.discard(product_id)
+        self._grow(product_id)
+        for name, facet in FACETS.items():
+            key = facet.key(row)
+            self.codes[name][product_id] = self._code(name, key)
+            self.bitmaps[name][key].add(product_id)
+            self.sizes[name][key] += 1
+        cents = self.price_of[product_id] = _cents(row['effective_price'])
+        index = bisect.bisect_left(self.prices, cents)
+        index = bisect.bisect_left(self.price_ids, product_id, index, bisect.bisect_right(self.prices, cents, index))
+        self.prices.insert(index, cents)
+        self.price_ids.insert(index, product_id)
+        self.all.add(product_id)
+
+    def discard(self, product_id):
+        if product_id >= len(self.price_of) or self.price_of[product_id] < 0:
+            return
+        for name, codes in self.codes.items():
+            key = self.options[name][codes[product_id] - 1]
+            self.bitmaps[name][key].discard(product_id)
+            self.sizes[name][key] -= 1
+            codes[product_id] = 0
+        cents, self.price_of[product_id] = self.price_of[product_id], -1
+        index = bisect.bisect_left(self.prices, cents)
+        index = bisect.bisect_left(self.price_ids, product_id, index, bisect.bisect_right(self.prices, cents, index))
+        del self.prices[index]
+        del self.price_ids[index]
+        self.all.discard(product_id)
+
+    def apply(self, product_id, row):
+        """Bring one product up to date: row is its FIELDS values, or None once it is deleted."""
+        if row is None:
+            self.discard(product_id)
+        else:
+            self.add(row)
+
+    def differs(self, product_id, row):
+        """Whether apply(product_id, row) would change anything."""
+        present = product_id < len(self.price_of) and self.price_of[product_id] >= 0
+        if row is None or not present:
+            return row is not None or present
+        if self.price_of[product_id] != _cents(row['effective_price']):
+            return True
+        return any(self.option_codes[name].get(facet.key(row)) != self.codes[name][product_id]
+                   for name, facet in FACETS.items())
+
+    def price_range(self, low=None, high=None):
+        """Bitmap of the products priced from low to high, both inclusive."""
+        start = 0 if low is None else bisect.bisect_left(self.prices, math.ceil(low * 100))
+        stop = len(self.prices) if high is None else bisect.bisect_right(self.prices, math.floor(high * 100))
+        return Bitmap(self.price_ids[start:stop], packed=False)
+
+    def matching(self, selection, within=None, skip=None):
+        """Bitmap of the products in every selected facet (any of its selected options), except facet skip."""
+        bits = self.all if within is None else self.all & within
+        for name, keys in selection.items():
+            if name != skip:
+                options = Bitmap()
+                for key in keys:
+                    if key in self.bitmaps[name]:
+                        options = options | self.bitmaps[name][key]
+                bits = bits & options
+        return bits
+
+    def counts(self, selection, within=None):
+        """
+        {facet: {key: products}} for the options with products. A facet's counts
+        take every other facet's selection into account but not its own, so they
+        say what ticking one more of its options would add. Facets with a top
+        only count their top options with the most products, plus the selected ones.
+        """
+        counts = {}
+        for name, facet in FACETS.items():
+            base = self.matching(selection, within, skip=name)
+            bitmaps = self.bitmaps[name]
+            keys = bitmaps.keys()
+            if facet.top is not None:
+                sizes = self.sizes[name]
+                keys = set(heapq.nlargest(facet.top, keys, key=sizes.__getitem__))
+                keys |= selection.get(name, set()) & bitmaps.keys()
+            counts[name] = {key: count for key in keys if (count := bitmaps[key].and_count(base))}
+        return counts
+
+
+_index = None
+_version = None
+_lock = threading.Lock()      # held while the index is read or changed in place
+_building = threading.Lock()  # held by the one thread rebuilding it
+
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _shared_version():
+    cache = _cache()
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_VERSION_KEY, time.time_ns())
+    return version
+
+
+def _bump_version():
+    cache = _cache()
+    try:
+        return cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, time.time_ns(), timeout=None)
+        return None
+
+
+def _catch_up(version):
+    """Replay the published changes up to version into this process's index; False if it cannot."""
+    global _version
+    with _lock:
+        if _index is None:
+            return False
+        behind = version - _version
+        if not behind:
+            return True
+        if not 0 < behind <= _REPLAY_LIMIT:
+            return False
+        keys = [_CHANGE_KEY.format(number) for number in range(_version + 1, version + 1)]
+        changes = _cache().get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        for key in keys:
+            for product_id, row in changes[key]:
+                _index.apply(product_id, row)
+        _version = version
+        return True
+
+
+def _current_index():
+    """This process's index, up to date with the shared version or being rebuilt."""
+    global _index, _version
+    version = _shared_version()
+    if _catch_up(version):
+        return _index
+    # Rebuild outside _lock, so requests carry on with the old index meanwhile. Changes
+    # published during the build are replayed on top of it later; they are whole rows,
+    # so replaying one the build already saw does no harm.
+    if not _building.acquire(blocking=_index is None):
+        return _index
+    try:
+        version = _shared_version()
+        if _catch_up(version):
+            return _index  # someone else rebuilt it while this thread waited
+        index = FacetIndex.build()
+        with _lock:
+            _index, _version = index, version
+        return index
+    finally:
+        _building.release()
+
+
+def facet_counts(selection, within=None):
+    """Option counts of every facet for a {facet: {keys}} selection (see FacetIndex.counts)."""
+    index = _current_index()
+    with _lock:
+        return index.counts(selection, within)
+
+
+def price_range(low=None, high=None):
+    index = _current_index()
+    with _lock:
+        return index.price_range(low, high)
+
+
+def selection_q(selection):
+    """Q matching the products of a {facet: {keys}} selection, the same products as FacetIndex.matching."""
+    q = Q()
+    for name, keys in selection.items():
+        options = Q()
+        for key in sorted(keys):
+            options |= FACETS[name].q(key)
+        q &= options
+    return q
+
+
+def refresh_products(product_ids):
+    """
+    Re-read the given products after a committed change and publish the ones whose
+    facet options or price changed, for every process to apply to its index.
+    """
+    product_ids = set(product_ids)
+    if len(product_ids) > _REFRESH_LIMIT:
+        _bump_version()  # without a change to replay, so every process rebuilds
+        return
+    rows = {row['id']: row for row in Product.objects.filter(pk__in=product_ids).values(*FIELDS)}
+    changes = [(product_id, rows.get(product_id)) for product_id in sorted(product_ids)]
+    version = _shared_version()
+    with _lock:
+        if _index is not None and _version == version:
+            changes = [change for change in changes if _index.differs(*change)]
+    if not changes:
+        return
+    version = _bump_version()
+    if version is not None:
+        _cache().set(_CHANGE_KEY.format(version), changes, timeout=_CHANGE_TIMEOUT)
+        _catch_up(version)
@@ -0,0 +1,206 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import VerificationJob
+from .verification import cached_results, image_hash, missing_models, model_versions, prune_stale_results, store_results
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (VerificationJob.STATUS_QUEUED, VerificationJob.STATUS_RUNNING)
+
+
+class QueueFull(Exception):
+    """Raised when the verification queue already holds ML_QUEUE_MAX_SIZE jobs."""
+
+
+def submit_verification(order):
+    """
+    Queue an ML verification run for the order and return its job. An order that
+    already has a queued or running job gets that job back instead of a new one;
+    the unique_active_verification_job constraint makes that hold for concurrent
+    submissions too.
+    """
+    job = VerificationJob.objects.filter(order=order, status__in=ACTIVE_STATUSES).first()
+    if job:
+        return job
+    if VerificationJob.objects.filter(status=VerificationJob.STATUS_QUEUED).count() >= settings.ML_QUEUE_MAX_SIZE:
+        raise QueueFull(f"{settings.ML_QUEUE_MAX_SIZE} verification jobs are already waiting")
+    job, _ = VerificationJob.objects.get_or_create(order=order, status__in=ACTIVE_STATUSES)
+    return job
+
+
+def verify_order(order):
+    """
+    Return (result, job) for the order: the stored result if every current model
+    already has one for its packing image (job is None), otherwise the queued or
+    running job working on it, submitting one if needed. Raises QueueFull.
+    """
+    digest = image_hash(order)
+    if digest:
+        versions = model_versions()
+        result = cached_results(order, digest, versions)
+        if not missing_models(result, versions):
+            return result, None
+    job = submit_verification(order)
+    return job.result, job
+
+
+def claim_jobs(worker_id, limit):
+    """
+    Atomically move up to limit queued jobs to running for this worker. The
+    conditional UPDATE means two workers can never claim the same job.
+    """
+    ids = list(
+        VerificationJob.objects.filter(status=VerificationJob.STATUS_QUEUED)
+        .order_by('id').values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    VerificationJob.objects.filter(id__in=ids, status=VerificationJob.STATUS_QUEUED).update(
+        status=VerificationJob.STATUS_RUNNING, claimed_by=worker_id, started_at=timezone.now()
+    )
+    return list(
+        VerificationJob.objects.filter(id__in=ids, claimed_by=worker_id, status=VerificationJob.STATUS_RUNNING)
+        .select_related('order')
+    )
+
+
+def run_jobs(jobs):
+    """
+    Run the models on a batch of claimed jobs and store each job's outcome.
+    Models that already have a stored result for the job's image and current
+    model version are not run again.
+    """
+    from .ml_models import run_ml_model_batch
+
+    versions = model_versions()
+    digests, cached, pending = [], [], []
+    for job in jobs:
+        digest = image_hash(job.order)
+        digests.append(digest)
+        cached.append(cached_results(job.order, digest, versions) if digest else {})
+        pending.append(missing_models(cached[-1], versions))
+
+    todo = [i for i, names in enumerate(pending) if names]
+    computed = {}
+    if todo:
+        orders = [jobs[i].order for i in todo]
+        models = [pending[i] for i in todo]
+        keys = [digests[i] for i in todo]
+        try:
+            computed = dict(zip(todo, run_ml_model_batch(orders, models, keys)))
+        except Exception:
+            # Retry one by one so a single bad image does not fail the whole batch
+            for i in todo:
+                try:
+                    computed[i] = run_ml_model_batch([jobs[i].order], [pending[i]], [digests[i]])[0]
+                except Exception as e:
+                    computed[i] = e
+
+    for i, job in enumerate(jobs):
+        outcome = computed.get(i, {})
+        if isinstance(outcome, Exception):
+            job.status = VerificationJob.STATUS_FAILED
+            job.result = None
+            job.error = f"{type(outcome).__name__}: {outcome}"
+        else:
+            if outcome and digests[i]:
+                store_results(job.order, digests[i], outcome, versions)
+            job.status = VerificationJob.STATUS_DONE
+            job.result = {**cached[i], **outcome}
+            job.error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+
+def requeue_stale_jobs(pid=None):
+    """
+    Put jobs left running by a worker that died back on the queue: those of the
+    worker process with the given pid, or every running job if pid is None.
+    """
+    jobs = VerificationJob.objects.filter(status=VerificationJob.STATUS_RUNNING)
+    if pid is not None:
+        jobs = jobs.filter(claimed_by__startswith=f"{pid}-")
+    return jobs.update(status=VerificationJob.STATUS_QUEUED, claimed_by='', started_at=None)
+
+
+def _pin_worker(index, threads):
+    """Limit torch to `threads` intra-op threads and pin them to their own CPUs."""
+    import torch
+
+    torch.set_num_threads(threads)
+    if hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        start = (index * threads) % len(cpus)
+        os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(threads)})
+
+
+def worker_loop(index, threads, batch_size, poll_interval):
+    """Main loop of one inference worker process."""
+    from .ml_models import preload_models
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor handles Ctrl+C
+    worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    _pin_worker(index, threads)
+    preload_models()
+    logger.info("Inference worker %s started with %s thread(s)", worker_id, threads)
+
+    while True:
+        jobs = claim_jobs(worker_id, batch_size)
+        if jobs:
+            run_jobs(jobs)
+        else:
+            time.sleep(poll_interval)
+
+
+def run_pool(workers=None, threads=None, batch_size=None, poll_interval=None):
+    """
+    Start the inference worker processes and restart any that exit, until
+    interrupted.
+    """
+    workers = workers or settings.ML_INFERENCE_WORKERS
+    threads = threads or settings.ML_INFERENCE_THREADS
+    batch_size = batch_size or settings.ML_BATCH_SIZE
+    poll_interval = poll_interval or settings.ML_INFERENCE_POLL_INTERVAL
+
+    requeued = requeue_stale_jobs()
+    if requeued:
+        logger.info("Requeued %s job(s) left running by a previous pool", requeued)
+    # Results from models that have since been upgraded will never be read again
+    pruned = prune_stale_results()
+    if pruned:
+        logger.info("Deleted %s stored result(s) from outdated model versions", pruned)
+
+    def start(index):
+        # Forked children must not share the parent's database connection
+        connections.close_all()
+        # Workers are forked so they inherit the configured Django setup (POSIX only)
+        process = multiprocessing.get_context('fork').Process(
+            target=worker_loop, args=(index, threads, batch_size, poll_interval),
+            name=f'inference-worker-{index}', daemon=True,
+        )
+        process.start()
+        return process
+
+    processes = [start(index) for index in range(workers)]
+    try:
+        while True:
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning("Inference worker %s exited with code %s, restarting", index, process.exitcode)
+                    requeue_stale_jobs(process.pid)
+                    processes[index] = start(index)
+            time.sleep(1)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
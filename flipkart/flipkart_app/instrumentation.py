@@ -0,0 +1,239 @@
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# Histogram bucket upper bounds: milliseconds for timings, plain numbers for counts
+TIME_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+COUNT_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """What one request spent its time on; filled in by the hooks below while it runs."""
+
+    __slots__ = ('start', 'queries', 'db', 'template', 'cache_hits', 'cache_misses', 'spans')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = {}  # e.g. 'ml.expiry_check': seconds
+
+    def time_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        parts = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ]
+        parts += [f'{name.replace(".", "-")};dur={seconds * 1000:.1f}' for name, seconds in self.spans.items()]
+        return ', '.join(parts)
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their count and sum. Not locked; see Metrics."""
+
+    __slots__ = ('bounds', 'buckets', 'count', 'total')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # the last one is everything above the top bound
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations (None above the top bound)."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': {f'le_{bound}': count for bound, count in zip(self.bounds, self.buckets)}
+                       | {'inf': self.buckets[-1]},
+        }
+
+
+class Metrics:
+    """In-process histograms per view, for the request_metrics endpoint and command."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, view, name, bounds):
+        histogram = self._histograms.get((view, name))
+        if histogram is None:
+            histogram = self._histograms[(view, name)] = Histogram(bounds)
+        return histogram
+
+    def observe(self, view, name, value, bounds=TIME_BOUNDS):
+        with self._lock:
+            self._histogram(view, name, bounds).add(value)
+
+    def record(self, view, timings, total):
+        ms = 1000
+        with self._lock:
+            for name, value, bounds in [
+                ('total_ms', total * ms, TIME_BOUNDS),
+                ('db_ms', timings.db * ms, TIME_BOUNDS),
+                ('queries', timings.queries, COUNT_BOUNDS),
+                ('template_ms', timings.template * ms, TIME_BOUNDS),
+                ('cache_hits', timings.cache_hits, COUNT_BOUNDS),
+                ('cache_misses', timings.cache_misses, COUNT_BOUNDS),
+                *((f'{span}_ms', seconds * ms, TIME_BOUNDS) for span, seconds in timings.spans.items()),
+            ]:
+                self._histogram(view, name, bounds).add(value)
+
+    def snapshot(self):
+        """{view: {metric: histogram summary}}"""
+        with self._lock:
+            views = {}
+            for (view, name), histogram in sorted(self._histograms.items()):
+                views.setdefault(view, {})[name] = histogram.snapshot()
+            return views
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics = Metrics()
+
+# Spans timed outside any request (e.g. models run by an inference worker) are filed under this view
+BACKGROUND = '(background)'
+
+
+@contextmanager
+def span(name):
+    """Time a block: added to the current request's Server-Timing, or to the background histograms."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timings = _current.get()
+        if timings is not None:
+            timings.spans[name] = timings.spans.get(name, 0.0) + seconds
+        else:
+            metrics.observe(BACKGROUND, f'{name}_ms', seconds * 1000)
+
+
+def count_cache(hit):
+    timings = _current.get()
+    if timings is not None:
+        if hit:
+            timings.cache_hits += 1
+        else:
+            timings.cache_misses += 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - start
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render (queries run while rendering included)."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# Set by reverse proxies; a request carrying one came from outside even if
+# REMOTE_ADDR is the proxy's loopback address
+_FORWARDED_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
+
+
+def is_internal_request(request) -> bool:
+    """
+    True for staff, and for requests made straight to the app server from an
+    INTERNAL_IPS address (e.g. a metrics scraper on the same host). REMOTE_ADDR
+    alone is not enough: behind a local proxy it is 127.0.0.1 for everyone.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    return (
+        request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+        and not any(header in request.META for header in _FORWARDED_HEADERS)
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every request: wall time, queries and their time on every database,
+    template rendering, catalog cache hits and misses, and spans such as ML model
+    runs, and feeds the per-view histograms. Responses get a Server-Timing header
+    in DEBUG and for internal requests only, as it reveals how the page was built.
+    Put it first in MIDDLEWARE so the other middleware's queries are included.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.time_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - timings.start
+        match = request.resolver_match
+        metrics.record(match.view_name if match else '(unresolved)', timings, total)
+        if settings.DEBUG or is_internal_request(request):
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
@@ -0,0 +1,409 @@
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .catalog_cache import invalidate_catalog
+from .inference import claim_jobs, run_jobs
+from .models import (
+    Cart, CartItem, Category, Order, OrderItem, Product, Review, Seller, User, UserProfile,
+)
+from .ratings import reconcile_ratings
+from .search import rebuild_index, search_available
+from .seller_metrics import reconcile
+
+logger = logging.getLogger(__name__)
+
+# Seeded rows are recognisable by this prefix (usernames, category names, image files)
+PREFIX = 'loadtest'
+
+ADJECTIVES = ['red', 'blue', 'organic', 'wireless', 'steel', 'cotton', 'smart', 'mini', 'classic', 'portable']
+NOUNS = ['shoes', 'phone', 'kettle', 'shirt', 'lamp', 'watch', 'bottle', 'chair', 'camera', 'backpack']
+
+# Products kept in memory for orders and reviews, however large the catalog
+_SAMPLE_SIZE = 20000
+
+
+def seed(products=1000, customers=100, sellers=10, orders=5, reviews=2, images=20, seed=0,
+         batch_size=5000, log=logger.info):
+    """
+    Create a synthetic catalog, customers with carts and order history, reviews,
+    and pending orders with packing images for the sellers' verification queue.
+    The same arguments always produce the same data. Returns the row counts.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        categories = Category.objects.bulk_create(
+            Category(name=f'{PREFIX} {noun}', description='Load test category') for noun in NOUNS
+        )
+        seller_users = _create_users('seller', sellers)
+        seller_rows = Seller.objects.bulk_create(
+            Seller(user_profile=profile, company_name=f'{profile.user.username} Ltd',
+                   gst_number=f'LT{profile.user_id:013d}')
+            for profile in _create_profiles(seller_users, 'seller')
+        )
+        customer_users = _create_users('customer', customers)
+        _create_profiles(customer_users, 'customer')
+        Cart.objects.bulk_create(Cart(user=user) for user in customer_users)
+        log(f'{sellers} sellers, {customers} customers')
+
+        sample = []
+        for start in range(0, products, batch_size):
+            batch = Product.objects.bulk_create(
+                Product(
+                    seller=rng.choice(seller_rows), category=rng.choice(categories),
+                    name=f'{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} {i}',
+                    description=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} for everyday use',
+                    price=Decimal(rng.randint(100, 100000)) / 100, stock=rng.choice([0] + [1000] * 9),
+                    discount_percentage=rng.choice([0, 0, 5, 10, 20]), is_featured=rng.random() < 0.01,
+                    image='product_images/placeholder.jpg',
+                )
+                for i in range(start, min(start + batch_size, products))
+            )
+            keep = math.ceil(_SAMPLE_SIZE * len(batch) / products)
+            sample += [product for product in rng.sample(batch, min(keep, len(batch))) if product.stock]
+            log(f'{start + len(batch)} products')
+
+        order_rows = Order.objects.bulk_create(
+            Order(user=user, status=rng.choice([Order.STATUS_DELIVERED] * 3 + [Order.STATUS_PENDING]),
+                  total_amount=0, shipping_address='1 Load Test Street', phone_number='0000000000',
+                  payment_method='Cash on Delivery')
+            for user in customer_users for _ in range(orders)
+        )
+        items = [
+            OrderItem(order=order, product=product, quantity=rng.randint(1, 3), price=product.discounted_price())
+            for order in order_rows for product in rng.sample(sample, min(len(sample), rng.randint(1, 3)))
+        ]
+        totals = defaultdict(Decimal)
+        for item in items:
+            totals[item.order_id] += item.price * item.quantity
+        for order in order_rows:
+            order.total_amount = totals[order.id]
+        Order.objects.bulk_update(order_rows, ['total_amount'], batch_size=batch_size)
+        OrderItem.objects.bulk_create(items, batch_size=batch_size)
+        log(f'{len(order_rows)} orders, {len(items)} order items')
+
+        review_rows = Review.objects.bulk_create(
+            (Review(product=product, user=user, rating=rng.randint(1, 5), comment='Load test review')
+             for user in customer_users for product in rng.sample(sample, min(len(sample), reviews))),
+            batch_size=batch_size,
+        )
+        reconcile_ratings({review.product_id for review in review_rows})
+
+        pending = [order for order in order_rows if order.status == Order.STATUS_PENDING][:images]
+        _write_packing_images(pending, rng)
+        Order.objects.bulk_update(pending, ['packing_image'])
+
+        reconcile([seller.id for seller in seller_rows])
+    if search_available():
+        rebuild_index()
+    invalidate_catalog()
+    return {
+        'products': products, 'customers': customers, 'sellers': sellers, 'orders': len(order_rows),
+        'order_items': len(items), 'reviews': len(review_rows), 'images': len(pending),
+    }
+
+
+def _create_users(kind, count):
+    return User.objects.bulk_create(
+        User(username=f'{PREFIX}-{kind}-{i}', is_customer=kind == 'customer', is_seller=kind == 'seller')
+        for i in range(count)
+    )
+
+
+def _create_profiles(users, user_type):
+    return UserProfile.objects.bulk_create(UserProfile(user=user, user_type=user_type) for user in users)
+
+
+def _write_packing_images(orders, rng):
+    from PIL import Image
+
+    directory = Path(settings.MEDIA_ROOT) / 'packing_images'
+    directory.mkdir(parents=True, exist_ok=True)
+    for order in orders:
+        name = f'packing_images/{PREFIX}-{order.id}.jpg'
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (64, 64), colour).save(Path(settings.MEDIA_ROOT) / name)
+        order.packing_image = name
+
+
+def clear():
+    """Delete everything seed() created."""
+    with transaction.atomic():
+        deleted = User.objects.filter(username__startswith=f'{PREFIX}-').delete()[0]
+        deleted += Category.objects.filter(name__startswith=f'{PREFIX} ').delete()[0]
+    for path in (Path(settings.MEDIA_ROOT) / 'packing_images').glob(f'{PREFIX}-*.jpg'):
+        path.unlink()
+    invalidate_catalog()
+    return deleted
+
+
+class Dataset:
+    """What the scenarios pick from: seeded users, a sample of products, search terms."""
+
+    def __init__(self, rng, sample_size=5000):
+        self.customers = list(User.objects.filter(username__startswith=f'{PREFIX}-customer-'))
+        self.sellers = list(User.objects.filter(username__startswith=f'{PREFIX}-seller-'))
+        if not self.customers or not self.sellers:
+            raise ValueError('No load test data; run seed_benchmark_data first')
+        products = Product.objects.filter(category__name__startswith=f'{PREFIX} ', stock__gt=0)
+        # Sample ids between the first and last seeded product rather than loading them all
+        first = products.order_by('id').values_list('id', flat=True).first()
+        last = products.order_by('-id').values_list('id', flat=True).first()
+        candidates = {rng.randint(first, last) for _ in range(sample_size)}
+        self.products = sorted(products.filter(id__in=candidates).values_list('id', flat=True))
+        self.search_terms = [f'{adjective} {noun[:3]}' for adjective in ADJECTIVES for noun in NOUNS]
+        self.packing_orders = list(
+            Order.objects.filter(packing_image__startswith=f'packing_images/{PREFIX}-').values_list('id', flat=True)
+        )
+
+
+class Session:
+    """One simulated client: a logged-in customer and seller, and the samples they recorded."""
+
+    def __init__(self, customer, seller, dataset, rng):
+        self.dataset = dataset
+        self.rng = rng
+        self.customer_user = customer
+        self.customer = Client(raise_request_exception=False)
+        self.customer.force_login(customer)
+        self.seller = Client(raise_request_exception=False)
+        self.seller.force_login(seller)
+        self.samples = defaultdict(list)  # scenario: [(seconds, queries, status)]
+
+    def request(self, scenario, client, method, path, data=None):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data)
+            seconds = time.perf_counter() - start
+        self.samples[scenario].append((seconds, queries, response.status_code))
+        return response
+
+    def cart_item(self):
+        # Setup, outside the timed request: make sure the cart holds something
+        cart = self.customer_user.cart
+        item = cart.items.first()
+        if item is None:
+            item = CartItem.objects.create(cart=cart, product_id=self.rng.choice(self.dataset.products))
+        return item
+
+
+def _home(session):
+    session.request('home', session.customer, 'get', reverse('home'))
+
+
+def _search(session):
+    session.request('search', session.customer, 'get', reverse('product_list'),
+                    {'search': session.rng.choice(session.dataset.search_terms)})
+
+
+def _product_detail(session):
+    session.request('product_detail', session.customer, 'get',
+                    reverse('product_detail', args=[session.rng.choice(session.dataset.products)]))
+
+
+def _cart_add(session):
+    session.request('cart_add', session.customer, 'get',
+                    reverse('add_to_cart', args=[session.rng.choice(session.dataset.products)]))
+
+
+def _cart_update(session):
+    item = session.cart_item()
+    action = 'decrease' if item.quantity > 3 else 'increase'
+    session.request('cart_update', session.customer, 'post', reverse('update_cart', args=[item.id]),
+                    {'action': action})
+
+
+def _checkout(session):
+    session.cart_item()
+    session.request('checkout', session.customer, 'post', reverse('checkout'), {
+        'shipping_address': '1 Load Test Street', 'phone_number': '0000000000', 'payment_method': 'Cash on Delivery',
+    })
+
+
+def _order_history(session):
+    session.request('order_history', session.customer, 'get', reverse('order_history'))
+
+
+def _seller_dashboard(session):
+    session.request('seller_dashboard', session.seller, 'get', reverse('seller_dashboard'))
+
+
+def _verification(session):
+    if session.dataset.packing_orders:
+        session.request('verification', session.seller, 'get',
+                        reverse('verification_summary', args=[session.rng.choice(session.dataset.packing_orders)]))
+
+
+SCENARIOS = {
+    'home': _home,
+    'search': _search,
+    'product_detail': _product_detail,
+    'cart_add': _cart_add,
+    'cart_update': _cart_update,
+    'checkout': _checkout,
+    'order_history': _order_history,
+    'seller_dashboard': _seller_dashboard,
+    'verification': _verification,
+}
+
+
+@contextmanager
+def stub_models():
+    """
+    Replace every ML model with a stand-in that labels an image from its mean
+    brightness in microseconds, so verification load can be measured without
+    checkpoints. Yields the model versions to run with; the models loaded before
+    are put back when the block exits.
+    """
+    import torch
+
+    from .ml_models import registry
+
+    class StubModel(torch.nn.Module):
+        def forward(self, images):
+            brightness = images.mean(dim=(1, 2, 3))
+            return torch.stack([brightness, 1 - brightness], dim=1)
+
+    snapshot = registry.snapshot()
+    for name in registry.names():
+        registry.install(name, StubModel().eval())
+    try:
+        yield {name: 'stub' for name in registry.names()}
+    finally:
+        registry.restore(snapshot)
+
+
+def _stub_worker(stop):
+    # Drains the verification queue like run_inference_workers would
+    while not stop.is_set():
+        jobs = claim_jobs(f'{PREFIX}-{os.getpid()}', settings.ML_BATCH_SIZE)
+        if jobs:
+            run_jobs(jobs)
+        else:
+            stop.wait(settings.ML_INFERENCE_POLL_INTERVAL)
+    connection.close()
+
+
+def run(scenarios=None, clients=8, seconds=10.0, seed=0):
+    """
+    Drive the scenarios (all by default) in round-robin from concurrent clients for
+    the given time and return {scenario: stats} plus a 'total' entry. Every request
+    goes through the full middleware and view stack with the Django test client.
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    rng = random.Random(seed)
+    dataset = Dataset(rng)
+    sessions = [
+        Session(dataset.customers[i % len(dataset.customers)], dataset.sellers[i % len(dataset.sellers)],
+                dataset, random.Random(rng.random()))
+        for i in range(clients)
+    ]
+    connection.close()
+
+    def client(index, session):
+        offset = index
+        while time.monotonic() < deadline:
+            scenario = scenarios[offset % len(scenarios)]
+            start = time.perf_counter()
+            try:
+                SCENARIOS[scenario](session)
+            except DatabaseError:
+                # Failed in the setup before the request; count it as a failed request
+                session.samples[scenario].append((time.perf_counter() - start, 0, 500))
+            offset += 1
+        connection.close()
+
+    stop = threading.Event()
+    models = stub_models() if 'verification' in scenarios else nullcontext(settings.ML_MODEL_VERSIONS)
+    with models as versions, override_settings(ML_MODEL_VERSIONS=versions):
+        deadline = time.monotonic() + seconds
+        worker = threading.Thread(target=_stub_worker, args=(stop,), daemon=True)
+        worker.start()
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i, session)) for i, session in enumerate(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        worker.join()
+
+    samples = defaultdict(list)
+    for session in sessions:
+        for scenario, rows in session.samples.items():
+            samples[scenario] += rows
+    results = {scenario: summarize(rows, elapsed) for scenario, rows in samples.items()}
+    results['total'] = summarize([row for rows in samples.values() for row in rows], elapsed)
+    return results
+
+
+def _percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles (ms), throughput, queries per request and errors of (seconds, queries, status) samples."""
+    latencies = sorted(seconds for seconds, _, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(status >= 500 for _, _, status in samples),
+        'throughput': len(samples) / elapsed,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'queries': sum(queries for _, queries, _ in samples) / len(samples),
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of results against a baseline: p95 latency or queries per request
+    up, or throughput down, by more than tolerance, or new errors. Latency changes
+    under a millisecond are ignored as noise.
+    """
+    regressions = []
+    for scenario, old in baseline.items():
+        new = results.get(scenario)
+        if new is None:
+            continue
+        if new['p95_ms'] > old['p95_ms'] * (1 + tolerance) and new['p95_ms'] - old['p95_ms'] >= 1:
+            regressions.append(f"{scenario}: p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} ms")
+        if new['throughput'] < old['throughput'] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {old['throughput']:.1f} -> {new['throughput']:.1f}/s")
+        if new['queries'] > old['queries'] * (1 + tolerance):
+            regressions.append(f"{scenario}: queries per request {old['queries']:.1f} -> {new['queries']:.1f}")
+        if new['errors'] > old['errors']:
+            regressions.append(f"{scenario}: errors {old['errors']} -> {new['errors']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['scenarios']
+
+
+def save_baseline(path, results, options):
+    with open(path, 'w') as f:
+        json.dump({'options': options, 'scenarios': results}, f, indent=2, sort_keys=True)
@@ -0,0 +1,92 @@
+import os
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from flipkart_app.checkout import OutOfStock, place_order
+from flipkart_app.models import Cart, CartItem, Category, OrderItem, Product, Seller, User, UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate many customers checking out the same hot product at once and report '
+        'throughput, latency and whether any stock was oversold. Creates its own users and '
+        'product and deletes them afterwards; run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200, help='Customers checking out (default: 200)')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent checkouts (default: 16)')
+        parser.add_argument('--stock', type=int, default=100, help='Initial stock of the hot product (default: 100)')
+        parser.add_argument('--quantity', type=int, default=1, help='Units in each cart (default: 1)')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-checkout-{os.getpid()}'
+        product, users = self.setup(prefix, options)
+        try:
+            outcomes, latencies, elapsed = self.run(users, options['threads'])
+            self.report(product, options, outcomes, latencies, elapsed)
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+            product.category.delete()
+
+    def setup(self, prefix, options):
+        seller_user = User.objects.create(username=f'{prefix}-seller', is_seller=True)
+        seller = Seller.objects.create(
+            user_profile=UserProfile.objects.create(user=seller_user, user_type='seller'),
+            company_name=prefix, gst_number=str(os.getpid())[-15:],
+        )
+        product = Product.objects.create(
+            seller=seller, category=Category.objects.create(name=prefix), name=prefix,
+            description='Checkout benchmark product', price=10, stock=options['stock'],
+        )
+        users = User.objects.bulk_create(
+            User(username=f'{prefix}-{i}', is_customer=True) for i in range(options['buyers'])
+        )
+        carts = Cart.objects.bulk_create(Cart(user=user) for user in users)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=options['quantity']) for cart in carts
+        )
+        return product, users
+
+    def run(self, users, threads):
+        def checkout(user):
+            start = time.perf_counter()
+            try:
+                place_order(user, 'Benchmark address', '0000000000', 'Cash on Delivery')
+                outcome = 'ordered'
+            except OutOfStock:
+                outcome = 'out of stock'
+            except DatabaseError as e:
+                outcome = f'error: {e}'
+            finally:
+                connection.close()
+            return outcome, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(checkout, users))
+        elapsed = time.perf_counter() - start
+        return Counter(outcome for outcome, _ in results), [latency for _, latency in results], elapsed
+
+    def report(self, product, options, outcomes, latencies, elapsed):
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(product=product).aggregate(units=Sum('quantity'))['units'] or 0
+        latencies.sort()
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{outcome}: {count}")
+        self.stdout.write(
+            f"{len(latencies)} checkouts with {options['threads']} threads in {elapsed:.2f}s "
+            f"({len(latencies) / elapsed:.0f}/s); latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+        )
+        self.stdout.write(f"Stock {options['stock']} -> {product.stock}, {sold} units sold")
+        if sold + product.stock != options['stock'] or sold > options['stock']:
+            self.stdout.write(self.style.ERROR('Stock and sold units do not add up: oversold!'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No overselling'))
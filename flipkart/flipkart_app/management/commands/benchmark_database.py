@@ -0,0 +1,155 @@
+import os
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection, connections
+from django.db.models import F
+from django.test.utils import override_settings
+
+from flipkart_app.database import catalog_reads
+from flipkart_app.models import Cart, CartItem, Category, Product, Review, Seller, User, UserProfile
+
+# name: (pragmas run on each new SQLite connection, CONN_MAX_AGE)
+PROFILES = {
+    # What SQLite and Django do out of the box: rollback journal, full sync, a new connection per request
+    'baseline': ({'journal_mode': 'delete', 'synchronous': 'full'}, 0),
+    # settings.SQLITE_PRAGMAS, still a new connection per request
+    'tuned': (None, 0),
+    # settings.SQLITE_PRAGMAS with connections kept open across requests
+    'persistent': (None, 600),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a mix of catalog reads and cart writes from many threads under each database '
+        'profile and compare throughput, latency and errors. Every operation ends like a '
+        'request does, closing the connection unless CONN_MAX_AGE keeps it open. Creates its '
+        'own users and products and deletes them afterwards; run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(PROFILES),
+                            help=f"Comma-separated profiles to run (default: {','.join(PROFILES)})")
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent clients (default: 16)')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each profile (default: 10)')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Share of operations that write to a cart (default: 0.2)')
+        parser.add_argument('--products', type=int, default=500, help='Products to create (default: 500)')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+        if connection.vendor != 'sqlite':
+            self.stdout.write('Not SQLite: the profiles differ only in CONN_MAX_AGE')
+
+        prefix = f'bench-db-{os.getpid()}'
+        category, products, carts = self.setup(prefix, options)
+        results = {}
+        try:
+            for name in profiles:
+                results[name] = self.run_profile(name, category, products, carts, options)
+                self.report(name, options, *results[name])
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+            category.delete()
+
+        if len(results) > 1:
+            base = profiles[0]
+            base_rate = len(results[base][0]) / options['seconds']
+            for name in profiles[1:]:
+                rate = len(results[name][0]) / options['seconds']
+                self.stdout.write(f"{name}: {rate / base_rate:.2f}x the throughput of {base}")
+
+    def setup(self, prefix, options):
+        seller_user = User.objects.create(username=f'{prefix}-seller', is_seller=True)
+        seller = Seller.objects.create(
+            user_profile=UserProfile.objects.create(user=seller_user, user_type='seller'),
+            company_name=prefix, gst_number=str(os.getpid())[-15:],
+        )
+        category = Category.objects.create(name=prefix)
+        products = Product.objects.bulk_create(
+            Product(seller=seller, category=category, name=f'{prefix} {i}', description='Database benchmark product',
+                    price=10, stock=1000)
+            for i in range(options['products'])
+        )
+        users = User.objects.bulk_create(
+            User(username=f'{prefix}-{i}', is_customer=True) for i in range(options['threads'])
+        )
+        carts = Cart.objects.bulk_create(Cart(user=user) for user in users)
+        return category, [product.id for product in products], carts
+
+    def run_profile(self, name, category, products, carts, options):
+        pragmas, conn_max_age = PROFILES[name]
+        database = connections.settings['default']
+        previous_max_age = database.get('CONN_MAX_AGE', 0)
+        deadline = time.monotonic() + options['seconds']
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def client(cart):
+            rng = random.Random(cart.id)
+            mine, failed = [], []
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    if rng.random() < options['write_ratio']:
+                        self.add_to_cart(cart, rng.choice(products))
+                    else:
+                        self.browse(category, rng.choice(products))
+                    mine.append(time.perf_counter() - start)
+                except DatabaseError as e:
+                    failed.append(str(e))
+                # End of the "request": closes the connection unless it is persistent
+                close_old_connections()
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.extend(failed)
+
+        # Journal mode is stored in the database file, so it only changes with no other connection open
+        connections.close_all()
+        database['CONN_MAX_AGE'] = conn_max_age
+        try:
+            with override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRAGMAS if pragmas is None else pragmas):
+                connection.ensure_connection()
+                threads = [threading.Thread(target=client, args=(cart,)) for cart in carts]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                connections.close_all()
+        finally:
+            database['CONN_MAX_AGE'] = previous_max_age
+        return latencies, errors
+
+    def browse(self, category, product_id):
+        # What the home page and a product page read
+        with catalog_reads():
+            list(Product.objects.filter(stock__gt=0, category=category).order_by('-id')[:12])
+            Product.objects.filter(stock__gt=0).count()
+            product = Product.objects.get(id=product_id)
+            list(Review.objects.filter(product=product).order_by('-created_at', '-id')[:10])
+
+    def add_to_cart(self, cart, product_id):
+        item, created = CartItem.objects.get_or_create(cart=cart, product_id=product_id)
+        if not created:
+            CartItem.objects.filter(id=item.id).update(quantity=F('quantity') + 1)
+
+    def report(self, name, options, latencies, errors):
+        latencies.sort()
+        line = f"{name}: {len(latencies)} operations in {options['seconds']:.0f}s " \
+               f"({len(latencies) / options['seconds']:.0f}/s)"
+        if latencies:
+            line += f"; latency p50 {statistics.median(latencies) * 1000:.1f} ms, " \
+                    f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, " \
+                    f"max {latencies[-1] * 1000:.1f} ms"
+        self.stdout.write(line)
+        if errors:
+            self.stdout.write(self.style.ERROR(f"  {len(errors)} errors, e.g. {errors[0]}"))
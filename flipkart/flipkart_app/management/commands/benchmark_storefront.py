@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flipkart_app import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the storefront and seller endpoints (home, search, product detail, cart, checkout, '
+        'order history, seller dashboard, ML verification with stub models) from concurrent '
+        'clients over data from seed_benchmark_data. Reports p50/p95/p99 latency, throughput and '
+        'queries per request, and fails if results regress against a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(loadtest.SCENARIOS),
+                            help=f"Comma-separated scenarios (default: all: {','.join(loadtest.SCENARIOS)})")
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients (default: 8)')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration (default: 10)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--baseline', help='Compare against the baseline JSON file stored at this path')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Store the results as a baseline at this path')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative regression before failing (default: 0.2)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(loadtest.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        try:
+            results = loadtest.run(scenarios, options['clients'], options['seconds'], options['seed'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            self.report(results)
+        if options['save_baseline']:
+            loadtest.save_baseline(options['save_baseline'], results, {
+                name: options[name] for name in ['scenarios', 'clients', 'seconds', 'seed']
+            })
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+        if options['baseline']:
+            regressions = loadtest.compare(results, loadtest.load_baseline(options['baseline']),
+                                           options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(regression))
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def report(self, results):
+        self.stdout.write(f"{'scenario':<18}{'requests':>9}{'errors':>7}{'req/s':>8}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for scenario, row in results.items():
+            self.stdout.write(
+                f"{scenario:<18}{row['requests']:>9}{row['errors']:>7}{row['throughput']:>8.1f}"
+                f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['queries']:>9.1f}"
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from flipkart_app.related_products import compute_related_products
+
+
+class Command(BaseCommand):
+    help = 'Precompute the related products shown on product pages from co-purchases and co-wishlisting.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-k', '--top-k', type=int, default=10, help='Related products kept per product (default: 10)')
+        parser.add_argument('--wishlist-weight', type=float, default=0.5,
+                            help='Weight of a co-wishlisting relative to a co-purchase (default: 0.5)')
+
+    def handle(self, *args, **options):
+        try:
+            import scipy  # noqa: F401
+        except ImportError:
+            raise CommandError('Computing related products requires scipy (pip install scipy).')
+
+        products, rows, elapsed = compute_related_products(options['top_k'], options['wishlist_weight'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {rows} related products for {products} products in {elapsed:.2f}s"
+        ))
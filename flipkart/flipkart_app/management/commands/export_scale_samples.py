@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flipkart_app.sample_recorder import export_csv, recording_files
+
+
+class Command(BaseCommand):
+    help = 'Convert binary scale sample recordings to CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Recording files, or directories of recordings')
+        parser.add_argument('-o', '--output', help='CSV file to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        files = []
+        for path in options['paths']:
+            found = recording_files(path) if not path.endswith('.bin') else [path]
+            if not found:
+                raise CommandError(f"No recordings found at {path}")
+            files.extend(found)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                rows = export_csv(files, output)
+            self.stderr.write(f"Wrote {rows} samples to {options['output']}")
+        else:
+            export_csv(files, sys.stdout)
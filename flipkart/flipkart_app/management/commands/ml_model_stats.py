@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from flipkart_app.ml_models import registry
+
+
+class Command(BaseCommand):
+    help = 'Load the ML models and report load time and memory use for each one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Models to load (default: all registered models)')
+
+    def handle(self, *args, **options):
+        registry.preload(options['models'] or None)
+        for name, stats in registry.metrics().items():
+            if not stats['loaded']:
+                self.stdout.write(f"{name}: not loaded")
+                continue
+            rss = stats['rss_delta_bytes']
+            self.stdout.write(
+                f"{name}: {stats['load_seconds'] * 1000:.1f} ms, "
+                f"{stats['parameter_bytes'] / 2**20:.1f} MiB weights, "
+                f"{'n/a' if rss is None else f'{rss / 2**20:.1f} MiB'} RSS delta, "
+                f"{'mmapped' if stats['mmapped'] else 'copied'}"
+            )
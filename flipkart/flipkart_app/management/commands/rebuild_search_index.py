@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from flipkart_app.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from the product table.'
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('The search index needs SQLite with FTS5; run migrate first.')
+        start = time.perf_counter()
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} products in {time.perf_counter() - start:.2f}s"
+        ))
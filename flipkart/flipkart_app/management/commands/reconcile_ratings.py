@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from flipkart_app.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute products' stored review counts, rating sums and rating histograms from their reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products',
+                            help='Only reconcile this product id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_ratings(options['products'], options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{fixed} product(s) have drifted aggregates")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed the aggregates of {fixed} product(s)"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flipkart_app.seller_metrics import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill the seller-order links and seller daily stats from the orders, '
+        'correcting any rows that have drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seller', type=int, action='append', dest='sellers',
+                            help='Only reconcile this seller id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing; day counts are '
+                                 'computed from the links as they currently are')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Orders per batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = reconcile(options['sellers'], options['dry_run'], options['batch_size'])
+        self.stdout.write(
+            f"Links: {counts['links_created']} created, {counts['links_updated']} updated, "
+            f"{counts['links_deleted']} deleted. Days: {counts['days_created']} created, "
+            f"{counts['days_updated']} updated, {counts['days_deleted']} deleted."
+        )
+        verb = 'Checked' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(f"{verb} in {time.perf_counter() - start:.2f}s"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from flipkart_app.sample_recorder import is_recording, read_records
+from flipkart_app.scale_pipeline import StabilityFilter, replay, replay_samples
+
+
+class Command(BaseCommand):
+    help = 'Feed a recorded serial log from the scale through the weight stabilisation pipeline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log_file', help='Raw serial capture, text log or binary recording written by scale.py')
+        parser.add_argument('--station', help='Only replay this station from a binary recording')
+        parser.add_argument('--window', type=int, default=10, help='Readings in the rolling window')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Maximum spread of a stable window')
+        parser.add_argument('--outlier-threshold', type=float, default=50.0,
+                            help='Distance from the median beyond which a reading is an outlier')
+        parser.add_argument('--min-weight', type=float, default=1.0,
+                            help='Lightest reading that counts as a package on the scale')
+
+    def handle(self, *args, **options):
+        stability_filter = StabilityFilter(
+            window=options['window'],
+            tolerance=options['tolerance'],
+            outlier_threshold=options['outlier_threshold'],
+            min_weight=options['min_weight'],
+        )
+        if is_recording(options['log_file']):
+            report = replay_samples(
+                ((record.timestamp, record.weight) for record in read_records(options['log_file'])
+                 if options['station'] in (None, record.station)),
+                stability_filter,
+            )
+        else:
+            with open(options['log_file'], encoding='utf-8', errors='replace') as log:
+                report = replay(log, stability_filter)
+
+        for event in report['events']:
+            self.stdout.write(f"{event.timestamp:.3f}  {event.kind:<8} {event.weight:.2f}")
+        self.stdout.write(
+            f"{report['samples']} samples, {report['rejected']} rejected as outliers, "
+            f"{report['samples_per_second']:,.0f} samples/s"
+        )
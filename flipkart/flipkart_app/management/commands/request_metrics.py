@@ -0,0 +1,90 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from flipkart_app.instrumentation import metrics
+from flipkart_app.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the given paths in-process and dump the per-view timing histograms that '
+        'RequestMetricsMiddleware recorded: wall time, queries and their time, template '
+        'rendering, cache hits and ML model spans. With --overhead, also time the same '
+        'requests with the middleware switched off.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Paths to request, e.g. / /products/?search=shoes')
+        parser.add_argument('--repeat', type=int, default=100, help='Requests per path (default: 100)')
+        parser.add_argument('--user', help='Log in as this username first')
+        parser.add_argument('--overhead', action='store_true',
+                            help='Compare the time per request with and without instrumentation')
+        parser.add_argument('--json', action='store_true', help='Dump the histograms as JSON')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user {options['user']!r}")
+
+        paths, repeat = options['paths'], options['repeat']
+        if options['overhead']:
+            with override_settings(REQUEST_METRICS=False):
+                plain_client = self.warm_client(paths, user)
+        client = self.warm_client(paths, user)
+        metrics.reset()
+        if options['overhead']:
+            # Interleaved rounds, best of each, so drift in the machine's load affects both sides alike
+            plain, timed = float('inf'), float('inf')
+            for _ in range(5):
+                plain = min(plain, self.time_requests(plain_client, paths, repeat))
+                timed = min(timed, self.time_requests(client, paths, repeat))
+        else:
+            self.time_requests(client, paths, repeat)
+
+        snapshot = metrics.snapshot()
+        if options['json']:
+            self.stdout.write(json.dumps(snapshot, indent=2))
+        else:
+            self.report(snapshot)
+        if options['overhead']:
+            self.stdout.write(
+                f"Per request: {plain * 1000:.3f} ms without instrumentation, {timed * 1000:.3f} ms with "
+                f"({(timed - plain) / plain:+.1%})"
+            )
+
+    def warm_client(self, paths, user):
+        # The client loads the middleware on its first request, under the settings in force then
+        client = Client()
+        if user:
+            client.force_login(user)
+        for path in paths:
+            client.get(path)
+        return client
+
+    def time_requests(self, client, paths, repeat):
+        """Seconds per request over repeat rounds of the paths."""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for path in paths:
+                response = client.get(path)
+                if response.status_code >= 400:
+                    raise CommandError(f'{path} returned {response.status_code}')
+        return (time.perf_counter() - start) / (repeat * len(paths))
+
+    def report(self, snapshot):
+        self.stdout.write(f"{'view':<28}{'metric':<26}{'count':>7}{'mean':>10}{'p50':>8}{'p95':>8}{'p99':>8}")
+        for view, histograms in snapshot.items():
+            for name, histogram in histograms.items():
+                mean = histogram['mean']
+                self.stdout.write(
+                    f"{view:<28}{name:<26}{histogram['count']:>7}{'-' if mean is None else f'{mean:.2f}':>10}"
+                    + ''.join(f"{'>max' if histogram[p] is None else f'<={histogram[p]}':>8}"
+                              for p in ('p50', 'p95', 'p99'))
+                )
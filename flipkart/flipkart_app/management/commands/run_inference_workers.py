@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from flipkart_app.inference import run_pool
+
+
+class Command(BaseCommand):
+    help = 'Run the pool of ML inference worker processes that process queued verification jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.ML_INFERENCE_WORKERS,
+                            help='Number of worker processes')
+        parser.add_argument('--threads', type=int, default=settings.ML_INFERENCE_THREADS,
+                            help='Intra-op torch threads per worker, pinned to their own CPUs')
+        parser.add_argument('--batch-size', type=int, default=settings.ML_BATCH_SIZE,
+                            help='Maximum number of jobs a worker runs in one batch')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['workers']} inference worker(s), Ctrl+C to stop")
+        try:
+            run_pool(workers=options['workers'], threads=options['threads'], batch_size=options['batch_size'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from flipkart_app import scale_feed
+from flipkart_app.sample_recorder import get_recorder
+from flipkart_app.scale import get_stream
+from flipkart_app.stations import get_manager
+
+
+class Command(BaseCommand):
+    help = ('Read the packing scales (SCALE_PORT and SCALE_STATIONS) and serve their readings to the '
+            'web workers on SCALE_FEED_ADDRESS. Run exactly one per host the scales are plugged into.')
+
+    def handle(self, *args, **options):
+        if not settings.SCALE_PORT and not settings.SCALE_STATIONS:
+            self.stderr.write('No scale is configured (SCALE_PORT, SCALE_STATIONS).')
+            return
+        recorder = get_recorder(settings.SCALE_RECORD_DIR) if settings.SCALE_RECORD_DIR else None
+        manager = None
+        if settings.SCALE_STATIONS:
+            manager = get_manager(settings.SCALE_STATIONS, settings.SCALE_BAUD_RATE, recorder)
+        stream = get_stream(settings.SCALE_PORT, settings.SCALE_BAUD_RATE, recorder) if settings.SCALE_PORT else None
+        server = scale_feed.FeedServer(tuple(settings.SCALE_FEED_ADDRESS), manager, stream)
+        self.stdout.write(f"Serving {len(settings.SCALE_STATIONS) + bool(stream)} scale(s) on "
+                          f"{server.server_address[0]}:{server.server_address[1]}, Ctrl+C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
+        finally:
+            server.server_close()
+            if manager is not None:
+                manager.stop()
+            if stream is not None:
+                stream.stop()
+            if recorder is not None:
+                recorder.close()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from flipkart_app import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic catalog, customers, sellers, order history, reviews and packing images '
+        'for benchmark_storefront. The same options always produce the same data. Run it '
+        'against a scratch database; --clear removes the seeded rows again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Products (default: 1000, up to ~1M)')
+        parser.add_argument('--customers', type=int, default=100, help='Customers (default: 100)')
+        parser.add_argument('--sellers', type=int, default=10, help='Sellers (default: 10)')
+        parser.add_argument('--orders', type=int, default=5, help='Orders per customer (default: 5)')
+        parser.add_argument('--reviews', type=int, default=2, help='Reviews per customer (default: 2)')
+        parser.add_argument('--images', type=int, default=20,
+                            help='Pending orders given a packing image to verify (default: 20)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Deleted {loadtest.clear()} rows')
+        counts = loadtest.seed(
+            products=options['products'], customers=options['customers'], sellers=options['sellers'],
+            orders=options['orders'], reviews=options['reviews'], images=options['images'], seed=options['seed'],
+            log=lambda message: self.stdout.write(f'  {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded ' + ', '.join(f'{count} {name.replace("_", " ")}' for name, count in counts.items())
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flipkart_app', '0010_order_packing_image_productvariant_verificationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerificationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_hash', models.CharField(max_length=64)),
+                ('model_name', models.CharField(max_length=50)),
+                ('model_version', models.CharField(max_length=64)),
+                ('label', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verification_results', to='flipkart_app.order')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='verificationresult',
+            constraint=models.UniqueConstraint(fields=('order', 'image_hash', 'model_name', 'model_version'), name='unique_verification_result'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flipkart_app', '0014_seller_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderProcessingLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('verdict_ready_at_open', models.BooleanField(default=False)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='flipkart_app.verificationjob')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_logs', to='flipkart_app.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_logs', to='flipkart_app.seller')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'opened_at'], name='processing_log_recent_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='orderprocessinglog',
+            constraint=models.UniqueConstraint(fields=('seller', 'order'), name='unique_processing_log'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:06
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    # Racing get_or_create calls may have left several rows per pair: keep the
+    # oldest, with the cart quantities added up
+    CartItem = apps.get_model('flipkart_app', 'CartItem')
+    WishlistItem = apps.get_model('flipkart_app', 'WishlistItem')
+    duplicates = CartItem.objects.values('cart_id', 'product_id').annotate(
+        keep=Min('id'), rows=Count('id'), quantity=Sum('quantity'),
+    ).filter(rows__gt=1).order_by()
+    for row in duplicates:
+        CartItem.objects.filter(pk=row['keep']).update(quantity=row['quantity'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(pk=row['keep']).delete()
+    duplicates = WishlistItem.objects.values('user_id', 'product_id').annotate(
+        keep=Min('id'), rows=Count('id'),
+    ).filter(rows__gt=1).order_by()
+    for row in duplicates:
+        WishlistItem.objects.filter(user_id=row['user_id'], product_id=row['product_id']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flipkart_app', '0017_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['-id'], name='product_in_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['category', '-id'], name='product_in_stock_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_featured', True), ('stock__gt', 0)), fields=['-id'], name='product_featured_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_item'),
+        ),
+        migrations.AddConstraint(
+            model_name='wishlistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_wishlist_item'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:40
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def fill_effective_prices(apps, schema_editor):
+    # Same arithmetic as models.effective_price, which historical models cannot call
+    Product = apps.get_model('flipkart_app', 'Product')
+    batch = []
+    for product in Product.objects.only('price', 'discount_percentage').iterator(chunk_size=1000):
+        product.effective_price = (product.price * (100 - product.discount_percentage) / 100).quantize(
+            Decimal('0.01'), ROUND_HALF_UP
+        )
+        batch.append(product)
+        if len(batch) == 1000:
+            Product.objects.bulk_update(batch, ['effective_price'])
+            batch = []
+    Product.objects.bulk_update(batch, ['effective_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flipkart_app', '0018_indexes_and_unique_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['effective_price', 'id'], name='product_in_stock_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['category', 'effective_price', 'id'], name='product_in_stock_cat_price_idx'),
+        ),
+    ]
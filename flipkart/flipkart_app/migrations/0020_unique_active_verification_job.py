@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:12
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def fail_duplicate_jobs(apps, schema_editor):
+    # Racing submissions may have queued several jobs per order: keep the oldest
+    VerificationJob = apps.get_model('flipkart_app', 'VerificationJob')
+    active = VerificationJob.objects.filter(status__in=['queued', 'running'])
+    duplicates = active.values('order_id').annotate(keep=Min('id'), jobs=Count('id')).filter(jobs__gt=1).order_by()
+    for row in duplicates:
+        active.filter(order_id=row['order_id']).exclude(pk=row['keep']).update(
+            status='failed', error='Duplicate of job %d' % row['keep'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flipkart_app', '0019_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='verificationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('order',), name='unique_active_verification_job'),
+        ),
+    ]
@@ -1,21 +1,151 @@
+import gc
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
 import torch
 from PIL import Image
 import torchvision.transforms as transforms
+from django.conf import settings
+
+from .instrumentation import span
+from .verification import DEFAULT_MODEL_DIR, model_checkpoints
+
+# Directory holding the saved checkpoints; override with ML_MODEL_DIR in settings
+MODEL_DIR = Path(getattr(settings, 'ML_MODEL_DIR', DEFAULT_MODEL_DIR))
+
+
+def _resident_bytes():
+    """Return the current resident set size of this process, or None if unknown."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Loads each PyTorch model on first use and keeps it for the life of the process.
+
+    Checkpoints are memory-mapped, so the weights live in the page cache and are
+    shared by every worker process instead of being copied into each one. Call
+    preload() before forking (e.g. gunicorn --preload) to load everything once in
+    the master process.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._models = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, filename):
+        """Register a checkpoint file (relative to MODEL_DIR) under the given name."""
+        self._paths[name] = MODEL_DIR / filename
+
+    def names(self):
+        return list(self._paths)
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        """Return the model registered under name, loading it on first access."""
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._load(name)
+        return model
+
+    def _load(self, name):
+        path = self._paths[name]
+        rss_before = _resident_bytes()
+        start = time.perf_counter()
+        try:
+            model = torch.load(path, map_location='cpu', mmap=True, weights_only=False)
+            mmapped = True
+        except RuntimeError:
+            # Legacy (non-zip) checkpoints cannot be memory-mapped
+            model = torch.load(path, map_location='cpu', weights_only=False)
+            mmapped = False
+        model.eval()
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+        load_seconds = time.perf_counter() - start
+        rss_after = _resident_bytes()
+
+        tensors = list(model.parameters()) + list(model.buffers())
+        self._metrics[name] = {
+            'path': str(path),
+            'load_seconds': load_seconds,
+            'parameter_bytes': sum(t.numel() * t.element_size() for t in tensors),
+            'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'mmapped': mmapped,
+        }
+        self._models[name] = model
+        return model
+
+    def install(self, name, model):
+        """Use an already built model for name instead of loading its checkpoint (e.g. a stub)."""
+        with self._lock:
+            self._models[name] = model
+
+    def snapshot(self):
+        """The models loaded so far, for restore() to put back (e.g. after installing stubs)."""
+        with self._lock:
+            return dict(self._models)
+
+    def restore(self, snapshot):
+        with self._lock:
+            self._models = dict(snapshot)
+
+    def preload(self, names=None):
+        """
+        Load the given models (all registered models by default) ahead of the first
+        request. Objects allocated so far are frozen out of the garbage collector so
+        forked workers do not dirty the shared pages while collecting.
+        """
+        for name in names or self.names():
+            self.get(name)
+        gc.freeze()
+
+    def metrics(self):
+        """Return load-time and memory metrics for every registered model."""
+        return {
+            name: dict(self._metrics.get(name, {'path': str(path)}), loaded=name in self._models)
+            for name, path in self._paths.items()
+        }
+
+
+registry = ModelRegistry()
+for _name, _filename in model_checkpoints().items():
+    registry.register(_name, _filename)
+
+# Old module-level names, resolved through the registry on access
+_LEGACY_MODEL_NAMES = {
+    'object_detection_model': 'object_detection',
+    'expiry_check_model': 'expiry_check',
+    'freshness_check_model': 'freshness_check',
+}
+
+
+def __getattr__(name):
+    if name in _LEGACY_MODEL_NAMES:
+        return registry.get(_LEGACY_MODEL_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def preload_models():
+    """Warm-up hook: load every registered model in the current process."""
+    registry.preload()
 
-# Load each PyTorch model
-# Modify the path to your actual saved model paths
-object_detection_model = torch.load('flipkart/flipkart_app/ml_models/packed_and_unpacked.pt')
-expiry_check_model = torch.load('flipkart/flipkart_app/ml_models/expmrp.pt')
-freshness_check_model = torch.load('flipkart/flipkart_app/ml_models/fruit.pth')
-#product_count_model = torch.load('path/to/product_count_model.pt')
-#weight_verification_model = torch.load('path/to/weight_verification_model.pt')
-
-# Set models to evaluation mode (if necessary)
-object_detection_model.eval()
-expiry_check_model.eval()
-freshness_check_model.eval()
-#product_count_model.eval()
-#weight_verification_model.eval()
 
 # Define transformations (this may vary depending on how your models were trained)
 transform = transforms.Compose([
@@ -23,56 +153,191 @@ transform = transforms.Compose([
     transforms.ToTensor(),
 ])
 
+# Model name -> (label when the predicted class is 1, label otherwise)
+CHECK_LABELS = {
+    'object_detection': ('Packed', 'Unpacked'),
+    'expiry_check': ('Valid', 'Expired'),
+    'freshness_check': ('Fresh', 'Not Fresh'),
+    # 'product_count': (True, False),
+}
+
+class TensorCache:
+    """
+    Size-bounded LRU cache of decoded image tensors, keyed by image content hash,
+    so re-verifying an unchanged image (e.g. after a model upgrade) skips decoding.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._tensors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            tensor = self._tensors.get(key)
+            if tensor is not None:
+                self._tensors.move_to_end(key)
+            return tensor
+
+    def put(self, key, tensor):
+        size = tensor.numel() * tensor.element_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._tensors:
+                return
+            self._tensors[key] = tensor
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._tensors.popitem(last=False)
+                self.current_bytes -= evicted.numel() * evicted.element_size()
+
+    def __len__(self):
+        return len(self._tensors)
+
+
+tensor_cache = TensorCache(getattr(settings, 'ML_TENSOR_CACHE_BYTES', 256 * 1024 * 1024))
+
+
+def load_image(source, cache_key=None):
+    """
+    Decode and transform one input into a (C, H, W) tensor. The source can be an
+    order with a product_image_path, a path or file object, or a PIL image. With a
+    cache_key (the image content hash) the decoded tensor is kept in tensor_cache.
+    """
+    if cache_key is not None:
+        tensor = tensor_cache.get(cache_key)
+        if tensor is not None:
+            return tensor
+    source = getattr(source, 'product_image_path', source)
+    if source is None:
+        raise ValueError('No packing image to verify')
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    tensor = transform(image.convert('RGB'))
+    if cache_key is not None:
+        tensor_cache.put(cache_key, tensor)
+    return tensor
+
+
+def run_ml_model_batch(orders, models=None, cache_keys=None):
+    """
+    Run the ML models on a batch of orders (or images) and return one result
+    dictionary per input, in the same order. Images are decoded together and
+    stacked into a single tensor so each model runs once for the whole batch.
+
+    models optionally gives, per input, the model names to run for it (all
+    models by default); cache_keys gives per-input keys for tensor_cache.
+    """
+    if not orders:
+        return []
+    cache_keys = cache_keys or [None] * len(orders)
+    # Decode in parallel threads; PIL releases the GIL while decoding
+    with span('ml.decode'), ThreadPoolExecutor(max_workers=getattr(settings, 'ML_DECODE_THREADS', 4)) as pool:
+        images = torch.stack(list(pool.map(load_image, orders, cache_keys)))
+
+    results = [{} for _ in orders]
+    with torch.inference_mode():
+        for name, (positive, negative) in CHECK_LABELS.items():
+            rows = [i for i in range(len(orders)) if models is None or name in models[i]]
+            if not rows:
+                continue
+            batch = images if len(rows) == len(orders) else images[rows]
+            with span(f'ml.{name}'):
+                outputs = registry.get(name)(batch)
+            # Convert model output into a readable format (one prediction per row)
+            predictions = outputs.reshape(len(rows), -1).argmax(dim=1).tolist()
+            for i, prediction in zip(rows, predictions):
+                results[i][name] = positive if prediction == 1 else negative
+
+    # Weight verification is handled by the scale, not by a model here
+    return results
+
+
+class MicroBatcher:
+    """
+    Coalesces single-item requests from concurrent callers into batches.
+
+    A background thread waits for the first request, then collects more until the
+    batch is full or max_wait seconds have passed, and runs them all at once.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait=0.01):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, item):
+        """Queue an item and return a Future for its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._work, name='ml-micro-batcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.run_batch([item for item, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # Retry one by one so a single bad input does not fail the others
+                for item, future in batch:
+                    try:
+                        future.set_result(self.run_batch([item])[0])
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+batcher = MicroBatcher(
+    run_ml_model_batch,
+    max_batch_size=getattr(settings, 'ML_BATCH_SIZE', 32),
+    max_wait=getattr(settings, 'ML_BATCH_MAX_WAIT', 0.01),
+)
+
+
 def run_ml_model(order):
     """
-    This function runs all ML models on the given order to verify object detection, expiry, 
-    freshness, product count, and weight.
+    This function runs all ML models on the given order to verify object detection, expiry,
+    freshness, product count, and weight. Concurrent calls are coalesced into one batch.
     """
-    # Placeholder for input data (replace with actual input data for each model)
-    # For example, if you are passing images from the product, load the image files here
-    product_image_path = order.product_image_path  # Replace with actual image path from the order
-    product_weight = order.weight                  # Replace with actual weight value from the order
-
-    # Load product image
-    image = Image.open(product_image_path)
-    image = transform(image)
-    image = image.unsqueeze(0)  # Add batch dimension
-
-    # Object Detection (Packing Status)
-    with torch.no_grad():
-        object_detection_output = object_detection_model(image)
-        # Convert model output into a readable format (example output parsing)
-        object_detection_result = 'Packed' if object_detection_output.argmax() == 1 else 'Unpacked'
-
-    # Expiry Check
-    with torch.no_grad():
-        expiry_check_output = expiry_check_model(image)
-        expiry_check_result = 'Valid' if expiry_check_output.argmax() == 1 else 'Expired'
-
-    # Freshness Detection
-    with torch.no_grad():
-        freshness_check_output = freshness_check_model(image)
-        freshness_check_result = 'Fresh' if freshness_check_output.argmax() == 1 else 'Not Fresh'
-
-    # Product Count Verification (assuming you have an ML model for this)
-    # with torch.no_grad():
-    #     product_count_output = product_count_model(image)
-    #     product_count_result = True if product_count_output.argmax() == 1 else False
-
-    # # Weight Verification
-    # # Assuming the weight verification model takes actual and expected weights as input
-    # with torch.no_grad():
-    #     weight_verification_input = torch.tensor([product_weight], dtype=torch.float32)
-    #     weight_verification_output = weight_verification_model(weight_verification_input)
-    #     weight_verification_result = True if weight_verification_output.argmax() == 1 else False
-
-    # Compile all results into a single dictionary
-    result = {
-        'object_detection': object_detection_result,
-        'expiry_check': expiry_check_result,
-        'freshness_check': freshness_check_result,
-        # 'product_count_check': product_count_result,
-        # 'weight_verification': weight_verification_result
-    }
-
-    return result
+    # The batch runs on the batcher's thread, outside the request, and its spans go
+    # to the background histograms; the caller's request is charged for its wait
+    with span('ml.run_ml_model'):
+        return batcher(order)
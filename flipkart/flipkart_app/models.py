@@ -1,13 +1,23 @@
-from django.db import models
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, Round
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from django.dispatch import Signal
 
 # Custom User model with flags for seller and customer roles
 class User(AbstractUser):
     is_customer = models.BooleanField(default=False)
     is_seller = models.BooleanField(default=False)
 
+    @property
+    def seller(self):
+        # Sellers hang off the profile; the seller views use request.user.seller
+        return self.profile.seller
+
     def __str__(self):
         return self.username
 
@@ -56,7 +66,7 @@ class Seller(models.Model):
 
 # Category model to manage product categories
 class Category(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)  # product lists filter by category name
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='category_images/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -68,6 +78,95 @@ class Category(models.Model):
         return self.name
 
 
+_PRICE = DecimalField(max_digits=12, decimal_places=2)
+
+# Fields Product.effective_price is computed from
+PRICE_FIELDS = {'price', 'discount_percentage'}
+
+
+def effective_price(price, discount_percentage):
+    """price less discount_percentage percent, rounded half up to two places, in exact Decimal arithmetic."""
+    price = Decimal(str(price))
+    return (price * (100 - int(discount_percentage)) / 100).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+# Sent with product_ids after ProductQuerySet.update/bulk_create/bulk_update, which
+# bypass post_save (the facet index listens to both). Updates that only touch fields
+# outside FACET_FIELDS, the ones the facet index reads, do not send it.
+products_changed = Signal()
+FACET_FIELDS = {'category', 'seller', 'price', 'discount_percentage', 'effective_price', 'stock', 'is_featured',
+                'rating_sum', 'review_count'}
+
+
+def changes_facets(model, fields):
+    """Whether writing these fields (names or attnames) can move a product to other facet options."""
+    return bool(FACET_FIELDS & {model._meta.get_field(name).name for name in fields})
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps effective_price in step with price and discount_percentage in bulk writes too,
+    and sends products_changed for them.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for product in objs:
+            product.effective_price = effective_price(product.price, product.discount_percentage)
+        created = super().bulk_create(objs, *args, **kwargs)
+        products_changed.send(sender=self.model, product_ids=[product.pk for product in created if product.pk])
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if PRICE_FIELDS & set(fields):
+            for product in objs:
+                product.effective_price = effective_price(product.price, product.discount_percentage)
+            fields = [*fields, 'effective_price']
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if changes_facets(self.model, fields):
+            products_changed.send(sender=self.model, product_ids=[product.pk for product in objs])
+        return rows
+
+    def update(self, **kwargs):
+        reprice = bool(PRICE_FIELDS & kwargs.keys())
+        notify = changes_facets(self.model, kwargs) and products_changed.has_listeners(self.model)
+        if not reprice and not notify:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            # The rows matching the filter may not match it after the update, so note them first
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            if reprice:
+                # The new prices may be expressions, so read them back and recompute in Python
+                base = self.model._base_manager.using(self.db)
+                products = list(base.filter(pk__in=pks).only(*PRICE_FIELDS))
+                for product in products:
+                    product.effective_price = effective_price(product.price, product.discount_percentage)
+                base.bulk_update(products, ['effective_price'], batch_size=1000)
+        if notify and pks:
+            products_changed.send(sender=self.model, product_ids=pks)
+        return rows
+
+    def reserve_stock(self, quantities):
+        """
+        Take {product_id: quantity} off the products' stock, with one conditional
+        UPDATE per product (stock = stock - n WHERE stock >= n) in id order, and
+        send a single products_changed for them. Returns the ids that were short.
+        """
+        short = []
+        for product_id, quantity in sorted(quantities.items()):
+            # Filtered by pk, so the row is known; skip update()'s read of the pks
+            if not super(ProductQuerySet, self.filter(pk=product_id, stock__gte=quantity)).update(
+                stock=F('stock') - quantity
+            ):
+                short.append(product_id)
+        reserved = sorted(quantities.keys() - set(short))
+        if reserved:
+            products_changed.send(sender=self.model, product_ids=reserved)
+        return short
+
+
 # Product model with handling for packing status, discounts, and soft deletion
 class Product(models.Model):
     seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='products')
@@ -80,12 +179,55 @@ class Product(models.Model):
     is_packed = models.BooleanField(default=False)  
     is_featured = models.BooleanField(default=False)
     discount_percentage = models.PositiveIntegerField(default=0)
+    # price less the discount, stored so the catalog can filter and sort on it; set by save()
+    # and the ProductQuerySet bulk methods, never directly
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    # Review aggregates, kept current by Review.save/delete (see ratings.py)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    ratings_1 = models.PositiveIntegerField(default=0)
+    ratings_2 = models.PositiveIntegerField(default=0)
+    ratings_3 = models.PositiveIntegerField(default=0)
+    ratings_4 = models.PositiveIntegerField(default=0)
+    ratings_5 = models.PositiveIntegerField(default=0)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Product lists only show what is in stock, newest first, optionally within one category
+            models.Index(fields=['-id'], condition=Q(stock__gt=0), name='product_in_stock_idx'),
+            models.Index(fields=['category', '-id'], condition=Q(stock__gt=0), name='product_in_stock_category_idx'),
+            models.Index(fields=['-id'], condition=Q(is_featured=True, stock__gt=0), name='product_featured_idx'),
+            # ... or within a price range and sorted by price
+            models.Index(fields=['effective_price', 'id'], condition=Q(stock__gt=0),
+                         name='product_in_stock_price_idx'),
+            models.Index(fields=['category', 'effective_price', 'id'], condition=Q(stock__gt=0),
+                         name='product_in_stock_cat_price_idx'),
+        ]
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    @property
+    def rating_histogram(self):
+        """[(stars, reviews, percent of reviews)] from 5 stars down to 1."""
+        return [
+            (stars, count, round(100 * count / self.review_count) if self.review_count else 0)
+            for stars in range(5, 0, -1)
+            for count in [getattr(self, f'ratings_{stars}')]
+        ]
 
     def discounted_price(self):
-        if self.discount_percentage > 0:
-            discount = (self.discount_percentage / 100) * self.price
-            return self.price - discount
-        return self.price
+        return self.effective_price
+
+    def save(self, *args, **kwargs):
+        self.effective_price = effective_price(self.price, self.discount_percentage)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and PRICE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} - {self.category.name}"
@@ -103,26 +245,67 @@ class ProductVariant(models.Model):
         return f"{self.product.name} - {self.variant_name}: {self.variant_value}"
 
 
+# Line subtotal of a cart item, computed by the database
+_SUBTOTAL = ExpressionWrapper(F('product__effective_price') * F('quantity'), output_field=_PRICE)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate each cart with the sum of its discounted line subtotals as `total`."""
+        totals = CartItem.objects.filter(cart=OuterRef('pk')).values('cart').annotate(total=Sum(_SUBTOTAL))
+        return self.annotate(total=Coalesce(Subquery(totals.values('total')), Value(Decimal('0')),
+                                            output_field=_PRICE))
+
+
 # Cart model for managing user's cart
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def get_total(self):
-        return sum(item.get_subtotal() for item in self.items.all())
+        if hasattr(self, 'total'):
+            total = self.total
+        else:
+            total = self.items.aggregate(total=Coalesce(Sum(_SUBTOTAL), Value(Decimal('0'))))['total']
+        return total.quantize(Decimal('0.01'), ROUND_HALF_UP)
 
     def __str__(self):
         return f"{self.user.username}'s Cart"
 
 
+class CartItemQuerySet(models.QuerySet):
+    def with_prices(self):
+        """
+        Load each item with its product in one joined query, annotated in SQL with
+        unit_price, subtotal and cart_total (the sum over the whole queryset).
+        """
+        return self.select_related('product').annotate(
+            unit_price=F('product__effective_price'),
+            subtotal=_SUBTOTAL,
+            cart_total=Round(Window(Sum(_SUBTOTAL)), 2, output_field=_PRICE),
+        ).order_by('id')
+
+
 # CartItem model to store products in the cart
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One line per product; adding it again bumps the quantity
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_item'),
+        ]
+
     def get_subtotal(self):
+        if hasattr(self, 'subtotal'):
+            return self.subtotal
         return self.product.discounted_price() * self.quantity
 
     def __str__(self):
@@ -153,6 +336,18 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    packing_image = models.ImageField(upload_to='packing_images/', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Order history pages seek on (user, created_at); the id tiebreak rides along
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_idx'),
+        ]
+
+    @property
+    def product_image_path(self):
+        return self.packing_image.path if self.packing_image else None
 
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
@@ -172,6 +367,154 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
 
 
+# Verification job queued for the out-of-process ML inference workers
+class VerificationJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='verification_jobs', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+        constraints = [
+            # At most one queued or running job per order, however many requests submit it
+            models.UniqueConstraint(fields=['order'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='unique_active_verification_job'),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"Verification {self.id} for order {self.order_id} ({self.status})"
+
+
+# Stored output of one ML model for an order's packing image, reused until the image or model changes
+class VerificationResult(models.Model):
+    order = models.ForeignKey(Order, related_name='verification_results', on_delete=models.CASCADE)
+    image_hash = models.CharField(max_length=64)
+    model_name = models.CharField(max_length=50)
+    model_version = models.CharField(max_length=64)
+    label = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order', 'image_hash', 'model_name', 'model_version'],
+                name='unique_verification_result',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} for order {self.order_id}: {self.label}"
+
+
+# Denormalised link between a seller and an order containing their products, carrying
+# the seller's share of the order so dashboards never join through order items
+class SellerOrder(models.Model):
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='seller_orders')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='seller_orders')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+    units = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'order'], name='unique_seller_order'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'created_at', 'id'], name='seller_order_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} for seller {self.seller_id}"
+
+
+# Per-seller, per-day totals over SellerOrder; revenue and units exclude cancelled orders
+class SellerDailyStats(models.Model):
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    pending = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Seller daily stats'
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'date'], name='unique_seller_day'),
+        ]
+
+    def __str__(self):
+        return f"Seller {self.seller_id} on {self.date}"
+
+
+# One seller's handling of one order in the processing queue: when they opened it,
+# whether its ML verdict was already waiting (prefetched), and when they finished it
+class OrderProcessingLog(models.Model):
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='processing_logs')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='processing_logs')
+    job = models.ForeignKey(VerificationJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    opened_at = models.DateTimeField(auto_now_add=True)
+    verdict_ready_at_open = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'order'], name='unique_processing_log'),
+        ]
+        indexes = [models.Index(fields=['seller', 'opened_at'], name='processing_log_recent_idx')]
+
+    @property
+    def time_to_verdict(self):
+        """Seconds the seller waited for the ML verdict after opening the order, or None if still waiting."""
+        if self.verdict_ready_at_open:
+            return 0.0
+        if self.job is None or self.job.finished_at is None:
+            return None
+        return max((self.job.finished_at - self.opened_at).total_seconds(), 0.0)
+
+    def __str__(self):
+        return f"Order {self.order_id} processed by seller {self.seller_id}"
+
+
+# Precomputed "customers also bought" list: the top related products of each product,
+# rebuilt offline by `manage.py compute_related_products`
+class RelatedProduct(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_products')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_from')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.related_id} is #{self.rank} related to {self.product_id}"
+
+
 # Review model for product reviews
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
@@ -180,6 +523,18 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Product pages list reviews newest first, a page at a time
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_recent_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The product aggregates are updated by the Review signals in signals.py;
+        # saving atomically keeps them in step with the review row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username}'s review on {self.product.name}"
 
@@ -190,6 +545,9 @@ class WishlistItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'product'], name='unique_wishlist_item')]
+
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
 
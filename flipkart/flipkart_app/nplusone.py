@@ -0,0 +1,180 @@
+import logging
+import re
+import sys
+from collections import defaultdict
+from contextlib import ContextDecorator, ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor, ReverseOneToOneDescriptor
+from django.db.models.query import QuerySet
+
+logger = logging.getLogger(__name__)
+
+_collector = ContextVar('nplusone_collector', default=None)
+
+# Placeholder lists of IN (...) clauses vary in length with the parameters
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+_DJANGO_DIR = str(Path(sys.modules['django'].__file__).parent)
+_PROJECT_DIR = str(settings.BASE_DIR)
+# Project modules that wrap every query or render rather than ask for any
+_WRAPPERS = {__file__, str(Path(__file__).with_name('instrumentation.py'))}
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class Finding(NamedTuple):
+    view: str
+    count: int
+    sql: str
+    attribute: Optional[str]  # e.g. 'CartItem.product' or 'Order.items'
+    template: Optional[str]   # e.g. 'flipkart_app/cart.html, line 23'
+    code: Optional[str]       # innermost project frame, e.g. 'flipkart_app/views.py:42 in cart_detail'
+
+    def __str__(self):
+        where = ', '.join(part for part in [
+            f'via {self.attribute}' if self.attribute else None,
+            f'at {self.template}' if self.template else None,
+            f'from {self.code}' if self.code else None,
+        ] if part)
+        return f'{self.view}: {self.count} queries shaped like {self.sql!r} ({where or "origin unknown"})'
+
+
+def fingerprint(sql):
+    """The query's shape: its SQL with placeholders, IN lists collapsed."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _origin(frame):
+    """(attribute, template line, project code line) behind the query being run in frame."""
+    attribute = template = code = None
+    while frame is not None:
+        local_self = frame.f_locals.get('self')
+        if attribute is None:
+            attribute = _attribute(local_self)
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            template = f'{local_self.origin.template_name or local_self.origin.name}, line {local_self.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code is None and filename.startswith(_PROJECT_DIR) and filename not in _WRAPPERS \
+                and not filename.startswith(_DJANGO_DIR):
+            code = f'{Path(filename).relative_to(_PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return attribute, template, code
+
+
+def _attribute(obj):
+    # Forward foreign keys and one-to-ones load inside the descriptor; related managers
+    # hand out querysets that remember the instance they belong to. type() rather than
+    # isinstance(), which would evaluate lazy objects such as request.user.
+    cls = type(obj)
+    if issubclass(cls, ForwardManyToOneDescriptor):
+        return f'{obj.field.model.__name__}.{obj.field.name}'
+    if issubclass(cls, ReverseOneToOneDescriptor):
+        return f'{obj.related.model.__name__}.{obj.related.get_accessor_name()}'
+    if issubclass(cls, QuerySet) and obj._hints.get('instance') is not None:
+        for field in obj._known_related_objects:
+            return f'{type(obj._hints["instance"]).__name__}.{field.remote_field.get_accessor_name()}'
+    return None
+
+
+class QueryCollector:
+    """Fingerprints every query run while it is active, grouped by request."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.view = '(outside requests)'
+        self._requests = [self._new_request()]
+
+    @staticmethod
+    def _new_request():
+        return defaultdict(list)  # fingerprint: [(params, view, origin)]
+
+    def begin_request(self, path):
+        self._requests.append(self._new_request())
+        self.view = path
+
+    def end_request(self):
+        # Queries between requests, e.g. a test logging in, are grouped apart from the requests
+        self._requests.append(self._new_request())
+        self.view = '(outside requests)'
+
+    def execute(self, execute, sql, params, many, context):
+        self._requests[-1][fingerprint(sql)].append((repr(params), self.view, _origin(sys._getframe(1))))
+        return execute(sql, params, many, context)
+
+    def findings(self):
+        """Query shapes run at least threshold times in one request with different parameters."""
+        found = []
+        for queries in self._requests:
+            for sql, runs in queries.items():
+                if len(runs) >= self.threshold and len({params for params, _, _ in runs}) > 1:
+                    _, view, (attribute, template, code) = runs[-1]
+                    found.append(Finding(view, len(runs), sql, attribute, template, code))
+        return found
+
+
+class detect_nplusone(ContextDecorator):
+    """
+    Report N+1 queries run inside the block or decorated test: query shapes that
+    repeat within one request (or outside requests) with different parameters.
+    With fail=True an NPlusOneError lists them; otherwise they are logged. Use
+    collector.findings() on the object returned by `with` to inspect them.
+    """
+
+    def __init__(self, threshold=None, fail=True):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.fail = fail
+
+    def __enter__(self):
+        self.collector = QueryCollector(self.threshold)
+        self._token = _collector.set(self.collector)
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.collector.execute))
+        return self.collector
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        _collector.reset(self._token)
+        findings = self.collector.findings()
+        if findings and exc_type is None:
+            report = 'N+1 queries:\n' + '\n'.join(f'  {finding}' for finding in findings)
+            if self.fail:
+                raise NPlusOneError(report)
+            logger.warning(report)
+        return False
+
+
+class NPlusOneMiddleware:
+    """
+    Tells an active detector (e.g. a decorated test) where each request starts
+    and which view it runs. With settings.NPLUSONE_DETECTOR set to 'log' or
+    'raise' it also checks every request itself; meant for development.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = _collector.get()
+        if collector is not None:
+            collector.begin_request(request.path)
+            try:
+                return self.get_response(request)
+            finally:
+                collector.end_request()
+        if settings.NPLUSONE_DETECTOR:
+            with detect_nplusone(fail=settings.NPLUSONE_DETECTOR == 'raise'):
+                return self.__call__(request)
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        collector = _collector.get()
+        if collector is not None:
+            collector.view = request.resolver_match.view_name
@@ -0,0 +1,121 @@
+import logging
+import statistics
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inference import QueueFull, verify_order
+from .models import Order, OrderProcessingLog, SellerOrder
+from .pagination import encode_cursor, keyset_page
+from .seller_metrics import refresh_day
+
+logger = logging.getLogger(__name__)
+
+
+def pending_orders(seller):
+    """The seller's pending orders in processing order: oldest first."""
+    return SellerOrder.objects.filter(seller=seller, status=Order.STATUS_PENDING).select_related('order')
+
+
+def next_orders(seller, cursor=None):
+    """
+    The order to process now plus the ML_PREFETCH_DEPTH orders after it, as
+    SellerOrder rows, and the cursor that skips past the current one.
+    """
+    rows, _ = keyset_page(pending_orders(seller), cursor, settings.ML_PREFETCH_DEPTH + 1, newest_first=False)
+    return rows, encode_cursor(rows[0].created_at, rows[0].pk) if rows else None
+
+
+def prefetch(orders):
+    """
+    Queue verification for orders the seller will open next, so their verdicts
+    are ready by then. Orders without a packing image are skipped, and a full
+    queue stops prefetching rather than delaying the page.
+    """
+    for order in orders:
+        if not order.packing_image:
+            continue
+        try:
+            verify_order(order)
+        except QueueFull:
+            logger.info("Verification queue full, not prefetching order %s", order.id)
+            break
+
+
+def open_order(seller, order):
+    """
+    Record that the seller opened the order and return (result, job, log). The
+    first time an order is opened, log whether its verdict was already waiting.
+    """
+    result, job = verify_order(order) if order.packing_image else (None, None)
+    ready = job is None or job.is_finished
+    log, created = OrderProcessingLog.objects.get_or_create(
+        seller=seller, order=order, defaults={'job': job, 'verdict_ready_at_open': bool(order.packing_image) and ready},
+    )
+    if not created and job is not None and log.job_id != job.id:
+        log.job = job
+        log.save(update_fields=['job'])
+    return result, job, log
+
+
+def complete_order(seller, order):
+    """
+    Move the seller's part of a verified order on to processing and close their
+    log entry. The order itself moves on once every seller in it has done so.
+    """
+    with transaction.atomic():
+        # Completions of one order by different sellers take turns, so the last one sees the others
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        link = SellerOrder.objects.get(seller=seller, order=order)
+        if link.status == Order.STATUS_PENDING:
+            SellerOrder.objects.filter(pk=link.pk).update(status=Order.STATUS_PROCESSING)
+            refresh_day(seller.pk, timezone.localdate(link.created_at))
+        OrderProcessingLog.objects.update_or_create(
+            seller=seller, order=order, defaults={'completed_at': timezone.now()},
+        )
+        if order.status == Order.STATUS_PENDING and \
+                not SellerOrder.objects.filter(order=order, status=Order.STATUS_PENDING).exists():
+            order.status = Order.STATUS_PROCESSING
+            order.save(update_fields=['status', 'updated_at'])
+    return order
+
+
+def _active_seconds(logs):
+    """Seconds during which the seller had at least one of the completed orders open."""
+    spans = sorted((log.opened_at, log.completed_at) for log in logs if log.completed_at is not None)
+    total, end = 0.0, None
+    for opened, completed in spans:
+        if end is None or opened > end:
+            total += (completed - opened).total_seconds()
+            end = completed
+        elif completed > end:
+            total += (completed - end).total_seconds()
+            end = completed
+    return total
+
+
+def queue_metrics(seller, window=timedelta(hours=8)):
+    """
+    Throughput and time-to-verdict of the seller's queue over the last window:
+    orders completed per hour the seller spent with an order open (idle time
+    does not count), the median and 95th percentile seconds a seller waited for
+    a verdict after opening an order, and the share of orders whose verdict was
+    already there (prefetch hit rate).
+    """
+    since = timezone.now() - window
+    logs = list(
+        OrderProcessingLog.objects.filter(seller=seller, opened_at__gte=since).select_related('job')
+    )
+    completed = sum(1 for log in logs if log.completed_at is not None)
+    active = _active_seconds(logs)
+    waits = sorted(wait for wait in (log.time_to_verdict for log in logs) if wait is not None)
+    return {
+        'opened': len(logs),
+        'completed': completed,
+        'orders_per_hour': completed / (active / 3600) if active else None,
+        'verdict_wait_p50': statistics.median(waits) if waits else None,
+        'verdict_wait_p95': waits[max(int(len(waits) * 0.95) - 1, 0)] if waits else None,
+        'prefetch_hit_rate': sum(log.verdict_ready_at_open for log in logs) / len(logs) if logs else None,
+    }
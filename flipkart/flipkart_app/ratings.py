@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Product, Review
+
+RATINGS = range(1, 6)
+HISTOGRAM_FIELDS = [f'ratings_{stars}' for stars in RATINGS]
+AGGREGATE_FIELDS = ['review_count', 'rating_sum'] + HISTOGRAM_FIELDS
+
+
+def check_rating(rating):
+    """Raise ValueError unless rating is a whole number of stars from 1 to 5."""
+    if not isinstance(rating, int) or rating not in RATINGS:
+        raise ValueError(f'Rating must be one of {list(RATINGS)}, not {rating!r}')
+
+
+def update_product_ratings(product_id, rating, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one review with the given rating from the
+    product's stored aggregates, in a single UPDATE with F() expressions so
+    concurrent reviews never lose an increment.
+    """
+    check_rating(rating)
+    Product.objects.filter(pk=product_id).update(**{
+        'review_count': F('review_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+        f'ratings_{rating}': F(f'ratings_{rating}') + sign,
+    })
+
+
+def reconcile_ratings(product_ids=None, dry_run=False, batch_size=2000):
+    """
+    Recompute the review aggregates of every product (or of product_ids) from
+    the reviews and fix the products whose stored values differ, e.g. after
+    bulk_create or queryset updates, which bypass the Review signals. Returns
+    the number of products fixed.
+    """
+    reviews = Review.objects.all()
+    products = Product.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    expected = {
+        row.pop('product_id'): row
+        for row in reviews.values('product_id').annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'ratings_{stars}': Count('id', filter=Q(rating=stars)) for stars in RATINGS},
+        ).order_by()
+    }
+    empty = dict.fromkeys(AGGREGATE_FIELDS, 0)
+    stale = []
+    for product in products.only('id', *AGGREGATE_FIELDS).iterator(chunk_size=batch_size):
+        totals = expected.get(product.pk, empty)
+        if any(getattr(product, field) != totals[field] for field in AGGREGATE_FIELDS):
+            for field in AGGREGATE_FIELDS:
+                setattr(product, field, totals[field])
+            stale.append(product)
+    if not dry_run:
+        with transaction.atomic():
+            Product.objects.bulk_update(stale, AGGREGATE_FIELDS, batch_size=batch_size)
+    return len(stale)
@@ -0,0 +1,153 @@
+import csv
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+# File layout: a 16-byte header followed by fixed-width little-endian records.
+#   header: magic (8s), version (H), record size (H), record count (I)
+#   record: timestamp (d, unix seconds), station id (32s, UTF-8, NUL-padded), weight (f)
+# Version 1 files, with 8-byte station ids, can still be read.
+MAGIC = b'SCALEREC'
+VERSION = 2
+STATION_BYTES = 32
+HEADER = struct.Struct('<8sHHI')
+RECORD = struct.Struct(f'<d{STATION_BYTES}sf')
+_RECORDS = {1: struct.Struct('<d8sf'), VERSION: RECORD}
+_COUNT_OFFSET = 12
+
+
+class Record(NamedTuple):
+    timestamp: float
+    station: str
+    weight: float
+
+
+def encode_station(station: str) -> bytes:
+    """The station id as stored in a record; ValueError if it does not fit."""
+    encoded = station.encode('utf-8')
+    if len(encoded) > STATION_BYTES:
+        raise ValueError(f"Station id {station!r} is longer than {STATION_BYTES} bytes")
+    return encoded
+
+
+class SampleRecorder:
+    """
+    Appends weight samples to memory-mapped files of fixed-width binary records.
+
+    Each file is preallocated for records_per_file records and written through
+    mmap, so recording a sample is a struct.pack_into plus a header update, with
+    no formatting or system call. When a file is full a new one is started and
+    only the newest max_files files with this prefix are kept, including those of
+    earlier runs; recorders sharing a directory should use their own prefixes.
+    """
+
+    def __init__(self, directory, prefix: str = 'scale', records_per_file: int = 1_000_000, max_files: int = 10):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.records_per_file = records_per_file
+        self.max_files = max_files
+        self.path = None
+        self._file = None
+        self._map = None
+        self._count = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _open_next(self):
+        self._close_current()
+        self._sequence += 1
+        self.path = self.directory / (
+            f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}.bin"
+        )
+        size = HEADER.size + RECORD.size * self.records_per_file
+        self._file = open(self.path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, 0)
+        self._count = 0
+        self._prune()
+
+    def _prune(self):
+        files = [path for path in recording_files(self.directory, self.prefix) if path != self.path]
+        for old in files[:max(len(files) - self.max_files + 1, 0)]:
+            old.unlink(missing_ok=True)
+
+    def _close_current(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            # Trim the unused preallocated tail
+            self._file.truncate(HEADER.size + RECORD.size * self._count)
+            self._file.close()
+            self._map = self._file = None
+
+    def record(self, timestamp: float, station: str, weight: float):
+        station = encode_station(station)
+        with self._lock:
+            if self._map is None or self._count == self.records_per_file:
+                self._open_next()
+            RECORD.pack_into(self._map, HEADER.size + RECORD.size * self._count, timestamp, station, weight)
+            self._count += 1
+            struct.pack_into('<I', self._map, _COUNT_OFFSET, self._count)
+
+    def flush(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_current()
+
+
+def is_recording(path) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_records(path) -> Iterator[Record]:
+    """Yield the records stored in one recording file."""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        magic, version, record_size, count = HEADER.unpack(header)
+        record = _RECORDS.get(version)
+        if magic != MAGIC or record is None or record_size != record.size:
+            raise ValueError(f"{path} is not a version {min(_RECORDS)}-{VERSION} scale recording")
+        data = f.read(record_size * count)
+    for timestamp, station, weight in record.iter_unpack(data[:len(data) - len(data) % record_size]):
+        yield Record(timestamp, station.rstrip(b'\0').decode('utf-8'), weight)
+
+
+def export_csv(paths: Iterable, output):
+    """Write the records of the given recording files to output as CSV; returns the row count."""
+    writer = csv.writer(output)
+    writer.writerow(['timestamp', 'station', 'weight'])
+    rows = 0
+    for path in paths:
+        for record in read_records(path):
+            writer.writerow([f'{record.timestamp:.6f}', record.station, f'{record.weight:.3f}'])
+            rows += 1
+    return rows
+
+
+def recording_files(directory, prefix: str = 'scale'):
+    """Recording files in a directory, oldest first (names sort by creation time)."""
+    return sorted(Path(directory).glob(f'{prefix}-[0-9]*.bin'))
+
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def get_recorder(directory) -> SampleRecorder:
+    """Return the process-wide SampleRecorder writing to directory."""
+    with _recorders_lock:
+        recorder = _recorders.get(str(directory))
+        if recorder is None:
+            recorder = _recorders[str(directory)] = SampleRecorder(directory)
+        return recorder
@@ -1,20 +1,27 @@
+import argparse
+import asyncio
 import serial
+import threading
 import time
 import logging
+from typing import Callable, NamedTuple, Optional
 from serial.serialutil import SerialException
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+from .sample_recorder import SampleRecorder
+from .scale_pipeline import StabilityFilter, WeightEvent, parse_weight
+
+
+class WeightSample(NamedTuple):
+    timestamp: float
+    weight: float
+    raw: str
+
 
 class SerialReader:
     def __init__(self, port: str, baud_rate: int = 9600, timeout: int = 1):
         """
         Initialize the SerialReader with specified port, baud rate, and timeout.
-        
+
         :param port: The serial port (e.g., '/dev/ttyUSB0' for Linux or 'COM4' for Windows)
         :param baud_rate: Baud rate for serial communication
         :param timeout: Read timeout in seconds
@@ -32,20 +39,34 @@ class SerialReader:
                 baudrate=self.baud_rate,
                 timeout=self.timeout
             )
-            time.sleep(2)  # Wait for connection to stabilize
+            # Drop anything sent while the port was closed (or a partial boot banner);
+            # the blocking reads below simply wait until the scale starts talking
+            self.serial_connection.reset_input_buffer()
             logging.info(f"Connected to {self.port} at {self.baud_rate} baud.")
         except SerialException as e:
             logging.error(f"Failed to connect to {self.port}: {e}")
             raise
 
+    def read_line(self):
+        """
+        Block until a line arrives or the read timeout expires. Returns the line,
+        or None on timeout. Raises SerialException if the port fails.
+        """
+        if not (self.serial_connection and self.serial_connection.is_open):
+            raise SerialException(f"{self.port} is not open")
+        data = self.serial_connection.readline()
+        if not data:
+            return None
+        return data.decode('utf-8', errors='replace').strip()
+
     def read_data(self):
         """Read and return a single line of data from the serial port."""
         if self.serial_connection and self.serial_connection.is_open:
             try:
-                if self.serial_connection.in_waiting > 0:
-                    data = self.serial_connection.readline().decode('utf-8').strip()
-                    logging.info(f"Received data: {data}")
-                    return data
+                data = self.read_line()
+                if data:
+                    logging.debug(f"Received data: {data}")
+                return data
             except SerialException as e:
                 logging.error(f"Error reading data: {e}")
         else:
@@ -57,29 +78,206 @@ class SerialReader:
             self.serial_connection.close()
             logging.info("Serial connection closed.")
 
+
+class ScaleStream:
+    """
+    Streams weight samples from a scale without polling.
+
+    A dedicated thread blocks on the serial port, reconnecting with exponential
+    backoff whenever the port fails, and hands each parsed sample to asyncio
+    consumers of samples(). Every reading also goes through a StabilityFilter:
+    the latest raw reading and the latest stable (filtered) reading are kept for
+    synchronous callers such as Django views, and listeners registered with
+    add_listener() are called the moment a package settles or is removed.
+
+    Samples are written to a binary SampleRecorder when one is given; per-sample
+    text logging only happens at DEBUG level.
+    """
+
+    def __init__(self, port: str, baud_rate: int = 9600, timeout: float = 1,
+                 min_backoff: float = 0.5, max_backoff: float = 30,
+                 stability_filter: Optional[StabilityFilter] = None,
+                 recorder: Optional[SampleRecorder] = None, station_id: str = ''):
+        self.reader = SerialReader(port=port, baud_rate=baud_rate, timeout=timeout)
+        self.recorder = recorder
+        self.station_id = station_id
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.filter = stability_filter or StabilityFilter()
+        self.latest: Optional[WeightSample] = None
+        self.latest_stable: Optional[WeightSample] = None
+        self.connected = False
+        self._listeners = []
+        self._sample_listeners = []
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stable_changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.reader.port
+
+    def start(self):
+        """Start the reader thread (no-op if it is already running)."""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'scale-{self.port}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader thread and close the port."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.reader.close()
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            try:
+                self.reader.connect()
+                self.connected = True
+                backoff = self.min_backoff
+                while not self._stop.is_set():
+                    line = self.reader.read_line()
+                    if line:
+                        self._publish(line)
+            except (SerialException, OSError) as e:
+                logging.warning(f"Scale on {self.port} unavailable ({e}); retrying in {backoff:.1f}s")
+            finally:
+                self.connected = False
+                self.reader.close()
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _publish(self, line):
+        weight = parse_weight(line)
+        if weight is None:
+            return
+        sample = WeightSample(time.time(), weight, line)
+        if self.recorder is not None:
+            self.recorder.record(sample.timestamp, self.station_id, weight)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(f"Received data: {line}")
+        with self._lock:
+            self.latest = sample
+            event = self.filter.update(sample.timestamp, weight)
+            if self.filter.stable:
+                self.latest_stable = sample._replace(weight=self.filter.median)
+                self._stable_changed.notify_all()
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, sample)
+        for listener in self._sample_listeners:
+            try:
+                listener(self, sample)
+            except Exception:
+                logging.exception(f"Scale sample listener {listener!r} failed")
+        if event:
+            for listener in self._listeners:
+                try:
+                    listener(self, event)
+                except Exception:
+                    logging.exception(f"Scale listener {listener!r} failed")
+
+    def add_listener(self, listener: Callable[['ScaleStream', WeightEvent], None]):
+        """
+        Call listener(stream, event) on the reader thread whenever a package
+        settles (event.kind == SETTLED) or is removed from the scale.
+        """
+        self._listeners.append(listener)
+
+    def add_sample_listener(self, listener: Callable[['ScaleStream', WeightSample], None]):
+        """
+        Call listener(stream, sample) on the reader thread for every parsed reading.
+        Listeners run inline with the read loop, so they must not block.
+        """
+        self._sample_listeners.append(listener)
+
+    async def samples(self, maxsize: int = 1000):
+        """
+        Async generator yielding every parsed WeightSample as it arrives. If the
+        consumer falls more than maxsize samples behind, the oldest are dropped.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def wait_for_stable(self, after: float = 0, timeout: Optional[float] = None) -> Optional[WeightSample]:
+        """
+        Block until there is a stable reading newer than the `after` timestamp and
+        return it, or return None on timeout.
+        """
+        with self._stable_changed:
+            self._stable_changed.wait_for(
+                lambda: self.latest_stable is not None and self.latest_stable.timestamp > after,
+                timeout,
+            )
+            stable = self.latest_stable
+        return stable if stable is not None and stable.timestamp > after else None
+
+
+def _offer(queue, sample):
+    # Runs on the consumer's event loop; drop the oldest sample if it is full
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(sample)
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def get_stream(port: str, baud_rate: int = 9600, recorder: Optional[SampleRecorder] = None) -> ScaleStream:
+    """Return the running ScaleStream for a port, starting one on first use."""
+    with _streams_lock:
+        stream = _streams.get(port)
+        if stream is None:
+            stream = _streams[port] = ScaleStream(port=port, baud_rate=baud_rate, recorder=recorder).start()
+        return stream
+
+
 def main():
-    port = 'COM4'  # Update to the correct COM port
-    baud_rate = 9600  # Keep the baud rate as per the device configuration
+    parser = argparse.ArgumentParser(description='Read the packing scale.')
+    parser.add_argument('--port', default='COM4', help='Serial port of the scale')
+    parser.add_argument('--baud-rate', type=int, default=9600, help='Baud rate configured on the device')
+    parser.add_argument('--record', metavar='DIR', help='Record every sample to binary files in DIR')
+    parser.add_argument('--debug', action='store_true', help='Also log every sample as text')
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    recorder = SampleRecorder(args.record) if args.record else None
+    stream = ScaleStream(port=args.port, baud_rate=args.baud_rate, recorder=recorder)
+    stream.add_listener(lambda _, event: logging.info(f"Package {event.kind} at {event.weight}"))
+    stream.start()
 
-    reader = SerialReader(port=port, baud_rate=baud_rate)
-    
     try:
-        reader.connect()
-        
         while True:
-            data = reader.read_data()
-            if data:
-                # Process or log the received data here
-                logging.info(f"HI scale value: {data}")
+            time.sleep(1)
 
     except KeyboardInterrupt:
         logging.info("Interrupted by user. Exiting...")
 
-    except SerialException as e:
-        logging.error(f"Serial communication error: {e}")
-
     finally:
-        reader.close()
+        stream.stop()
+        if recorder:
+            recorder.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
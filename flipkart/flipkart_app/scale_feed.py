@@ -0,0 +1,116 @@
+import json
+import logging
+import socket
+import socketserver
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A serial port can only be read by one process, so `manage.py run_scales` owns
+# every port and serves the scales to the web workers over a local socket
+# (SCALE_FEED_ADDRESS). Each request is one JSON line answered by one JSON line:
+#   {"op": "reading", "station": ..., "after": ..., "wait": ...}
+#   {"op": "bind", "station": ..., "order_id": ...}
+# A reading request with a wait blocks in the owner on the stream's condition
+# variable until a newer stable reading arrives, so nobody polls.
+
+# The single SCALE_PORT scale is served under this station id
+DEFAULT_STATION = ''
+
+
+class FeedUnavailable(Exception):
+    """Raised when no run_scales process is answering on SCALE_FEED_ADDRESS."""
+
+
+def snapshot(stream, stable=None, order_id: Optional[int] = None) -> dict:
+    """The state of one ScaleStream as served to the web workers."""
+    latest = stream.latest
+    return {
+        'order_id': order_id,
+        'connected': stream.connected,
+        'weight': stable.weight if stable else None,
+        'timestamp': stable.timestamp if stable else None,
+        'latest_weight': latest.weight if latest else None,
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.answer(request)
+        except Exception as e:
+            logger.exception("Bad scale feed request")
+            response = {'error': f'{type(e).__name__}: {e}'}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class FeedServer(socketserver.ThreadingTCPServer):
+    """Serves the readings of a StationManager's stations and of one single ScaleStream."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, manager=None, stream=None):
+        super().__init__(address, _Handler)
+        self.manager = manager
+        self.stream = stream
+
+    def answer(self, request):
+        station_id = request.get('station', DEFAULT_STATION)
+        order_id = None
+        if station_id == DEFAULT_STATION:
+            stream = self.stream
+        else:
+            stream = self.manager.stations().get(station_id) if self.manager else None
+        if stream is None:
+            return {'error': 'Unknown station.'}
+        if request['op'] == 'bind':
+            self.manager.bind_order(station_id, request['order_id'])
+            return {'station': station_id, 'order_id': request['order_id']}
+        if station_id != DEFAULT_STATION:
+            order_id = self.manager.current_order(station_id)
+        after, wait = float(request.get('after', 0)), float(request.get('wait', 0))
+        stable = stream.wait_for_stable(after, wait) if wait > 0 else stream.latest_stable
+        return snapshot(stream, stable, order_id)
+
+
+def serve(manager=None, stream=None, address=None) -> FeedServer:
+    """Start serving on a background thread and return the server (shutdown() stops it)."""
+    server = FeedServer(address or tuple(settings.SCALE_FEED_ADDRESS), manager, stream)
+    threading.Thread(target=server.serve_forever, name='scale-feed', daemon=True).start()
+    return server
+
+
+def _ask(request, timeout):
+    try:
+        with socket.create_connection(tuple(settings.SCALE_FEED_ADDRESS), timeout=timeout) as connection:
+            connection.sendall(json.dumps(request).encode() + b'\n')
+            response = connection.makefile('rb').readline()
+    except OSError as e:
+        raise FeedUnavailable(str(e)) from e
+    if not response:
+        raise FeedUnavailable('The scale feed closed the connection')
+    return json.loads(response)
+
+
+def reading(station_id: str = DEFAULT_STATION, after: float = 0, wait: float = 0) -> dict:
+    """
+    The state of a station's scale. With a wait, block up to wait seconds for a
+    stable reading newer than the after timestamp; weight and timestamp are None
+    if none arrived. Raises FeedUnavailable or KeyError for an unknown station.
+    """
+    response = _ask({'op': 'reading', 'station': station_id, 'after': after, 'wait': wait}, wait + 5)
+    if 'error' in response:
+        raise KeyError(station_id)
+    return response
+
+
+def bind_order(station_id: str, order_id: Optional[int]):
+    """Tag the station's readings with order_id (None to unbind). Raises FeedUnavailable or KeyError."""
+    if 'error' in _ask({'op': 'bind', 'station': station_id, 'order_id': order_id}, 5):
+        raise KeyError(station_id)
@@ -0,0 +1,179 @@
+import bisect
+import re
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+_WEIGHT_PATTERN = re.compile(r'[-+]?\d+(?:\.\d+)?')
+
+SETTLED = 'settled'
+CLEARED = 'cleared'
+
+
+class WeightEvent(NamedTuple):
+    kind: str          # SETTLED when a package comes to rest, CLEARED when it is removed
+    timestamp: float
+    weight: float
+
+
+def parse_weight(line: str) -> Optional[float]:
+    """Extract the weight from a line sent by the scale (e.g. 'Weight: 12.5 g'), or None."""
+    match = _WEIGHT_PATTERN.search(line)
+    return float(match.group()) if match else None
+
+
+class StabilityFilter:
+    """
+    Streaming filter for raw scale readings.
+
+    Readings go into a fixed-size ring buffer with a sorted copy alongside it, so
+    the rolling median and the window's spread are available without re-sorting.
+    A reading far from the median is treated as an outlier, unless outlier_patience
+    readings in a row agree with each other, in which case the load really changed
+    and the buffer restarts from them. The reading is stable once the window is
+    full and its spread is within tolerance. update() returns a SETTLED event the
+    moment a package comes to rest and a CLEARED event when the pan is emptied.
+    Memory use is constant in the number of readings.
+    """
+
+    def __init__(self, window: int = 10, tolerance: float = 0.5, outlier_threshold: float = 50.0,
+                 outlier_patience: int = 3, min_weight: float = 1.0, ema_alpha: float = 0.3):
+        self.window = window
+        self.tolerance = tolerance
+        self.outlier_threshold = outlier_threshold
+        self.outlier_patience = outlier_patience
+        self.min_weight = min_weight
+        self.ema_alpha = ema_alpha
+        self.ema: Optional[float] = None
+        self.settled_weight: Optional[float] = None
+        self.accepted = 0
+        self.rejected = 0
+        self._ring = deque(maxlen=window)
+        self._sorted = []
+        self._suspects = deque(maxlen=outlier_patience)
+
+    @property
+    def median(self) -> Optional[float]:
+        n = len(self._sorted)
+        if not n:
+            return None
+        mid = n // 2
+        return self._sorted[mid] if n % 2 else (self._sorted[mid - 1] + self._sorted[mid]) / 2
+
+    @property
+    def spread(self) -> Optional[float]:
+        return self._sorted[-1] - self._sorted[0] if self._sorted else None
+
+    @property
+    def stable(self) -> bool:
+        return len(self._ring) == self.window and self.spread <= self.tolerance
+
+    def reset(self):
+        self._ring.clear()
+        self._sorted.clear()
+        self._suspects.clear()
+        self.ema = None
+
+    def _push(self, weight):
+        if len(self._ring) == self.window:
+            del self._sorted[bisect.bisect_left(self._sorted, self._ring[0])]
+        self._ring.append(weight)
+        bisect.insort(self._sorted, weight)
+        self.ema = weight if self.ema is None else self.ema + self.ema_alpha * (weight - self.ema)
+
+    def _accept(self, weight) -> bool:
+        median = self.median
+        if median is None or abs(weight - median) <= self.outlier_threshold:
+            self._suspects.clear()
+            self._push(weight)
+            return True
+
+        self._suspects.append(weight)
+        if len(self._suspects) == self.outlier_patience and \
+                max(self._suspects) - min(self._suspects) <= self.outlier_threshold:
+            # Consistent "outliers" mean the load changed: restart from them
+            suspects = list(self._suspects)
+            self.reset()
+            for suspect in suspects:
+                self._push(suspect)
+            return True
+        return False
+
+    def update(self, timestamp: float, weight: float) -> Optional[WeightEvent]:
+        """Feed one reading; return a WeightEvent if the settled state changed."""
+        if not self._accept(weight):
+            self.rejected += 1
+            return None
+        self.accepted += 1
+        if not self.stable:
+            return None
+
+        median = self.median
+        if median >= self.min_weight:
+            if self.settled_weight is None or abs(median - self.settled_weight) > self.tolerance:
+                self.settled_weight = median
+                return WeightEvent(SETTLED, timestamp, median)
+        elif self.settled_weight is not None:
+            self.settled_weight = None
+            return WeightEvent(CLEARED, timestamp, median)
+        return None
+
+
+# Message written by SerialReader.read_data for every line when logging to text
+_RECEIVED_MARKER = 'Received data: '
+_LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_log(lines: Iterable[str]) -> Iterator[tuple]:
+    """
+    Turn a recorded serial log into (timestamp, weight) pairs. Accepts either raw
+    lines captured from the port or the text log written by scale.py, in which
+    case the log timestamps are used and the duplicate 'HI scale value' lines are
+    skipped.
+    """
+    for index, line in enumerate(lines):
+        line = line.strip()
+        timestamp = float(index)
+        try:
+            logged_at = datetime.strptime(line[:19], _LOG_TIME_FORMAT).timestamp()
+        except ValueError:
+            logged_at = None
+        if logged_at is not None:
+            # Text log: only 'Received data' lines carry readings
+            if _RECEIVED_MARKER not in line:
+                continue
+            timestamp = logged_at
+            line = line.split(_RECEIVED_MARKER, 1)[1]
+        weight = parse_weight(line)
+        if weight is not None:
+            yield timestamp, weight
+
+
+def replay(lines: Iterable[str], stability_filter: Optional[StabilityFilter] = None) -> dict:
+    """
+    Feed a recorded serial log through a StabilityFilter and return the events it
+    produced together with throughput figures.
+    """
+    return replay_samples(read_log(lines), stability_filter)
+
+
+def replay_samples(samples: Iterable[tuple], stability_filter: Optional[StabilityFilter] = None) -> dict:
+    """Like replay(), for (timestamp, weight) pairs such as those of a binary recording."""
+    stability_filter = stability_filter or StabilityFilter()
+    events = []
+    count = 0
+    start = time.perf_counter()
+    for timestamp, weight in samples:
+        count += 1
+        event = stability_filter.update(timestamp, weight)
+        if event:
+            events.append(event)
+    elapsed = time.perf_counter() - start
+    return {
+        'events': events,
+        'samples': count,
+        'rejected': stability_filter.rejected,
+        'seconds': elapsed,
+        'samples_per_second': count / elapsed if elapsed else float('inf'),
+    }
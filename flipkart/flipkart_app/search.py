@@ -0,0 +1,112 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# SQLite FTS5 index over product names and descriptions. Its rowid is the
+# product id; rows are kept in sync by the Product signals in signals.py and
+# can be rebuilt with `manage.py rebuild_search_index`.
+SEARCH_TABLE = 'flipkart_app_product_search'
+
+# bm25 column weights: a match in the name counts ten times one in the description
+_RANK = f'bm25({SEARCH_TABLE}, 10.0, 1.0)'
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+_available = set()
+
+
+def search_available() -> bool:
+    """True if the database has the FTS5 index (SQLite with FTS5, migrated)."""
+    if connection.vendor != 'sqlite':
+        return False
+    key = connection.settings_dict['NAME']
+    if key not in _available:
+        if SEARCH_TABLE not in connection.introspection.table_names():
+            return False
+        _available.add(key)
+    return True
+
+
+def match_expression(query: str) -> str:
+    """
+    FTS5 query matching every word of query as a prefix ('red sho' finds
+    'Red Shoes'). Words are quoted, so FTS5 operators in user input are inert.
+    """
+    return ' '.join(f'"{token}"*' for token in _TOKEN_PATTERN.findall(query.lower()))
+
+
+def _substring_filter(query: str):
+    return Q(name__icontains=query) | Q(description__icontains=query)
+
+
+def _matches(expression: str) -> RawSQL:
+    """Subquery of the ids of the products matching an FTS5 expression."""
+    return RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [expression])
+
+
+def search_product_ids(queryset, query: str) -> list:
+    """Ids of the products search_products would keep, without ordering or fetching them."""
+    if not search_available():
+        return list(queryset.filter(_substring_filter(query)).values_list('pk', flat=True))
+    expression = match_expression(query)
+    if not expression:
+        return []
+    return list(queryset.filter(pk__in=_matches(expression)).values_list('pk', flat=True))
+
+
+def search_products(queryset, query: str):
+    """
+    Narrow a Product queryset to the products matching query, ordered by
+    relevance. The index is joined into the queryset's own statement, so its
+    other filters and any LIMIT apply to every match rather than to a
+    truncated list of ids. Falls back to substring matching when the index is
+    unavailable.
+    """
+    if not search_available():
+        return queryset.filter(_substring_filter(query))
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    # A join, not an id__in subquery: ranking each row in a correlated
+    # subquery re-runs the MATCH per row
+    product_id = f'{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name("id")}'
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f'{SEARCH_TABLE}.rowid = {product_id}', f'{SEARCH_TABLE} MATCH %s'],
+        params=[expression],
+        select={'search_rank': _RANK},
+        order_by=['search_rank', 'pk'],
+    )
+
+
+def index_product(product):
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [product.pk, product.name, product.description],
+        )
+
+
+def remove_product(product_id):
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_index() -> int:
+    """Re-index every product (e.g. after bulk updates that bypass signals); returns the count."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, description) '
+            f'SELECT id, name, description FROM flipkart_app_product'
+        )
+        count = cursor.rowcount
+        # Merge the index b-trees so queries touch as few segments as possible
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return count
@@ -0,0 +1,203 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, SellerDailyStats, SellerOrder
+
+_ZERO = Value(Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2))
+_LIVE = ~Q(status=Order.STATUS_CANCELLED)
+_DAY_TOTALS = {
+    'orders': Count('id'),
+    'revenue': Coalesce(Sum('revenue', filter=_LIVE), _ZERO),
+    'units': Coalesce(Sum('units', filter=_LIVE), 0),
+    'pending': Count('id', filter=Q(status=Order.STATUS_PENDING)),
+    'cancelled': Count('id', filter=Q(status=Order.STATUS_CANCELLED)),
+}
+_STAT_FIELDS = list(_DAY_TOTALS)
+
+
+def _seller_shares(orders):
+    """{(order_id, seller_id): (revenue, units)} for the given orders, from their items."""
+    rows = (
+        OrderItem.objects.filter(order__in=orders)
+        .values('order_id', seller_id=F('product__seller_id'))
+        .annotate(revenue=Sum(F('price') * F('quantity')), units=Sum('quantity'))
+        .order_by()
+    )
+    return {(row['order_id'], row['seller_id']): (row['revenue'], row['units']) for row in rows}
+
+
+def link_status(order_status, current=None):
+    """
+    A seller's status for an order: the order's own, except that while the
+    order is pending a seller who has packed their part is already processing
+    (see processing_queue.complete_order).
+    """
+    if order_status == Order.STATUS_PENDING and current == Order.STATUS_PROCESSING:
+        return current
+    return order_status
+
+
+def refresh_order(order):
+    """
+    Bring the SellerOrder links of one order and the daily stats of every seller
+    it touches up to date. Called after an order or its items change; costs a
+    handful of indexed queries however many orders the sellers have.
+    """
+    with transaction.atomic():
+        links = {link.seller_id: link for link in SellerOrder.objects.filter(order=order)}
+        shares = _seller_shares([order.pk])
+        SellerOrder.objects.filter(order=order).exclude(
+            seller_id__in=[seller_id for _, seller_id in shares]
+        ).delete()
+        SellerOrder.objects.bulk_create(
+            [
+                SellerOrder(seller_id=seller_id, order=order, created_at=order.created_at, revenue=revenue, units=units,
+                            status=link_status(order.status, getattr(links.get(seller_id), 'status', None)))
+                for (_, seller_id), (revenue, units) in shares.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['seller', 'order'],
+            update_fields=['status', 'revenue', 'units'],
+        )
+        day = timezone.localdate(order.created_at)
+        for seller_id in set(links) | {seller_id for _, seller_id in shares}:
+            refresh_day(seller_id, day)
+
+
+def refresh_order_status(order):
+    """Cheaper refresh_order for a saved order whose items did not change."""
+    with transaction.atomic():
+        stale = SellerOrder.objects.filter(order=order).exclude(status=order.status)
+        if order.status == Order.STATUS_PENDING:
+            stale = stale.exclude(status=Order.STATUS_PROCESSING)
+        seller_ids = list(stale.values_list('seller_id', flat=True))
+        if seller_ids:
+            SellerOrder.objects.filter(order=order, seller_id__in=seller_ids).update(status=order.status)
+            day = timezone.localdate(order.created_at)
+            for seller_id in seller_ids:
+                refresh_day(seller_id, day)
+
+
+def refresh_after_delete(order_id, seller_ids, day):
+    """
+    Refresh after order items or a whole order were deleted. Runs once the
+    deleting transaction commits, since the cascade that is still running
+    may also be removing the order, its links or the seller.
+    """
+    def refresh():
+        order = Order.objects.filter(pk=order_id).first()
+        if order is not None:
+            refresh_order(order)
+        elif seller_ids:
+            for seller_id in seller_ids:
+                refresh_day(seller_id, day)
+
+    transaction.on_commit(refresh)
+
+
+def _day_range(day):
+    """The [start, end) datetimes of a local calendar day."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def refresh_day(seller_id, day):
+    """
+    Recompute one seller's stats for one day from their SellerOrder rows. Filters
+    on a created_at range rather than created_at__date, which casts every row and
+    so cannot use seller_order_recent_idx.
+    """
+    start, end = _day_range(day)
+    totals = SellerOrder.objects.filter(
+        seller_id=seller_id, created_at__gte=start, created_at__lt=end,
+    ).aggregate(**_DAY_TOTALS)
+    if totals['orders']:
+        SellerDailyStats.objects.update_or_create(seller_id=seller_id, date=day, defaults=totals)
+    else:
+        SellerDailyStats.objects.filter(seller_id=seller_id, date=day).delete()
+
+
+def reconcile(seller_ids=None, dry_run=False, batch_size=2000):
+    """
+    Rebuild SellerOrder links and daily stats from the orders themselves, fixing
+    any drift (e.g. from bulk updates that bypass signals). Only rows that differ
+    are written. Returns counts of the rows created, updated and deleted.
+    """
+    counts = dict.fromkeys(['links_created', 'links_updated', 'links_deleted',
+                            'days_created', 'days_updated', 'days_deleted'], 0)
+    orders = Order.objects.order_by('id')
+    links = SellerOrder.objects.all()
+    stats = SellerDailyStats.objects.all()
+    if seller_ids is not None:
+        orders = orders.filter(items__product__seller_id__in=seller_ids).distinct()
+        links = links.filter(seller_id__in=seller_ids)
+        stats = stats.filter(seller_id__in=seller_ids)
+
+    with transaction.atomic():
+        # Links, a batch of orders at a time
+        expected_keys = set()
+        last_id = 0
+        while True:
+            batch = list(orders.filter(id__gt=last_id).values('id', 'status', 'created_at')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            by_id = {order['id']: order for order in batch}
+            shares = _seller_shares(list(by_id))
+            existing = {(link.order_id, link.seller_id): link for link in links.filter(order_id__in=by_id)}
+            create, update = [], []
+            for (order_id, seller_id), (revenue, units) in shares.items():
+                if seller_ids is not None and seller_id not in seller_ids:
+                    continue
+                expected_keys.add((order_id, seller_id))
+                order = by_id[order_id]
+                link = existing.get((order_id, seller_id))
+                status = link_status(order['status'], link and link.status)
+                if link is None:
+                    create.append(SellerOrder(seller_id=seller_id, order_id=order_id, status=status,
+                                              created_at=order['created_at'], revenue=revenue, units=units))
+                elif (link.status, link.created_at, link.revenue, link.units) != \
+                        (status, order['created_at'], revenue, units):
+                    link.status, link.created_at, link.revenue, link.units = \
+                        status, order['created_at'], revenue, units
+                    update.append(link)
+            counts['links_created'] += len(create)
+            counts['links_updated'] += len(update)
+            if not dry_run:
+                SellerOrder.objects.bulk_create(create)
+                SellerOrder.objects.bulk_update(update, ['status', 'created_at', 'revenue', 'units'])
+
+        stale = [link_id for link_id, order_id, seller_id in links.values_list('id', 'order_id', 'seller_id')
+                 if (order_id, seller_id) not in expected_keys]
+        counts['links_deleted'] = len(stale)
+        if not dry_run:
+            for start in range(0, len(stale), batch_size):
+                SellerOrder.objects.filter(id__in=stale[start:start + batch_size]).delete()
+
+        # Daily stats, grouped in one query over the (now correct) links
+        expected = {
+            (row.pop('seller_id'), row.pop('day')): row
+            for row in links.annotate(day=TruncDate('created_at')).values('seller_id', 'day')
+            .annotate(**_DAY_TOTALS).order_by()
+        }
+        existing = {(row.seller_id, row.date): row for row in stats}
+        create, update = [], []
+        for key, totals in expected.items():
+            row = existing.pop(key, None)
+            if row is None:
+                create.append(SellerDailyStats(seller_id=key[0], date=key[1], **totals))
+            elif any(getattr(row, field) != totals[field] for field in _STAT_FIELDS):
+                for field in _STAT_FIELDS:
+                    setattr(row, field, totals[field])
+                update.append(row)
+        counts.update(days_created=len(create), days_updated=len(update), days_deleted=len(existing))
+        if not dry_run:
+            SellerDailyStats.objects.bulk_create(create, batch_size=batch_size)
+            SellerDailyStats.objects.bulk_update(update, _STAT_FIELDS, batch_size=batch_size)
+            SellerDailyStats.objects.filter(id__in=[row.id for row in existing.values()]).delete()
+    return counts
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog_cache import invalidate_catalog
+from .database import apply_sqlite_pragmas
+from .facets import refresh_products
+from .models import (
+    Category, Order, OrderItem, Product, Review, SellerOrder, changes_facets, products_changed,
+)
+from .ratings import check_rating, update_product_ratings
+from .search import index_product, remove_product
+from .seller_metrics import refresh_after_delete, refresh_order, refresh_order_status
+
+
+# Busy timeout and cache sizes are per connection on SQLite
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    apply_sqlite_pragmas(connection)
+
+
+# Cached category lists and home-page fragments are rebuilt after any catalog change
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    invalidate_catalog()
+
+
+# Keep the full-text search index in step with the product table
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    remove_product(instance.pk)
+
+
+# Keep the facet bitmaps in step with the product table, once the change is visible
+@receiver([post_save, post_delete], sender=Product)
+def refresh_facets_for_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or changes_facets(sender, update_fields)):
+        product_id = instance.pk
+        transaction.on_commit(lambda: refresh_products([product_id]))
+
+
+@receiver(products_changed, sender=Product)
+def refresh_facets_for_products(sender, product_ids, **kwargs):
+    transaction.on_commit(lambda: refresh_products(product_ids))
+
+
+# Keep the seller-order links and seller daily stats up to date. Order items created
+# with bulk_create (checkout) bypass these; place_order refreshes the order itself.
+@receiver(post_save, sender=OrderItem)
+def refresh_seller_metrics_for_item(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_order(instance.order)
+
+
+@receiver(post_save, sender=Order)
+def refresh_seller_metrics_for_order(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_order_status(instance)
+
+
+@receiver(pre_delete, sender=OrderItem)
+@receiver(pre_delete, sender=Order)
+def remember_order_sellers(sender, instance, **kwargs):
+    # The links say which sellers' stats to refresh once the delete has committed
+    order_id = instance.pk if sender is Order else instance.order_id
+    links = list(SellerOrder.objects.filter(order_id=order_id).values_list('seller_id', 'created_at'))
+    day = timezone.localdate(links[0][1]) if links else None
+    instance._seller_metrics = (order_id, [seller_id for seller_id, _ in links], day)
+
+
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=Order)
+def refresh_seller_metrics_after_delete(sender, instance, **kwargs):
+    refresh_after_delete(*instance._seller_metrics)
+
+
+# Keep the products' review counts and rating histograms up to date. As signals
+# these also cover queryset deletes and cascades (e.g. deleting a user); bulk_create
+# and queryset updates still bypass them, see ratings.reconcile_ratings.
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    check_rating(instance.rating)
+    instance._previous_rating = None
+    if instance.pk is not None:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._previous_rating
+    if previous != (instance.product_id, instance.rating):
+        if previous:
+            update_product_ratings(*previous, -1)
+        update_product_ratings(instance.product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    update_product_ratings(instance.product_id, instance.rating, -1)
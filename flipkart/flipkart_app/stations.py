@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from .sample_recorder import SampleRecorder, encode_station
+from .scale import ScaleStream, WeightSample
+from .scale_pipeline import SETTLED, StabilityFilter, WeightEvent
+
+
+class StationReading(NamedTuple):
+    station_id: str
+    order_id: Optional[int]
+    sample: WeightSample
+
+
+class SettledWeight(NamedTuple):
+    station_id: str
+    order_id: int
+    timestamp: float
+    weight: float
+
+
+class StationManager:
+    """
+    Drives one ScaleStream per packing station.
+
+    Each station reads its port on its own thread, so adding a station never
+    delays readings on the others. Every reading is tagged with its station and
+    the order currently bound to that station, and funnelled into one shared
+    queue (`readings`); if nobody drains it, the oldest readings are dropped
+    rather than blocking the reader threads. When a package settles on a station
+    that has an order bound, the settled weight is recorded against that order
+    and the settle listeners are called. All stations share one SampleRecorder,
+    if given, with each record tagged by station.
+    """
+
+    def __init__(self, queue_size: int = 10000, settled_history: int = 10000,
+                 recorder: Optional[SampleRecorder] = None):
+        self.readings = queue.Queue(queue_size)
+        self.recorder = recorder
+        self.settled_history = settled_history
+        self._stations = {}
+        self._orders = {}
+        self._settled = OrderedDict()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_station(self, station_id: str, port: str, baud_rate: int = 9600,
+                    stability_filter: Optional[StabilityFilter] = None, **stream_options) -> ScaleStream:
+        """Start reading the scale of a new station."""
+        with self._lock:
+            if station_id in self._stations:
+                raise ValueError(f"Station {station_id!r} already exists")
+            if self.recorder is not None:
+                encode_station(station_id)  # fail now rather than on the first sample
+            stream = ScaleStream(port=port, baud_rate=baud_rate, stability_filter=stability_filter,
+                                 recorder=self.recorder, station_id=station_id, **stream_options)
+            stream.add_sample_listener(lambda _, sample: self._funnel(station_id, sample))
+            stream.add_listener(lambda _, event: self._settle(station_id, event))
+            self._stations[station_id] = stream
+        return stream.start()
+
+    def remove_station(self, station_id: str):
+        with self._lock:
+            stream = self._stations.pop(station_id)
+            self._orders.pop(station_id, None)
+        stream.stop()
+
+    def stations(self):
+        return dict(self._stations)
+
+    def stop(self):
+        for station_id in list(self._stations):
+            self.remove_station(station_id)
+
+    def bind_order(self, station_id: str, order_id: Optional[int]):
+        """Make order_id the order being packed at the station (None to unbind)."""
+        if station_id not in self._stations:
+            raise KeyError(station_id)
+        self._orders[station_id] = order_id
+
+    def current_order(self, station_id: str) -> Optional[int]:
+        return self._orders.get(station_id)
+
+    def live_weight(self, station_id: str) -> Optional[WeightSample]:
+        """Latest stable reading of the station's scale."""
+        return self._stations[station_id].latest_stable
+
+    def settled_weight(self, order_id: int) -> Optional[SettledWeight]:
+        """Weight the order's package settled at, if it has been weighed."""
+        return self._settled.get(order_id)
+
+    def add_settle_listener(self, listener: Callable[[SettledWeight], None]):
+        """Call listener(settled) on the station's reader thread when a bound order is weighed."""
+        self._listeners.append(listener)
+
+    def _funnel(self, station_id, sample):
+        reading = StationReading(station_id, self._orders.get(station_id), sample)
+        while True:
+            try:
+                self.readings.put_nowait(reading)
+                return
+            except queue.Full:
+                try:
+                    self.readings.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _settle(self, station_id, event: WeightEvent):
+        order_id = self._orders.get(station_id)
+        if event.kind != SETTLED or order_id is None:
+            return
+        settled = SettledWeight(station_id, order_id, event.timestamp, event.weight)
+        with self._lock:
+            self._settled[order_id] = settled
+            self._settled.move_to_end(order_id)
+            while len(self._settled) > self.settled_history:
+                self._settled.popitem(last=False)
+        for listener in self._listeners:
+            try:
+                listener(settled)
+            except Exception:
+                logging.exception(f"Station settle listener {listener!r} failed")
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager(stations=None, baud_rate: int = 9600, recorder: Optional[SampleRecorder] = None) -> StationManager:
+    """
+    Return the process-wide StationManager, creating it on first use with one
+    station per entry of the stations mapping ({station_id: port}).
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = StationManager(recorder=recorder)
+            for station_id, port in (stations or {}).items():
+                _manager.add_station(station_id, port, baud_rate=baud_rate)
+        return _manager
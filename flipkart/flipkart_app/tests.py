@@ -1,3 +1,1655 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+import torch
+from PIL import Image
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import IntegrityError, connection, router, transaction
+from django.db.models import F, QuerySet
+from django.http import JsonResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import loadtest
+from .catalog_cache import cache_stats
+from .checkout import CartChanged, EmptyCart, OutOfStock, place_order
+from .admin import EstimatedCountPaginator
+from .database import catalog_reads, estimated_count
+from . import facets, ml_models, scale_feed
+from .facets import FACETS, FIELDS, Bitmap, FacetIndex, facet_counts, selection_q
+from .inference import QueueFull, claim_jobs, requeue_stale_jobs, run_jobs, submit_verification, verify_order
+from .instrumentation import BACKGROUND, RequestMetricsMiddleware, metrics, span
+from .nplusone import NPlusOneError, detect_nplusone
+from .models import (
+    Cart, CartItem, Category, Customer, Order, OrderItem, OrderProcessingLog, Product, Registration, Seller,
+    SellerDailyStats, SellerOrder, RelatedProduct, Review, User, UserProfile, VerificationJob, WishlistItem,
+    FACET_FIELDS, effective_price,
+)
+from .sample_recorder import SampleRecorder, export_csv, read_records, recording_files
+from .processing_queue import complete_order, queue_metrics
+from .ratings import reconcile_ratings
+from .related_products import compute_related_products
+from .search import search_products
+from .seller_metrics import reconcile, refresh_day
+from .scale import ScaleStream, parse_weight
+from .scale_pipeline import CLEARED, SETTLED, StabilityFilter, replay
+from .stations import StationManager
+from .verification import (
+    DEFAULT_MODEL_CHECKPOINTS, image_hash, missing_models, model_checkpoints, model_versions, prune_stale_results,
+    store_results,
+)
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'needs a pseudo-terminal')
+class ScaleStreamTests(SimpleTestCase):
+    """Drives ScaleStream through a pty standing in for the scale."""
+
+    def setUp(self):
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        self.addCleanup(os.close, self.master)
+        self.addCleanup(os.close, slave)
+        self.stream = ScaleStream(self.port, timeout=0.1, stability_filter=StabilityFilter(window=3)).start()
+        self.addCleanup(self.stream.stop)
+        deadline = time.monotonic() + 5
+        while not self.stream.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def send(self, *lines):
+        os.write(self.master, ''.join(f'{line}\r\n' for line in lines).encode())
+
+    def test_parse_weight(self):
+        self.assertEqual(parse_weight('Weight: 12.5 g'), 12.5)
+        self.assertEqual(parse_weight('-3'), -3.0)
+        self.assertIsNone(parse_weight('ready'))
+
+    def test_samples_yields_parsed_readings(self):
+        async def collect():
+            samples = self.stream.samples()
+            first = asyncio.ensure_future(samples.__anext__())
+            await asyncio.sleep(0.2)  # let the subscription register
+            self.send('Weight: 100.0 g', 'noise', 'Weight: 101.5 g')
+            weights = [(await first).weight, (await samples.__anext__()).weight]
+            await samples.aclose()
+            return weights
+
+        weights = asyncio.run(asyncio.wait_for(collect(), 5))
+        self.assertEqual(weights, [100.0, 101.5])
+
+    def test_latest_stable_reading(self):
+        self.send('10', '50', '250.1', '250.2', '250.0')
+        stable = self.stream.wait_for_stable(timeout=5)
+        self.assertIsNotNone(stable)
+        self.assertEqual(stable.weight, 250.1)
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'needs a pseudo-terminal')
+class StationManagerTests(SimpleTestCase):
+    """Runs several stations, each on its own pty."""
+
+    def setUp(self):
+        self.manager = StationManager()
+        self.masters, ports = {}, {}
+        for station_id in ('lane-1', 'lane-2', 'lane-3'):
+            master, slave = os.openpty()
+            self.addCleanup(os.close, master)
+            self.addCleanup(os.close, slave)
+            self.masters[station_id], ports[station_id] = master, os.ttyname(slave)
+        # Cleanups run last in, first out: stop the readers before their ptys close
+        self.addCleanup(self.manager.stop)
+        for station_id, port in ports.items():
+            self.manager.add_station(station_id, port, timeout=0.1, stability_filter=StabilityFilter(window=3))
+        deadline = time.monotonic() + 5
+        while not all(s.connected for s in self.manager.stations().values()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def send(self, station_id, *lines):
+        os.write(self.masters[station_id], ''.join(f'{line}\r\n' for line in lines).encode())
+
+    def next_reading(self):
+        return self.manager.readings.get(timeout=5)
+
+    def test_readings_are_tagged_by_station(self):
+        self.manager.bind_order('lane-2', 42)
+        self.send('lane-1', '5.0')
+        first = self.next_reading()
+        self.send('lane-2', '7.5')
+        second = self.next_reading()
+        self.assertEqual((first.station_id, first.order_id, first.sample.weight), ('lane-1', None, 5.0))
+        self.assertEqual((second.station_id, second.order_id, second.sample.weight), ('lane-2', 42, 7.5))
+
+    def test_settled_weight_is_bound_to_order(self):
+        settled = []
+        self.manager.add_settle_listener(settled.append)
+        self.manager.bind_order('lane-3', 7)
+        self.send('lane-3', '480.0', '480.2', '480.1')
+        deadline = time.monotonic() + 5
+        while not settled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(settled), 1)
+        self.assertEqual((settled[0].station_id, settled[0].order_id), ('lane-3', 7))
+        self.assertEqual(self.manager.settled_weight(7).weight, 480.1)
+        self.assertIsNone(self.manager.live_weight('lane-1'))
+
+    def test_readings_and_bindings_go_through_the_feed(self):
+        server = scale_feed.serve(self.manager, address=('127.0.0.1', 0))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with self.settings(SCALE_FEED_ADDRESS=server.server_address):
+            scale_feed.bind_order('lane-1', 9)
+            self.send('lane-1', '300.0', '300.2', '300.1')
+            reading = scale_feed.reading('lane-1', wait=5)
+            self.assertEqual(self.manager.current_order('lane-1'), 9)
+            self.assertEqual(reading, {
+                'order_id': 9, 'connected': True, 'weight': 300.1,
+                'timestamp': self.manager.live_weight('lane-1').timestamp, 'latest_weight': 300.1,
+            })
+            self.assertEqual(scale_feed.reading('lane-2')['weight'], None)
+            with self.assertRaises(KeyError):
+                scale_feed.reading('lane-9')
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'needs a pseudo-terminal')
+@override_settings(SCALE_STATIONS={'lane-1': '/dev/null'}, SCALE_PORT='/dev/null')
+class ScaleReadingViewTests(TestCase):
+    """Serves an unstarted stream fed by hand for SCALE_PORT and one station on a pty."""
+
+    def setUp(self):
+        self.stream = ScaleStream('/dev/null', stability_filter=StabilityFilter(window=1))
+        self.stream.connected = True
+        self.manager = StationManager()
+        master, slave = os.openpty()
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        self.addCleanup(self.manager.stop)
+        self.manager.add_station('lane-1', os.ttyname(slave), timeout=0.1)
+        server = scale_feed.serve(self.manager, self.stream, address=('127.0.0.1', 0))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        feed_address = self.settings(SCALE_FEED_ADDRESS=server.server_address)
+        feed_address.enable()
+        self.addCleanup(feed_address.disable)
+        self.client.force_login(create_seller('seller').user_profile.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('scale_reading'), params)
+
+    def test_readings_come_from_the_feed(self):
+        self.assertEqual(self.get().json()['weight'], None)
+        self.assertEqual(self.get(station='lane-9').status_code, 404)
+        self.stream._publish('12.5')
+        stable = self.stream.latest_stable
+        self.assertEqual(self.get().json(), {
+            'station': None, 'order_id': None, 'connected': True, 'weight': 12.5,
+            'timestamp': stable.timestamp, 'latest_weight': 12.5,
+        })
+        self.assertEqual(self.get(station='lane-1').json()['weight'], None)
+        with self.settings(SCALE_FEED_ADDRESS=('127.0.0.1', 1)):
+            self.assertEqual(self.get().json()['connected'], False)
+
+    def test_waiting_for_a_newer_reading_is_brief(self):
+        self.stream._publish('12.5')
+        stable = self.stream.latest_stable
+        start = time.monotonic()
+        reading = self.get(after=stable.timestamp, wait=30).json()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual((reading['weight'], reading['latest_weight']), (None, 12.5))
+        threading.Timer(0.1, self.stream._publish, ['13.0']).start()
+        self.assertEqual(self.get(after=stable.timestamp, wait=30).json()['weight'], 13.0)
+
+    def test_binding_an_order_is_handed_to_the_scale_owner(self):
+        order = Order.objects.create(user=User.objects.create_user('customer'), total_amount='5.00',
+                                     shipping_address='Here', phone_number='1', payment_method='Cash on Delivery')
+        response = self.client.post(reverse('bind_station_order', args=['lane-1', order.id]))
+        self.assertEqual(response.json(), {'station': 'lane-1', 'order_id': order.id})
+        self.assertEqual(self.manager.current_order('lane-1'), order.id)
+        self.assertEqual(self.client.post(reverse('bind_station_order', args=['lane-9', order.id])).status_code, 404)
+        with self.settings(SCALE_FEED_ADDRESS=('127.0.0.1', 1)):
+            self.assertEqual(self.client.post(reverse('bind_station_order', args=['lane-1', order.id])).status_code,
+                             503)
+
+
+class StabilityFilterTests(SimpleTestCase):
+    LOG = [
+        '2024-10-01 10:00:00 - INFO - Connected to COM4 at 9600 baud.',
+        '2024-10-01 10:00:01 - INFO - Received data: 0.0',
+        '2024-10-01 10:00:01 - INFO - HI scale value: 0.0',
+    ] + [
+        f'2024-10-01 10:00:{second:02d} - INFO - Received data: {weight}'
+        for second, weight in enumerate(
+            [0.1, 180.0, 240.0, 250.3, 250.1, 999.0, 250.2, 250.0, 250.1, 0.2, 0.0, 0.1, 0.0], start=2
+        )
+    ]
+
+    def test_replay_detects_settle_and_removal(self):
+        report = replay(self.LOG, StabilityFilter(window=3, tolerance=0.5, outlier_threshold=50))
+        self.assertEqual([event.kind for event in report['events']], [SETTLED, CLEARED])
+        self.assertAlmostEqual(report['events'][0].weight, 250.2)
+        self.assertEqual(report['samples'], 14)
+        self.assertGreaterEqual(report['rejected'], 1)
+
+    def test_memory_is_bounded_by_window(self):
+        stability_filter = StabilityFilter(window=5)
+        for i in range(10000):
+            stability_filter.update(i, 100 + (i % 3) * 0.1)
+        self.assertEqual(len(stability_filter._sorted), 5)
+        self.assertTrue(stability_filter.stable)
+
+
+class SampleRecorderTests(SimpleTestCase):
+
+    def test_records_rotate_and_export_to_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = SampleRecorder(directory, records_per_file=4, max_files=2)
+            for i in range(10):
+                recorder.record(1000.0 + i, 'lane-1' if i % 2 else 'lane-2', i * 1.5)
+            recorder.close()
+
+            files = recording_files(directory)
+            self.assertEqual(len(files), 2)  # 4 + 4 + 2 records, oldest file pruned
+            records = [record for path in files for record in read_records(path)]
+            self.assertEqual([r.timestamp for r in records], [1004.0 + i for i in range(6)])
+            self.assertEqual(records[1].station, 'lane-1')
+            self.assertEqual(records[-1].weight, 13.5)
+
+            output = io.StringIO()
+            self.assertEqual(export_csv(files, output), 6)
+            self.assertEqual(output.getvalue().splitlines()[:2], ['timestamp,station,weight', '1004.000000,lane-2,6.000'])
+
+    def test_long_station_ids_are_kept_whole(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = SampleRecorder(directory)
+            recorder.record(1000.0, 'packing-station-east-12', 2.5)
+            with self.assertRaises(ValueError):
+                recorder.record(1001.0, 'x' * 33, 2.5)
+            recorder.close()
+            [path] = recording_files(directory)
+            self.assertEqual([record.station for record in read_records(path)], ['packing-station-east-12'])
+
+    def test_pruning_covers_earlier_runs_but_not_other_prefixes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            earlier = os.path.join(directory, 'scale-20240101-000000-999999999-0001.bin')
+            other = os.path.join(directory, 'bench-20240101-000000-999999999-0001.bin')
+            open(earlier, 'wb').close()
+            open(other, 'wb').close()
+            recorder = SampleRecorder(directory, records_per_file=1, max_files=2)
+            for i in range(3):
+                recorder.record(1000.0 + i, 'lane-1', 1.0)
+            recorder.close()
+            files = recording_files(directory)
+            self.assertEqual(len(files), 2)
+            self.assertEqual([record.timestamp for path in files for record in read_records(path)], [1001.0, 1002.0])
+            self.assertFalse(os.path.exists(earlier))
+            self.assertTrue(os.path.exists(other))
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.create(name='Phones')
+
+    def test_home_fragments_are_cached_until_catalog_changes(self):
+        self.client.get(reverse('home'))
+        before = cache_stats()
+        with self.assertNumQueries(1):  # only the ListView paginator's count
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Phones')
+        self.assertEqual(cache_stats()['fragments.hits'], before.get('fragments.hits', 0) + 2)
+
+        Category.objects.create(name='Laptops')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Laptops')
+
+
+def create_seller(username):
+    user = User.objects.create_user(username, is_seller=True)
+    profile = UserProfile.objects.create(user=user, user_type='seller')
+    return Seller.objects.create(user_profile=profile, company_name=f'{username} Ltd', gst_number=username)
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        seller = create_seller('seller')
+        category = Category.objects.create(name='Footwear')
+        self.shoes = Product.objects.create(
+            seller=seller, category=category, name='Red Running Shoes', description='Lightweight trainers',
+            price=50, stock=5,
+        )
+        self.socks = Product.objects.create(
+            seller=seller, category=category, name='Sports Socks', description='Pairs well with running shoes',
+            price=5, stock=5,
+        )
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query))
+
+    def test_prefix_matches_ranked_by_name(self):
+        self.assertEqual(self.search('run sho'), [self.shoes, self.socks])
+        self.assertEqual(self.search('sock'), [self.socks])
+        self.assertEqual(self.search('"OR -'), [])
+
+    def test_filters_apply_before_the_limit(self):
+        Product.objects.filter(pk=self.shoes.pk).update(stock=0)
+        in_stock = search_products(Product.objects.filter(stock__gt=0), 'running shoes')
+        self.assertEqual(list(in_stock[:1]), [self.socks])
+        self.assertEqual(list(in_stock.order_by('-price')), [self.socks])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.shoes.name = 'Blue Sandals'
+        self.shoes.description = ''
+        self.shoes.save()
+        self.assertEqual(self.search('sandal'), [self.shoes])
+        self.assertEqual(self.search('red'), [])
+        self.socks.delete()
+        self.assertEqual(self.search('socks'), [])
+
+
+class CartQueryTests(TestCase):
+
+    def setUp(self):
+        seller = create_seller('seller')
+        category = Category.objects.create(name='Books')
+        self.products = Product.objects.bulk_create(
+            Product(seller=seller, category=category, name=f'Book {i}', description='', price='19.99',
+                    stock=10, image='product_images/book.jpg', discount_percentage=i % 3 * 10)
+            for i in range(30)
+        )
+        self.user = User.objects.create_user('customer', password='secret')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.cart, product=product, quantity=2) for product in self.products[:count]
+        )
+
+    def test_query_count_is_independent_of_cart_size(self):
+        self.fill_cart(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('cart'))
+        CartItem.objects.all().delete()
+        self.fill_cart(30)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(large), 4)  # session, user, cart, items
+        self.assertEqual(response.context['cart_total'], self.cart.get_total())
+        self.assertContains(response, 'Book 29')
+
+    def test_totals_match_python_prices(self):
+        self.fill_cart(3)
+        items = list(self.cart.items.with_prices())
+        self.assertEqual([item.subtotal for item in items],
+                         [effective_price(item.product.price, item.product.discount_percentage) * item.quantity
+                          for item in items])
+        self.assertEqual(items[0].cart_total, sum(item.subtotal for item in items))
+
+    def test_adding_a_product_again_bumps_its_line(self):
+        for _ in range(2):
+            self.client.get(reverse('add_to_cart', args=[self.products[0].id]))
+        self.assertEqual(list(self.cart.items.values_list('product', 'quantity')), [(self.products[0].id, 2)])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=self.products[0])
+
+
+class EffectivePriceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = create_seller('seller')
+        self.category = Category.objects.create(name='Audio')
+
+    def create(self, price, discount, stock=5, **fields):
+        return Product.objects.create(seller=self.seller, category=self.category, name=f'Speaker {price}',
+                                      description='', price=price, discount_percentage=discount, stock=stock,
+                                      image='product_images/speaker.jpg', **fields)
+
+    def stored(self, product):
+        return Product.objects.values_list('effective_price', flat=True).get(pk=product.pk)
+
+    def test_rounds_half_up_exactly(self):
+        for price, discount, expected in [('19.99', 15, '16.99'), ('1.05', 50, '0.53'), ('0.10', 50, '0.05'),
+                                          ('25', 10, '22.50'), ('99.99', 0, '99.99')]:
+            self.assertEqual(self.stored(self.create(price, discount)), Decimal(expected), (price, discount))
+
+    def test_kept_in_step_with_every_kind_of_write(self):
+        product = self.create('200.00', 10)
+        product.discount_percentage = 25
+        product.save(update_fields=['discount_percentage'])
+        self.assertEqual(self.stored(product), Decimal('150.00'))
+
+        [product] = Product.objects.bulk_create([Product(seller=self.seller, category=self.category, name='Bulk',
+                                                         description='', price='80.00', discount_percentage=50,
+                                                         stock=1)])
+        self.assertEqual(self.stored(product), Decimal('40.00'))
+        product.price = Decimal('60.00')
+        Product.objects.bulk_update([product], ['price'])
+        self.assertEqual(self.stored(product), Decimal('30.00'))
+
+        Product.objects.filter(pk=product.pk).update(price=F('price') * 2,
+                                                     discount_percentage=F('discount_percentage') - 40)
+        self.assertEqual(self.stored(product), Decimal('108.00'))
+
+    def test_price_range_sorted_by_price(self):
+        for price, discount, stock in [('600.00', 20, 5), ('520.00', 0, 5), ('100.00', 0, 0), ('300.00', 50, 5),
+                                       ('499.00', 0, 5)]:
+            self.create(price, discount, stock)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product_list'), {'max_price': '500', 'sort': 'price_low'})
+        self.assertEqual([product.effective_price for product in response.context['products']],
+                         [Decimal('150.00'), Decimal('480.00'), Decimal('499.00')])
+        if connection.vendor == 'sqlite':
+            [listing] = [query['sql'] for query in queries if 'ORDER BY "flipkart_app_product"."effective_price"'
+                         in query['sql']]
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {listing}')
+                plan = ' '.join(detail for *_, detail in cursor.fetchall())
+            # Range and order both come off the index: no separate sort step
+            self.assertIn('product_in_stock_price_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+        response = self.client.get(reverse('product_list'), {'min_price': '480', 'sort': 'price_high', 'page': 1})
+        self.assertEqual([product.name for product in response.context['products']],
+                         ['Speaker 520.00', 'Speaker 499.00', 'Speaker 600.00'])
+        self.assertEqual(response.context['query_string'], 'min_price=480&sort=price_high')
+
+
+class FacetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.sellers = [create_seller('north'), create_seller('south')]
+        self.categories = [Category.objects.create(name='Audio'), Category.objects.create(name='Games')]
+        self.products = []
+        for i, (price, discount, stock) in enumerate([('99.00', 0, 5), ('600.00', 20, 5), ('1200.00', 10, 0),
+                                                      ('3000.00', 50, 2), ('450.00', 30, 1), ('8000.00', 0, 3)]):
+            self.products.append(Product.objects.create(
+                seller=self.sellers[i % 2], category=self.categories[i % 3 == 0], name=f'Item {i}', description='',
+                price=price, discount_percentage=discount, stock=stock, is_featured=i < 2,
+                image='product_images/item.jpg',
+            ))
+        customer = User.objects.create_user('customer')
+        for product, rating in zip(self.products, [5, 4, 4, 2]):
+            Review.objects.create(product=product, user=customer, rating=rating, comment='')
+
+    def sql_counts(self, selection):
+        # Every option's count straight from the facets' filters
+        counts = {}
+        for name, facet in FACETS.items():
+            others = Product.objects.filter(selection_q({key: value for key, value in selection.items()
+                                                          if key != name}))
+            keys = {facet.key(row) for row in Product.objects.values(*FIELDS)}
+            counts[name] = {key: count for key in keys if (count := others.filter(facet.q(key)).count())}
+        return counts
+
+    def test_counts_match_sql(self):
+        for selection in [{}, {'stock': {'in'}}, {'stock': {'in'}, 'price': {'500', '1000'}},
+                          {'category': {str(self.categories[0].pk)}, 'rating': {'4', '0'}},
+                          {'seller': {str(self.sellers[1].pk)}, 'discount': {'0', '50'}, 'featured': {'no'}}]:
+            self.assertEqual(facet_counts(selection), self.sql_counts(selection), selection)
+        self.assertEqual(facet_counts({})['price'], {'0': 3, '1000': 2, '5000': 1})
+
+    def test_product_list_filters_and_counts(self):
+        response = self.client.get(reverse('product_list'), {'category': 'Games', 'price': ['0', '500'],
+                                                            'sort': 'price_low'})
+        self.assertEqual([product.name for product in response.context['products']], ['Item 0'])
+        shown = {facet['name']: facet for facet in response.context['facets']}
+        # Each facet counts within the other facets' selections, in-stock products by default
+        self.assertEqual([(option['label'], option['count'], option['selected'])
+                          for option in shown['category']['options']],
+                         [('Audio', 2, False), ('Games', 1, True)])
+        self.assertEqual([(option['label'], option['count'], option['selected'])
+                          for option in shown['price']['options']],
+                         [('Under $500', 1, True), ('$500 to $1000', 0, True), ('$1000 to $2500', 1, False)])
+        self.assertEqual([option['label'] for option in shown['stock']['options']], ['In stock'])
+
+        response = self.client.get(reverse('product_list'), {'stock': 'out', 'min_price': '1000'})
+        self.assertEqual([product.name for product in response.context['products']], ['Item 2'])
+        shown = {facet['name']: facet for facet in response.context['facets']}
+        self.assertEqual([(option['value'], option['count']) for option in shown['seller']['options']],
+                         [(str(self.sellers[0].pk), 1)])
+
+    def test_counts_follow_product_changes(self):
+        facet_counts({})
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = Decimal('2000.00')
+            product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.products[1].pk).update(stock=0, is_featured=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.products[5], user=User.objects.get(username='customer'), rating=3,
+                                  comment='')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[3].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.bulk_create([Product(seller=self.sellers[0], category=self.categories[1], name='New',
+                                                 description='', price='30000.00', stock=1)])
+        for selection in [{}, {'stock': {'in'}}, {'featured': {'yes'}, 'rating': {'3', '5'}}]:
+            # Changes are applied to the index in place, without reading the table again
+            with self.assertNumQueries(0):
+                counts = facet_counts(selection)
+            self.assertEqual(counts, self.sql_counts(selection), selection)
+
+    def test_changes_that_move_no_product_publish_nothing(self):
+        facet_counts({})
+        version = cache.get('facets:version')
+        with self.captureOnCommitCallbacks(execute=True):
+            # Still in stock afterwards, like most checkouts
+            Product.objects.filter(pk=self.products[0].pk).update(stock=F('stock') - 1)
+        self.assertEqual(cache.get('facets:version'), version)
+        # Fields the facets do not read skip the facet index entirely
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+            Product.objects.filter(pk=self.products[0].pk).update(is_packed=True)
+        self.products[0].is_packed = False
+        with self.captureOnCommitCallbacks() as more_callbacks:
+            self.products[0].save(update_fields=['is_packed'])
+        self.assertEqual(callbacks + more_callbacks, [])
+
+    def test_other_processes_replay_published_changes(self):
+        facet_counts({})
+        behind, version = FacetIndex.build(), facets._version
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.products[0].pk).update(stock=0)
+        # A process that has not seen the change yet applies it from the cache, without reading the table
+        with unittest.mock.patch.multiple(facets, _index=behind, _version=version):
+            with self.assertNumQueries(0):
+                counts = facet_counts({'stock': {'in'}})
+        self.assertEqual(counts, self.sql_counts({'stock': {'in'}}))
+
+    def test_rebuilds_when_changes_are_missing(self):
+        facet_counts({})
+        # A change whose rows have expired from the cache
+        cache.incr('facets:version')
+        Product.objects.filter(pk=self.products[2].pk).update(stock=4)
+        with facets._building:
+            # While another thread rebuilds, requests carry on with the old index
+            with self.assertNumQueries(0):
+                facet_counts({})
+        with self.assertNumQueries(1):
+            counts = facet_counts({'stock': {'in'}})
+        self.assertEqual(counts, self.sql_counts({'stock': {'in'}}))
+
+    def test_facet_fields_match(self):
+        self.assertEqual({Product._meta.get_field(field).name for field in FIELDS} - {'id'} | {'price'},
+                         FACET_FIELDS)
+
+    def test_bitmaps_behave_like_sets(self):
+        rng = random.Random(7)
+        # Sparse and dense chunks, either side of the 2**16 chunk boundaries
+        sets = [set(rng.sample(range(300_000), 50)), set(rng.sample(range(200_000), 30_000)),
+                set(range(65_000, 70_000)), set(), {0, 65_535, 65_536}]
+        for packed in (True, False):
+            for a in sets:
+                for b in sets:
+                    first, second = Bitmap(list(a), packed), Bitmap(list(b))
+                    self.assertEqual(list(first & second), sorted(a & b))
+                    self.assertEqual(list(first | second), sorted(a | b))
+                    self.assertEqual(first.and_count(second), len(a & b))
+                    self.assertEqual(len(first), len(a))
+        # Growing a chunk past the array limit and shrinking it back
+        bitmap, ids = Bitmap([5]), {5}
+        for product_id in rng.sample(range(65_536), 3000):
+            bitmap.add(product_id)
+            ids.add(product_id)
+        for product_id in rng.sample(sorted(ids), 2900):
+            bitmap.discard(product_id)
+            ids.discard(product_id)
+        bitmap.discard(70_000)
+        self.assertEqual(list(bitmap), sorted(ids))
+        self.assertTrue(all(product_id in bitmap for product_id in ids))
+        self.assertNotIn(70_000, bitmap)
+
+    def test_only_the_biggest_sellers_are_counted(self):
+        big = create_seller('big')
+        for i in range(4):
+            Product.objects.create(seller=big, category=self.categories[0], name=f'Big {i}', description='',
+                                   price='10.00', stock=1, image='product_images/item.jpg')
+        index = FacetIndex.build()
+        with unittest.mock.patch.object(FACETS['seller'], 'top', 1):
+            self.assertEqual(index.counts({})['seller'], {str(big.pk): 4})
+            self.assertEqual(index.counts({'seller': {str(self.sellers[0].pk)}})['seller'],
+                             {str(big.pk): 4, str(self.sellers[0].pk): 3})
+
+
+class CheckoutTests(TestCase):
+
+    def setUp(self):
+        seller = create_seller('seller')
+        category = Category.objects.create(name='Games')
+        self.hot = Product.objects.create(seller=seller, category=category, name='Console', description='',
+                                          price='300.00', stock=2, discount_percentage=10)
+        self.other = Product.objects.create(seller=seller, category=category, name='Controller', description='',
+                                            price='40.00', stock=9)
+        self.user = User.objects.create_user('customer')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def checkout(self):
+        return place_order(self.user, 'Somewhere', '9999999999', 'Cash on Delivery')
+
+    def test_order_reserves_stock_and_empties_cart(self):
+        CartItem.objects.create(cart=self.cart, product=self.hot, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.other, quantity=3)
+        order = self.checkout()
+        self.assertEqual(order.total_amount, Decimal('660.00'))
+        self.assertEqual(sorted(order.items.values_list('price', 'quantity')),
+                         [(Decimal('40.00'), 3), (Decimal('270.00'), 2)])
+        self.hot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.hot.stock, self.other.stock), (0, 6))
+        self.assertFalse(self.cart.items.exists())
+
+    def test_discounted_whole_number_prices_are_charged_exactly(self):
+        # SQLite stores 25.00 as the integer 25; 25 * 90 / 100 must not become 22
+        kettle = Product.objects.create(seller=self.hot.seller, category=self.hot.category, name='Kettle',
+                                        description='', price='25', stock=5, discount_percentage=10)
+        CartItem.objects.create(cart=self.cart, product=kettle, quantity=3)
+        [item] = CartItem.objects.filter(cart=self.cart).with_prices()
+        self.assertEqual((item.unit_price, item.cart_total), (Decimal('22.50'), Decimal('67.50')))
+        order = self.checkout()
+        self.assertEqual(order.total_amount, Decimal('67.50'))
+        self.assertEqual(list(order.items.values_list('price', flat=True)), [Decimal('22.50')])
+
+    def test_out_of_stock_changes_nothing(self):
+        CartItem.objects.create(cart=self.cart, product=self.other, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.hot, quantity=3)
+        with self.assertRaises(OutOfStock) as raised:
+            self.checkout()
+        self.assertEqual(raised.exception.products, [self.hot])
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.stock, 9)
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertFalse(self.user.orders.exists())
+
+    def test_order_lines_cost_one_stock_update_each(self):
+        def checkout_queries(*lines):
+            for product, quantity in lines:
+                CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+            with unittest.mock.patch('flipkart_app.signals.refresh_products') as refresh_products, \
+                    self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                self.checkout()
+            refresh_products.assert_called_once_with([product.id for product, _ in lines])
+            return [query['sql'] for query in queries.captured_queries]
+
+        checkout_queries((self.other, 1))  # creates the seller's daily stats row
+        one_line = checkout_queries((self.hot, 1))
+        two_lines = checkout_queries((self.hot, 1), (self.other, 2))
+        self.assertEqual(len(two_lines), len(one_line) + 1)
+        # No read of the product rows beside the conditional UPDATEs
+        product_queries = [sql.split()[0] for sql in two_lines
+                           if re.match(r'(SELECT .* FROM|UPDATE) "flipkart_app_product"', sql)]
+        self.assertEqual(product_queries, ['UPDATE', 'UPDATE'])
+
+    def test_submitting_twice_places_one_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.other, quantity=1)
+        self.checkout()
+        with self.assertRaises(EmptyCart):
+            self.checkout()
+        self.assertEqual(self.user.orders.count(), 1)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.stock, 8)
+
+    def test_items_ordered_meanwhile_roll_back(self):
+        CartItem.objects.create(cart=self.cart, product=self.hot, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.other, quantity=1)
+        bulk_create = OrderItem.objects.bulk_create
+
+        def racing_bulk_create(objs):
+            # Another checkout of the same cart removes an item in between
+            CartItem.objects.filter(product=self.other).delete()
+            return bulk_create(objs)
+
+        with unittest.mock.patch.object(OrderItem.objects, 'bulk_create', racing_bulk_create):
+            with self.assertRaises(CartChanged):
+                self.checkout()
+        self.hot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.hot.stock, self.other.stock), (2, 9))
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertFalse(self.user.orders.exists())
+
+
+class OrderHistoryTests(TestCase):
+
+    def setUp(self):
+        seller = create_seller('seller')
+        product = Product.objects.create(seller=seller, category=Category.objects.create(name='Tea'), name='Chai',
+                                         description='', price='4.00', stock=100, image='product_images/chai.jpg')
+        self.user = User.objects.create_user('customer')
+        orders = Order.objects.bulk_create(
+            Order(user=self.user, total_amount='8.00', shipping_address='Here', phone_number='1',
+                  payment_method='Cash on Delivery')
+            for _ in range(25)
+        )
+        OrderItem.objects.bulk_create(OrderItem(order=order, product=product, quantity=2, price='4.00')
+                                      for order in orders)
+        self.client.force_login(self.user)
+
+    def test_api_pages_through_every_order_once(self):
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(4):  # session, user, orders, items with products
+                data = self.client.get(reverse('order_history_api'), {'after': cursor} if cursor else {}).json()
+            seen += [order['id'] for order in data['orders']]
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(self.user.orders.values_list('id', flat=True), reverse=True))
+        self.assertEqual(data['orders'][0]['items'][0]['name'], 'Chai')
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get(reverse('order_history_api'), {'after': '!!'}).status_code, 400)
+        self.assertRedirects(self.client.get(reverse('order_history'), {'after': '!!'}), reverse('order_history'))
+
+
+class SellerMetricsTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_seller('seller')
+        other = create_seller('other')
+        category = Category.objects.create(name='Kitchen')
+        self.pan = Product.objects.create(seller=self.seller, category=category, name='Pan', description='',
+                                          price='25.00', stock=50)
+        self.knife = Product.objects.create(seller=other, category=category, name='Knife', description='',
+                                            price='10.00', stock=50)
+        self.customer = User.objects.create_user('customer')
+        self.cart = Cart.objects.create(user=self.customer)
+
+    def buy(self, **quantities):
+        for name, quantity in quantities.items():
+            CartItem.objects.create(cart=self.cart, product=getattr(self, name), quantity=quantity)
+        return place_order(self.customer, 'Here', '1', 'Cash on Delivery')
+
+    def stats(self, seller=None):
+        row = SellerDailyStats.objects.get(seller=seller or self.seller)
+        return row.orders, row.revenue, row.units, row.pending, row.cancelled
+
+    def test_checkout_and_status_changes_update_rollups(self):
+        self.buy(pan=2, knife=1)
+        order = self.buy(pan=1)
+        self.assertEqual(self.stats(), (2, Decimal('75.00'), 3, 2, 0))
+        self.assertEqual(self.stats(self.knife.seller), (1, Decimal('10.00'), 1, 1, 0))
+
+        order.status = Order.STATUS_CANCELLED
+        order.save()
+        self.assertEqual(self.stats(), (2, Decimal('50.00'), 2, 1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self.stats(), (1, Decimal('50.00'), 2, 1, 0))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_days_follow_the_local_timezone(self):
+        late, early = self.buy(pan=1), self.buy(pan=2)
+        # 23:30 and 00:30 in Kolkata, on either side of local midnight
+        SellerOrder.objects.filter(order=late).update(created_at=datetime(2024, 5, 1, 18, 0, tzinfo=dt_timezone.utc))
+        SellerOrder.objects.filter(order=early).update(created_at=datetime(2024, 5, 1, 19, 0, tzinfo=dt_timezone.utc))
+        refresh_day(self.seller.pk, date(2024, 5, 1))
+        refresh_day(self.seller.pk, date(2024, 5, 2))
+        self.assertEqual(
+            sorted(SellerDailyStats.objects.filter(seller=self.seller, date__year=2024).values_list('date', 'units')),
+            [(date(2024, 5, 1), 1), (date(2024, 5, 2), 2)],
+        )
+
+    def test_reconcile_repairs_drift(self):
+        order = self.buy(pan=2, knife=1)
+        Order.objects.filter(pk=order.pk).update(status=Order.STATUS_SHIPPED)  # bypasses signals
+        SellerOrder.objects.filter(seller=self.knife.seller).delete()
+        counts = reconcile()
+        self.assertEqual((counts['links_created'], counts['links_updated'], counts['days_updated']), (1, 1, 2))
+        self.assertEqual(self.stats(), (1, Decimal('50.00'), 2, 0, 0))
+        self.assertEqual(reconcile(), dict.fromkeys(counts, 0))
+
+    def test_dashboard_queries_do_not_grow_with_orders(self):
+        self.client.force_login(self.seller.user_profile.user)
+        self.buy(pan=1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('seller_dashboard'))
+        for _ in range(30):
+            self.buy(pan=1)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('seller_dashboard'))
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(response.context['total_orders'], 31)
+        self.assertEqual(len(response.context['orders']), 25)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+
+MODEL_VERSIONS = {'object_detection': 'v1', 'expiry_check': 'v1', 'freshness_check': 'v1'}
+
+
+class ProcessingQueueTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, ML_MODEL_VERSIONS=MODEL_VERSIONS)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        os.mkdir(os.path.join(media.name, 'packing_images'))
+        self.seller = create_seller('seller')
+        product = Product.objects.create(seller=self.seller, category=Category.objects.create(name='Fruit'),
+                                         name='Apples', description='', price='3.00', stock=100)
+        customer = User.objects.create_user('customer')
+        cart = Cart.objects.create(user=customer)
+        self.orders = []
+        for i in range(6):
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            order = place_order(customer, 'Here', '1', 'Cash on Delivery')
+            order.packing_image = f'packing_images/order-{i}.jpg'
+            order.save()
+            with open(order.packing_image.path, 'wb') as image:
+                image.write(f'image {i}'.encode())
+            self.orders.append(order)
+        self.client.force_login(self.seller.user_profile.user)
+
+    def test_queue_serves_oldest_first_and_prefetches_the_next(self):
+        response = self.client.get(reverse('order_processing'))
+        self.assertEqual(response.context['order'], self.orders[0])
+        self.assertEqual([row.order_id for row in response.context['upcoming']], [o.id for o in self.orders[1:4]])
+        self.assertEqual(sorted(VerificationJob.objects.values_list('order_id', flat=True)),
+                         [o.id for o in self.orders[:4]])
+
+        self.client.post(reverse('complete_processing', args=[self.orders[0].id]))
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].status, Order.STATUS_PROCESSING)
+        response = self.client.get(reverse('order_processing'))
+        self.assertEqual(response.context['order'], self.orders[1])
+
+    def test_metrics_count_prefetched_verdicts(self):
+        self.client.get(reverse('order_processing'))
+        # The prefetched job finishes before the seller gets to the order
+        order = self.orders[1]
+        result = dict.fromkeys(MODEL_VERSIONS, 'ok')
+        store_results(order, image_hash(order), result, MODEL_VERSIONS)
+        VerificationJob.objects.filter(order=order).update(
+            status=VerificationJob.STATUS_DONE, result=result, finished_at=timezone.now(),
+        )
+        self.client.post(reverse('complete_processing', args=[self.orders[0].id]))
+        self.client.get(reverse('order_processing'))
+        self.client.post(reverse('complete_processing', args=[self.orders[1].id]))
+
+        metrics = self.client.get(reverse('processing_metrics')).json()
+        self.assertEqual((metrics['opened'], metrics['completed']), (2, 2))
+        self.assertEqual(metrics['prefetch_hit_rate'], 0.5)
+        self.assertEqual(metrics['verdict_wait_p50'], 0.0)
+        self.assertTrue(OrderProcessingLog.objects.get(order=self.orders[1]).verdict_ready_at_open)
+
+
+class ModelRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.registry = ml_models.ModelRegistry()
+        for name in ['small', 'large']:
+            path = os.path.join(directory.name, f'{name}.pt')
+            torch.save(torch.nn.Linear(4, 2), path)
+            self.registry.register(name, path)
+
+    def test_models_load_on_first_use(self):
+        self.assertFalse(self.registry.is_loaded('small'))
+        self.assertFalse(self.registry.metrics()['small']['loaded'])
+        model = self.registry.get('small')
+        self.assertIs(self.registry.get('small'), model)
+        self.assertFalse(model.training)
+        self.assertFalse(any(parameter.requires_grad for parameter in model.parameters()))
+        metrics = self.registry.metrics()
+        self.assertTrue(metrics['small']['loaded'] and metrics['small']['mmapped'])
+        self.assertEqual(metrics['small']['parameter_bytes'], (4 * 2 + 2) * 4)
+        self.assertFalse(self.registry.is_loaded('large'))
+
+    def test_preload_loads_everything_and_freezes_the_heap(self):
+        with unittest.mock.patch.object(ml_models.gc, 'freeze') as freeze:
+            self.registry.preload()
+        self.assertTrue(all(self.registry.is_loaded(name) for name in ['small', 'large']))
+        freeze.assert_called_once_with()
+
+    def test_legacy_names_resolve_through_the_registry(self):
+        model = torch.nn.Identity()
+        self.registry.install('expiry_check', model)
+        with unittest.mock.patch.object(ml_models, 'registry', self.registry):
+            self.assertIs(ml_models.expiry_check_model, model)
+            with self.assertRaises(AttributeError):
+                ml_models.no_such_model
+
+
+class BrightnessModel(torch.nn.Module):
+    """Predicts class 1 for dark images; remembers the size of every batch it ran on."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def forward(self, images):
+        self.batches.append(len(images))
+        brightness = images.mean(dim=(1, 2, 3))
+        return torch.stack([brightness, 1 - brightness], dim=1)
+
+
+def install_brightness_models(test):
+    snapshot = ml_models.registry.snapshot()
+    test.addCleanup(ml_models.registry.restore, snapshot)
+    models = {name: BrightnessModel() for name in ml_models.CHECK_LABELS}
+    for name, model in models.items():
+        ml_models.registry.install(name, model)
+    return models
+
+
+class ModelBatchingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.models = install_brightness_models(self)
+        self.dark, self.light = Image.new('RGB', (8, 8)), Image.new('RGB', (8, 8), 'white')
+
+    def test_each_model_runs_once_on_the_inputs_that_need_it(self):
+        results = ml_models.run_ml_model_batch(
+            [self.dark, self.light, self.dark],
+            models=[list(ml_models.CHECK_LABELS), ['expiry_check'], ['freshness_check']],
+        )
+        self.assertEqual(results, [
+            {'object_detection': 'Packed', 'expiry_check': 'Valid', 'freshness_check': 'Fresh'},
+            {'expiry_check': 'Expired'},
+            {'freshness_check': 'Fresh'},
+        ])
+        self.assertEqual({name: model.batches for name, model in self.models.items()},
+                         {'object_detection': [1], 'expiry_check': [2], 'freshness_check': [2]})
+
+    def test_labels_come_from_check_labels(self):
+        with unittest.mock.patch.dict(ml_models.CHECK_LABELS, {'expiry_check': ('fine', 'off')}, clear=True):
+            self.assertEqual(ml_models.run_ml_model_batch([self.light, self.dark]),
+                             [{'expiry_check': 'off'}, {'expiry_check': 'fine'}])
+        self.assertEqual(self.models['object_detection'].batches, [])
+
+    def test_concurrent_requests_are_coalesced(self):
+        batches = []
+
+        def run_batch(items):
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        # A full batch runs at once, without waiting out max_wait
+        batcher = ml_models.MicroBatcher(run_batch, max_batch_size=3, max_wait=5)
+        futures = [batcher.submit(i) for i in range(3)]
+        self.assertEqual([future.result(timeout=1) for future in futures], [0, 2, 4])
+        self.assertEqual(batches, [[0, 1, 2]])
+
+    def test_a_bad_input_fails_alone(self):
+        def run_batch(items):
+            if 'bad' in items:
+                raise ValueError('bad image')
+            return [item.upper() for item in items]
+
+        batcher = ml_models.MicroBatcher(run_batch, max_batch_size=3, max_wait=5)
+        futures = [batcher.submit(item) for item in ['a', 'bad', 'c']]
+        self.assertEqual(futures[0].result(timeout=1), 'A')
+        self.assertEqual(futures[2].result(timeout=1), 'C')
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout=1)
+
+
+class VerificationResultTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, ML_MODEL_VERSIONS=MODEL_VERSIONS)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.models = install_brightness_models(self)
+        cache = unittest.mock.patch.object(ml_models, 'tensor_cache', ml_models.TensorCache(1024 * 1024))
+        cache.start()
+        self.addCleanup(cache.stop)
+        os.mkdir(os.path.join(media.name, 'packing_images'))
+        self.order = Order.objects.create(
+            user=User.objects.create_user('customer'), total_amount='5.00', shipping_address='Here',
+            phone_number='1', payment_method='Cash on Delivery', packing_image='packing_images/order.png',
+        )
+        self.save_image('black')
+
+    def save_image(self, color):
+        Image.new('RGB', (8, 8), color).save(self.order.packing_image.path)
+
+    def verify(self):
+        """Run the order's verification like an inference worker; returns the models that ran."""
+        for model in self.models.values():
+            model.batches.clear()
+        result, job = verify_order(self.order)
+        if job is not None:
+            run_jobs(claim_jobs('test', 1))
+            job.refresh_from_db()
+            result = job.result
+        return result, sorted(name for name, model in self.models.items() if model.batches)
+
+    def test_results_are_reused_until_the_image_or_a_model_changes(self):
+        verdict = {'object_detection': 'Packed', 'expiry_check': 'Valid', 'freshness_check': 'Fresh'}
+        self.assertEqual(self.verify(), (verdict, sorted(MODEL_VERSIONS)))
+        self.assertEqual(self.verify(), (verdict, []))
+
+        with override_settings(ML_MODEL_VERSIONS={**MODEL_VERSIONS, 'expiry_check': 'v2'}):
+            self.assertEqual(self.verify(), (verdict, ['expiry_check']))
+            self.assertEqual(prune_stale_results(), 1)
+
+        self.save_image('white')
+        os.utime(self.order.packing_image.path, ns=(1, 1))  # a different mtime, however fast the rewrite
+        self.assertEqual(self.verify()[0], {'object_detection': 'Unpacked', 'expiry_check': 'Expired',
+                                            'freshness_check': 'Not Fresh'})
+
+    def test_versions_follow_the_checkpoint_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'expmrp.pt'), 'wb') as checkpoint:
+                checkpoint.write(b'weights')
+            with override_settings(ML_MODEL_DIR=directory, ML_MODEL_VERSIONS={'object_detection': 'v7'}):
+                versions = model_versions()
+        self.assertEqual(versions['object_detection'], 'v7')
+        self.assertEqual(versions['expiry_check'], hashlib.sha256(b'weights').hexdigest()[:16])
+        self.assertIsNone(versions['freshness_check'])
+        self.assertEqual(missing_models({'object_detection': 'Packed'}, versions),
+                         ['expiry_check', 'freshness_check'])
+
+    def test_default_checkpoints_apply_when_none_are_configured(self):
+        with override_settings():
+            del settings.ML_MODEL_CHECKPOINTS
+            self.assertEqual(model_checkpoints(), DEFAULT_MODEL_CHECKPOINTS)
+            self.assertEqual(list(model_versions()), list(DEFAULT_MODEL_CHECKPOINTS))
+
+    def test_decoded_images_are_cached_by_content(self):
+        digest = image_hash(self.order)
+        with unittest.mock.patch.object(ml_models.Image, 'open', wraps=Image.open) as decode:
+            first = ml_models.load_image(self.order, digest)
+            self.assertIs(ml_models.load_image(self.order, digest), first)
+            ml_models.load_image(self.order)
+        self.assertEqual(decode.call_count, 2)
+
+
+class TensorCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_tensors_are_evicted(self):
+        cache = ml_models.TensorCache(max_bytes=3 * 16)
+        for key in 'abc':
+            cache.put(key, torch.zeros(4))  # 16 bytes each
+        cache.get('a')
+        cache.put('d', torch.zeros(4))
+        self.assertEqual([key for key in 'abcd' if cache.get(key) is not None], ['a', 'c', 'd'])
+        self.assertEqual(cache.current_bytes, 48)
+        cache.put('huge', torch.zeros(13))
+        self.assertIsNone(cache.get('huge'))
+        self.assertEqual(len(cache), 3)
+
+
+class VerificationQueueTests(TestCase):
+
+    def setUp(self):
+        self.seller = create_seller('seller')
+        customer = User.objects.create_user('customer')
+        self.orders = [
+            Order.objects.create(user=customer, total_amount='5.00', shipping_address='Here', phone_number='1',
+                                 payment_method='Cash on Delivery')
+            for _ in range(3)
+        ]
+
+    def test_an_order_has_one_active_job(self):
+        job = submit_verification(self.orders[0])
+        self.assertEqual(submit_verification(self.orders[0]), job)
+        # A request that lost the race still ends up with the job the winner queued
+        with unittest.mock.patch.object(QuerySet, 'first', return_value=None):
+            self.assertEqual(submit_verification(self.orders[0]), job)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VerificationJob.objects.create(order=self.orders[0], status=VerificationJob.STATUS_RUNNING)
+        job.status = VerificationJob.STATUS_DONE
+        job.save()
+        self.assertNotEqual(submit_verification(self.orders[0]), job)
+
+    @override_settings(ML_QUEUE_MAX_SIZE=2)
+    def test_full_queue_refuses_new_orders(self):
+        first = submit_verification(self.orders[0])
+        submit_verification(self.orders[1])
+        with self.assertRaises(QueueFull):
+            submit_verification(self.orders[2])
+        self.assertEqual(submit_verification(self.orders[0]), first)
+
+    def test_workers_claim_each_job_once_oldest_first(self):
+        jobs = [submit_verification(order) for order in self.orders]
+        self.assertEqual(claim_jobs('worker-a', 2), jobs[:2])
+        self.assertEqual(claim_jobs('worker-b', 2), jobs[2:])
+        self.assertEqual(claim_jobs('worker-c', 2), [])
+        self.assertEqual(
+            list(VerificationJob.objects.order_by('id').values_list('status', 'claimed_by')),
+            [('running', 'worker-a'), ('running', 'worker-a'), ('running', 'worker-b')],
+        )
+        self.assertEqual(requeue_stale_jobs(), 3)
+        self.assertEqual(claim_jobs('worker-c', 5), jobs)
+
+    def test_status_reports_the_job_to_the_order_sellers(self):
+        job = submit_verification(self.orders[0])
+        url = reverse('verification_status', args=[job.id])
+        self.client.force_login(self.orders[0].user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.seller.user_profile.user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        SellerOrder.objects.create(seller=self.seller, order=self.orders[0], status='pending',
+                                   created_at=timezone.now(), revenue='5.00', units=1)
+        self.assertEqual(self.client.get(url).json(), {
+            'id': job.id, 'order_id': self.orders[0].id, 'status': 'queued', 'finished': False,
+            'result': None, 'error': '',
+        })
+        VerificationJob.objects.filter(pk=job.pk).update(status=VerificationJob.STATUS_DONE, result={'a': 'ok'})
+        self.assertEqual(self.client.get(url).json()['result'], {'a': 'ok'})
+        self.assertEqual(self.client.get(reverse('verification_status', args=[job.id + 99])).status_code, 404)
+
+
+class SharedOrderProcessingTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Hardware')
+        self.sellers = [create_seller('north'), create_seller('south')]
+        customer = User.objects.create_user('customer')
+        cart = Cart.objects.create(user=customer)
+        for seller in self.sellers:
+            product = Product.objects.create(seller=seller, category=category, name=f'{seller} tool',
+                                             description='', price='9.00', stock=5)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        self.order = place_order(customer, 'Here', '1', 'Cash on Delivery')
+
+    def statuses(self):
+        self.order.refresh_from_db()
+        links = dict(SellerOrder.objects.filter(order=self.order).values_list('seller_id', 'status'))
+        return self.order.status, [links[seller.pk] for seller in self.sellers]
+
+    def test_order_moves_on_once_every_seller_is_done(self):
+        north, south = self.sellers
+        complete_order(north, self.order)
+        self.assertEqual(self.statuses(), ('pending', ['processing', 'pending']))
+        self.assertEqual(SellerDailyStats.objects.get(seller=north).pending, 0)
+        self.assertEqual(SellerDailyStats.objects.get(seller=south).pending, 1)
+        # Rebuilding the links keeps the seller who is done
+        reconcile()
+        self.assertEqual(self.statuses(), ('pending', ['processing', 'pending']))
+
+        complete_order(south, self.order)
+        self.assertEqual(self.statuses(), ('processing', ['processing', 'processing']))
+
+    def test_throughput_counts_time_with_an_order_open(self):
+        north = self.sellers[0]
+        start = timezone.now() - timedelta(hours=3)
+        for opened, completed in [(0, 20), (10, 30), (120, 150)]:  # minutes; the first two overlap
+            order = Order.objects.create(user=self.order.user, total_amount=0, shipping_address='Here',
+                                         phone_number='1', payment_method='Cash on Delivery')
+            log = OrderProcessingLog.objects.create(seller=north, order=order)
+            OrderProcessingLog.objects.filter(pk=log.pk).update(
+                opened_at=start + timedelta(minutes=opened), completed_at=start + timedelta(minutes=completed),
+            )
+        self.assertEqual(queue_metrics(north)['orders_per_hour'], 3)
+
+
+class RatingAggregateTests(TestCase):
+
+    def setUp(self):
+        seller = create_seller('seller')
+        category = Category.objects.create(name='Audio')
+        self.product = Product.objects.create(seller=seller, category=category, name='Headphones',
+                                              description='', price='80.00', stock=5)
+        self.other = Product.objects.create(seller=seller, category=category, name='Speaker',
+                                            description='', price='60.00', stock=5)
+        self.users = [User.objects.create_user(f'reviewer{i}') for i in range(12)]
+
+    def aggregates(self, product=None):
+        product = Product.objects.get(pk=(product or self.product).pk)
+        return product.review_count, product.rating_sum, [count for _, count, _ in product.rating_histogram]
+
+    def test_aggregates_follow_review_changes(self):
+        reviews = [Review.objects.create(product=self.product, user=user, rating=rating, comment='')
+                   for user, rating in zip(self.users, [5, 4, 4])]
+        self.assertEqual(self.aggregates(), (3, 13, [1, 2, 0, 0, 0]))
+
+        reviews[1].rating = 1
+        reviews[1].save()
+        reviews[2].product = self.other
+        reviews[2].save()
+        reviews[0].delete()
+        self.assertEqual(self.aggregates(), (1, 1, [0, 0, 0, 0, 1]))
+        self.assertEqual(self.aggregates(self.other), (1, 4, [0, 1, 0, 0, 0]))
+        self.assertEqual(Product.objects.get(pk=self.other.pk).average_rating, 4)
+
+    def test_aggregates_follow_queryset_and_cascade_deletes(self):
+        for user, rating in zip(self.users, [5, 4, 2, 2]):
+            Review.objects.create(product=self.product, user=user, rating=rating, comment='')
+        Review.objects.filter(rating=2).delete()
+        self.assertEqual(self.aggregates(), (2, 9, [1, 1, 0, 0, 0]))
+        self.users[0].delete()
+        self.assertEqual(self.aggregates(), (1, 4, [0, 1, 0, 0, 0]))
+
+    def test_invalid_ratings_are_rejected(self):
+        for rating in [0, 6, 2.0, '3']:
+            with self.assertRaises(ValueError):
+                Review.objects.create(product=self.product, user=self.users[0], rating=rating, comment='')
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(self.aggregates(), (0, 0, [0] * 5))
+
+    def test_reconcile_repairs_drift(self):
+        Review.objects.bulk_create(Review(product=self.product, user=user, rating=3, comment='')
+                                   for user in self.users[:4])  # bypasses the Review signals
+        Product.objects.filter(pk=self.other.pk).update(review_count=7)
+        self.assertEqual(reconcile_ratings(), 2)
+        self.assertEqual(self.aggregates(), (4, 12, [0, 0, 4, 0, 0]))
+        self.assertEqual(self.aggregates(self.other), (0, 0, [0] * 5))
+        self.assertEqual(reconcile_ratings(), 0)
+
+    def test_detail_page_pages_through_reviews(self):
+        for i, user in enumerate(self.users):
+            Review.objects.create(product=self.product, user=user, rating=5, comment=f'Review {i}')
+        response = self.client.get(reverse('product_detail', args=[self.product.pk]))
+        self.assertEqual(len(response.context['reviews']), 10)
+        self.assertContains(response, 'Review 11')
+        response = self.client.get(reverse('product_detail', args=[self.product.pk]),
+                                   {'reviews_after': response.context['next_reviews']})
+        self.assertEqual([review.comment for review in response.context['reviews']], ['Review 1', 'Review 0'])
+        self.assertIsNone(response.context['next_reviews'])
+
+
+try:
+    import scipy
+except ImportError:
+    scipy = None
+
+
+@unittest.skipUnless(scipy, 'needs scipy')
+class RelatedProductsTests(TestCase):
+
+    def setUp(self):
+        seller = create_seller('seller')
+        category = Category.objects.create(name='Camping')
+        self.tent, self.stove, self.lamp, self.mug, self.chair = Product.objects.bulk_create(
+            Product(seller=seller, category=category, name=name, description='', price='10.00', stock=10)
+            for name in ['Tent', 'Stove', 'Lamp', 'Mug', 'Chair']
+        )
+        customer = User.objects.create_user('customer')
+        baskets = [[self.tent, self.stove], [self.tent, self.stove, self.lamp], [self.tent, self.lamp],
+                   [self.stove, self.mug], [self.tent, self.stove]]
+        for basket in baskets:
+            order = Order.objects.create(user=customer, total_amount='0', shipping_address='',
+                                         phone_number='', payment_method='')
+            OrderItem.objects.bulk_create(OrderItem(order=order, product=p, quantity=1, price='10.00') for p in basket)
+        WishlistItem.objects.create(user=customer, product=self.tent)
+        WishlistItem.objects.create(user=customer, product=self.chair)
+
+    def test_related_products_ranked_by_co_occurrence(self):
+        products, rows, _ = compute_related_products(k=2)
+        self.assertEqual(products, 5)
+        ranked = list(RelatedProduct.objects.filter(product=self.tent).order_by('rank')
+                      .values_list('related_id', flat=True))
+        self.assertEqual(ranked, [self.stove.id, self.lamp.id])
+        self.assertEqual(list(RelatedProduct.objects.filter(product=self.chair).values_list('related_id', flat=True)),
+                         [self.tent.id])
+
+        with self.assertNumQueries(1):
+            related = list(Product.objects.filter(related_from__product=self.stove)
+                           .order_by('related_from__rank')[:4])
+        self.assertEqual(related, [self.tent, self.mug])
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        Category.objects.create(name='Garden')
+
+    def test_requests_get_server_timing_and_feed_histograms(self):
+        response = self.client.get(reverse('home'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="3 queries", tpl;dur=[\d.]+, '
+                                 r'cache;desc="0 hits, 3 misses"$')
+        self.client.get(reverse('home'))
+        home = self.client.get(reverse('request_metrics')).json()['home']
+        self.assertEqual(home['total_ms']['count'], 2)
+        self.assertEqual(home['cache_hits']['buckets']['le_2'], 1)
+
+    def test_proxied_requests_get_no_timings(self):
+        proxied = {'REMOTE_ADDR': '127.0.0.1', 'HTTP_X_FORWARDED_FOR': '203.0.113.7'}
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home'), **proxied))
+        self.assertEqual(self.client.get(reverse('request_metrics'), **proxied).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(reverse('home'), **proxied))
+        self.assertEqual(self.client.get(reverse('request_metrics'), **proxied).status_code, 200)
+
+    def test_ml_runs_are_charged_to_the_request(self):
+        install_brightness_models(self)
+        image = Image.new('RGB', (8, 8))
+        middleware = RequestMetricsMiddleware(lambda request: JsonResponse(ml_models.run_ml_model(image)))
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual(json.loads(response.content)['expiry_check'], 'Valid')
+        self.assertRegex(response['Server-Timing'], r'ml-run_ml_model;dur=[\d.]+$')
+        # The shared batch itself is timed in the background histograms
+        self.assertEqual(metrics.snapshot()[BACKGROUND]['ml.decode_ms']['count'], 1)
+
+        seller = create_seller('seller')
+        order = Order.objects.create(user=seller.user_profile.user, total_amount='5.00', shipping_address='Here',
+                                     phone_number='1', payment_method='Cash on Delivery')
+        self.client.force_login(seller.user_profile.user)
+        response = self.client.get(reverse('verification_summary', args=[order.id]))
+        self.assertRegex(response['Server-Timing'], r'ml-verify_order;dur=[\d.]+$')
+
+    def test_spans_outside_requests_are_background(self):
+        with span('ml.test'):
+            pass
+        self.assertEqual(metrics.snapshot()[BACKGROUND]['ml.test_ms']['count'], 1)
+
+
+class LoadTestHarnessTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def install_stub_models(self):
+        # Later tests get the real models back
+        stubs = loadtest.stub_models()
+        versions = stubs.__enter__()
+        self.addCleanup(stubs.__exit__, None, None, None)
+        overrides = override_settings(ML_MODEL_VERSIONS=versions)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_every_scenario_runs_on_seeded_data(self):
+        counts = loadtest.seed(products=50, customers=3, sellers=2, orders=4, reviews=1, images=2)
+        self.assertEqual((counts['products'], counts['orders'], counts['images']), (50, 12, 2))
+        dataset = loadtest.Dataset(random.Random(0))
+        session = loadtest.Session(dataset.customers[0], dataset.sellers[0], dataset, random.Random(0))
+        self.install_stub_models()
+        for scenario in loadtest.SCENARIOS.values():
+            scenario(session)
+        run_jobs(claim_jobs('test', 10))
+        self.assertEqual(set(session.samples), set(loadtest.SCENARIOS))
+        self.assertEqual([(name, status) for name, rows in session.samples.items() for _, _, status in rows
+                          if status >= 400], [])
+        self.assertEqual(VerificationJob.objects.get().status, VerificationJob.STATUS_DONE)
+
+    def test_stub_models_are_removed_afterwards(self):
+        from .ml_models import registry
+
+        before = registry.snapshot()
+        with loadtest.stub_models():
+            self.assertTrue(all(registry.is_loaded(name) for name in registry.names()))
+        self.assertEqual(registry.snapshot(), before)
+
+    def test_compare_reports_regressions(self):
+        baseline = {'home': loadtest.summarize([(0.010, 5, 200)] * 10, 1.0)}
+        self.assertEqual(loadtest.compare({'home': loadtest.summarize([(0.011, 5, 200)] * 10, 1.0)}, baseline), [])
+        slower = loadtest.summarize([(0.020, 7, 200)] * 5 + [(0.020, 7, 500)], 1.0)
+        self.assertEqual(loadtest.compare({'home': slower}, baseline), [
+            'home: p95 10.0 -> 20.0 ms',
+            'home: throughput 10.0 -> 6.0/s',
+            'home: queries per request 5.0 -> 7.0',
+            'home: errors 0 -> 1',
+        ])
+
+
+class DatabaseConfigTests(TestCase):
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+    def test_sqlite_connections_get_the_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 10000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA journal_mode')
+            self.assertNotEqual(cursor.fetchone()[0], 'wal')  # only with DJANGO_SQLITE_JOURNAL_MODE
+
+    @override_settings(CATALOG_READ_DATABASE='replica')
+    def test_only_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with catalog_reads():
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_read(Cart), 'default')
+            self.assertEqual(router.db_for_write(Product), 'default')
+
+
+_FULL_SCAN = re.compile(r'SCAN (?!\(|CONSTANT ROW)\S+$')
+
+
+class QueryPlanTests(TestCase):
+    """Every query the main pages run must be answered from an index, not a full table scan."""
+
+    maxDiff = None
+
+    def setUp(self):
+        cache.clear()
+        self.seller = create_seller('seller')
+        category = Category.objects.create(name='Kitchen')
+        self.product = Product.objects.create(seller=self.seller, category=category, name='Kettle',
+                                              description='Boils water', price='25.00', stock=10, is_featured=True,
+                                              image='product_images/kettle.jpg')
+        self.customer = User.objects.create_user('customer')
+        UserProfile.objects.create(user=self.customer)
+        CartItem.objects.create(cart=Cart.objects.create(user=self.customer), product=self.product, quantity=1)
+        self.order = place_order(self.customer, 'Here', '1', 'Cash on Delivery')
+        CartItem.objects.create(cart=self.customer.cart, product=self.product, quantity=1)
+        Review.objects.create(product=self.product, user=self.customer, rating=5, comment='Fast')
+        WishlistItem.objects.create(user=self.customer, product=self.product)
+        # The facet index reads the whole table once per process, not per request
+        facet_counts({})
+
+    def full_scans(self, user, *urls):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            for url in urls:
+                self.assertLess(self.client.get(url).status_code, 400, url)
+        scans = set()
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                # 'SCAN <table>' without 'USING ... INDEX' reads every row of the table;
+                # subqueries, constant rows and the search index's virtual table are not tables
+                scans.update((detail, sql) for *_, detail in cursor.fetchall()
+                             if _FULL_SCAN.match(detail))
+        return sorted(scans)
+
+    def test_customer_pages_use_indexes(self):
+        self.assertEqual(self.full_scans(
+            self.customer,
+            reverse('home'),
+            reverse('product_list') + '?category=Kitchen',
+            reverse('product_list') + '?search=kettle',
+            reverse('product_list') + '?max_price=500&sort=price_low',
+            reverse('product_list') + '?category=Kitchen&min_price=10&sort=price_high',
+            reverse('product_detail', args=[self.product.id]),
+            reverse('cart'),
+            reverse('checkout'),
+            reverse('order_history'),
+            reverse('order_history_api'),
+            reverse('order_confirmation', args=[self.order.id]),
+            reverse('track_order', args=[self.order.id]),
+            reverse('wishlist'),
+            reverse('profile'),
+        ), [])
+
+    def test_seller_pages_use_indexes(self):
+        self.assertEqual(self.full_scans(
+            self.seller.user_profile.user,
+            reverse('seller_dashboard'),
+            reverse('manage_products'),
+            reverse('order_processing'),
+            reverse('processing_metrics'),
+        ), [])
+
+
+class NPlusOneTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = create_seller('seller')
+        category = Category.objects.create(name='Kitchen')
+        self.products = [
+            Product.objects.create(seller=seller, category=category, name=f'Kettle {i}', description='',
+                                   price='25.00', stock=10, is_featured=True, image='product_images/kettle.jpg')
+            for i, seller in enumerate([self.seller, create_seller('other'), self.seller])
+        ]
+        self.customer = User.objects.create_user('customer')
+        UserProfile.objects.create(user=self.customer)
+        cart = Cart.objects.create(user=self.customer)
+        for _ in range(2):
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=product) for product in self.products)
+            self.order = place_order(self.customer, 'Here', '1', 'Cash on Delivery')
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product) for product in self.products)
+        for product in self.products:
+            Review.objects.create(product=product, user=self.customer, rating=4, comment='Fine')
+            WishlistItem.objects.create(user=self.customer, product=product)
+        self.client.force_login(self.customer)
+
+    @detect_nplusone()
+    def test_customer_pages(self):
+        for url in [
+            reverse('home'),
+            reverse('product_list') + '?category=Kitchen',
+            reverse('product_list') + '?search=kettle',
+            reverse('product_detail', args=[self.products[0].id]),
+            reverse('cart'),
+            reverse('checkout'),
+            reverse('order_history'),
+            reverse('order_history_api'),
+            reverse('order_confirmation', args=[self.order.id]),
+            reverse('track_order', args=[self.order.id]),
+            reverse('wishlist'),
+            reverse('profile'),
+        ]:
+            self.assertLess(self.client.get(url).status_code, 400, url)
+
+    def test_seller_pages(self):
+        self.client.force_login(self.seller.user_profile.user)
+        with detect_nplusone():
+            for url in [
+                reverse('seller_dashboard'),
+                reverse('manage_products'),
+                reverse('order_processing'),
+                reverse('processing_metrics'),
+            ]:
+                self.assertLess(self.client.get(url).status_code, 400, url)
+
+    def test_reports_attribute_template_and_code(self):
+        items = list(OrderItem.objects.filter(order=self.order))
+        with self.assertRaisesRegex(NPlusOneError, r'via OrderItem\.product, from flipkart_app/models\.py:\d+ in __str__'):
+            with detect_nplusone():
+                [str(item) for item in items]
+
+        template = engines.all()[0].from_string('{% for item in items %}\n{{ item.product.name }}\n{% endfor %}')
+        with self.assertLogs('flipkart_app.nplusone', 'WARNING') as logs:
+            with detect_nplusone(fail=False) as collector:
+                template.render({'items': OrderItem.objects.filter(order=self.order)})
+                self.client.get(reverse('home'))
+        [finding] = collector.findings()
+        self.assertEqual((finding.view, finding.count, finding.attribute, finding.template),
+                         ('(outside requests)', 3, 'OrderItem.product', '<unknown source>, line 2'))
+        [record] = logs.records
+        self.assertIn('(outside requests)', record.getMessage())
+        self.assertIn('<unknown source>, line 2', record.getMessage())
+
+    def test_same_parameters_and_separate_requests_are_not_n_plus_one(self):
+        with detect_nplusone() as collector:
+            for _ in range(3):
+                Product.objects.get(id=self.products[0].id)
+                self.client.get(reverse('product_detail', args=[self.products[0].id]))
+        self.assertEqual(collector.findings(), [])
+
+
+class AdminChangelistTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Kitchen')
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """count customers, each with a seller, product, cart line, order, review and wishlist item."""
+        for _ in range(count):
+            n = User.objects.count()
+            seller = create_seller(f'seller{n}')
+            product = Product.objects.create(seller=seller, category=self.category, name=f'Pan {n}',
+                                             description='', price='25.00', stock=50, discount_percentage=10,
+                                             image='product_images/pan.jpg')
+            customer = User.objects.create_user(f'customer{n}', email=f'customer{n}@example.com')
+            Registration.objects.create(user=customer)
+            Customer.objects.create(user_profile=UserProfile.objects.create(user=customer))
+            cart = Cart.objects.create(user=customer)
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+            place_order(customer, 'Here', '1', 'Cash on Delivery')
+            CartItem.objects.create(cart=cart, product=product, quantity=3)
+            Review.objects.create(product=product, user=customer, rating=4, comment='Fine')
+            WishlistItem.objects.create(user=customer, product=product)
+
+    def changelist_queries(self, model, query=''):
+        url = reverse(f'admin:flipkart_app_{model._meta.model_name}_changelist') + query
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries), response
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        self.add_rows(1)
+        models = [model for model in admin.site._registry if model._meta.app_label == 'flipkart_app']
+        few = {model: self.changelist_queries(model)[0] for model in models}
+        self.add_rows(4)
+        with detect_nplusone():
+            many = {model: self.changelist_queries(model)[0] for model in models}
+        self.assertEqual(many, few)
+        # session, user, statistics lookup, count, rows, plus the category filter's choices for products
+        self.assertEqual((few[Product], few[Order], few[Cart], few[Registration]), (6, 5, 5, 5))
+
+    def test_annotated_totals_and_prices(self):
+        self.add_rows(2)
+        _, response = self.changelist_queries(Cart, '?o=2')
+        self.assertEqual([cart.get_total() for cart in response.context['cl'].result_list],
+                         [Decimal('67.50')] * 2)
+        _, response = self.changelist_queries(Product)
+        self.assertEqual([product.discounted_price() for product in response.context['cl'].result_list],
+                         [Decimal('22.50')] * 2)
+
+    def test_seller_filter_is_an_autocomplete_box(self):
+        self.add_rows(2)
+        product = Product.objects.first()
+        _, response = self.changelist_queries(Product, f'?is_featured__exact=0&seller__id__exact={product.seller_id}')
+        self.assertEqual(list(response.context['cl'].result_list), [product])
+        self.assertContains(response, 'data-ajax--url="/admin/autocomplete/"')
+        self.assertContains(response, f'<option value="{product.seller_id}" selected>{product.seller}</option>',
+                            html=True)
+        self.assertContains(response, '<input type="hidden" name="is_featured__exact" value="0">', html=True)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'reads SQLite statistics')
+    def test_large_tables_are_counted_from_statistics(self):
+        self.add_rows(3)
+        self.assertIsNone(estimated_count(Product.objects.all()))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_count(Product.objects.all()), 3)
+        self.assertIsNone(estimated_count(Product.objects.filter(stock__gt=0)))
+        with unittest.mock.patch('flipkart_app.admin.ESTIMATED_COUNT_ABOVE', 2), \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('-id'), 10).count, 3)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
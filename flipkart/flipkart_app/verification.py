@@ -0,0 +1,110 @@
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import VerificationResult
+
+# Checkpoint file of each model in the model directory; override with
+# ML_MODEL_CHECKPOINTS in settings
+DEFAULT_MODEL_CHECKPOINTS = {
+    'object_detection': 'packed_and_unpacked.pt',
+    'expiry_check': 'expmrp.pt',
+    'freshness_check': 'fruit.pth',
+}
+DEFAULT_MODEL_DIR = Path(__file__).resolve().parent / 'ml_models'
+
+# (path, mtime, size) -> sha256, so unchanged files are only hashed once per process
+_file_hashes = {}
+_FILE_HASH_CACHE_SIZE = 1024
+
+
+def _file_hash(path):
+    """Return the sha256 of a file's contents, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        if len(_file_hashes) >= _FILE_HASH_CACHE_SIZE:
+            _file_hashes.clear()
+        _file_hashes[key] = digest
+    return digest
+
+
+def model_checkpoints():
+    """{model name: checkpoint file} for every configured model."""
+    return getattr(settings, 'ML_MODEL_CHECKPOINTS', DEFAULT_MODEL_CHECKPOINTS)
+
+
+def image_hash(order):
+    """Content hash of the order's packing image, or None if it has none."""
+    path = order.product_image_path
+    return _file_hash(path) if path else None
+
+
+def model_versions():
+    """
+    Current version of every configured model: the pinned version from
+    ML_MODEL_VERSIONS, otherwise a short hash of the checkpoint file.
+    """
+    versions = {}
+    pinned = getattr(settings, 'ML_MODEL_VERSIONS', {})
+    model_dir = Path(getattr(settings, 'ML_MODEL_DIR', DEFAULT_MODEL_DIR))
+    for name, filename in model_checkpoints().items():
+        version = pinned.get(name)
+        if version is None:
+            digest = _file_hash(model_dir / filename)
+            version = digest[:16] if digest else None
+        versions[name] = version
+    return versions
+
+
+def cached_results(order, digest, versions=None):
+    """
+    Return {model name: label} for every model that already has a stored result
+    for this image and the model's current version.
+    """
+    versions = versions or model_versions()
+    rows = VerificationResult.objects.filter(
+        order=order, image_hash=digest, model_name__in=list(versions)
+    ).values_list('model_name', 'model_version', 'label')
+    return {name: label for name, version, label in rows if versions.get(name) == version}
+
+
+def missing_models(results, versions):
+    """Models whose result still has to be computed."""
+    return [name for name in versions if name not in results]
+
+
+def store_results(order, digest, results, versions):
+    """Persist freshly computed labels for the given image and model versions."""
+    VerificationResult.objects.bulk_create(
+        [
+            VerificationResult(
+                order=order, image_hash=digest, model_name=name,
+                model_version=versions[name], label=str(label),
+            )
+            for name, label in results.items()
+            if versions.get(name) is not None
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def prune_stale_results(versions=None):
+    """Delete stored results produced by a model version that is no longer current."""
+    versions = versions or model_versions()
+    deleted = 0
+    for name, version in versions.items():
+        if version is not None:
+            deleted += VerificationResult.objects.filter(model_name=name).exclude(model_version=version).delete()[0]
+    return deleted
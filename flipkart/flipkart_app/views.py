@@ -1,48 +1,208 @@
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
 from django.contrib.auth import login, logout, authenticate
+from django.db.models import F, Prefetch, Sum
 from django.views.generic import ListView, DetailView
-from .models import Product, Category, Cart, CartItem, Order, OrderItem, Review, Seller, WishlistItem, UserProfile, User
+from .models import Product, Category, Cart, CartItem, Order, OrderItem, Review, Seller, WishlistItem, UserProfile, User, VerificationJob, SellerDailyStats, SellerOrder
 from django.http import JsonResponse
-import torch
-from .ml_models import run_ml_model  # Assuming you have a module that handles ML models
+from django.conf import settings
+from .catalog_cache import get_categories
+from .checkout import CartChanged, EmptyCart, OutOfStock, place_order
+from .database import catalog_reads
+from .facets import FACETS, BandFacet, Bitmap, facet_counts, price_range, selection_q
+from .inference import QueueFull, verify_order
+from .instrumentation import is_internal_request, metrics, span
+from .pagination import InvalidCursor, keyset_page
+from .processing_queue import complete_order, next_orders, open_order, prefetch, queue_metrics
+from . import scale_feed
+from .search import search_product_ids, search_products
+
+# Product pages can be served from the read replica, template rendering included
+class CatalogReadMixin:
+    def dispatch(self, request, *args, **kwargs):
+        with catalog_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+# ?sort= options of the product list, each read in order off an in-stock partial index
+PRODUCT_SORTS = {
+    'price_low': ('effective_price', 'id'),
+    'price_high': ('-effective_price', '-id'),
+    'newest': ('-id',),
+}
 
 # Home View for both customers and sellers
-class HomeView(ListView):
+class HomeView(CatalogReadMixin, ListView):
     model = Product
     template_name = 'flipkart_app/home.html'
     context_object_name = 'products'
     paginate_by = 12
 
     def get_queryset(self):
-        queryset = Product.objects.filter(stock__gt=0)
-        category = self.request.GET.get('category')
+        # Newest first, read straight off the in-stock partial indexes
+        queryset = self.filter_products(Product.objects.order_by('-id'))
         search = self.request.GET.get('search')
+        # Price range and sort are on the stored discounted price
+        min_price, max_price = self.price_param('min_price'), self.price_param('max_price')
+        if min_price is not None:
+            queryset = queryset.filter(effective_price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(effective_price__lte=max_price)
+        if search:
+            queryset = search_products(queryset, search)
+        sort = PRODUCT_SORTS.get(self.request.GET.get('sort'))
+        if sort:
+            queryset = queryset.order_by(*sort)
+        return queryset
+
+    def filter_products(self, queryset):
+        queryset = queryset.filter(stock__gt=0)
+        category = self.request.GET.get('category')
         if category:
             queryset = queryset.filter(category__name=category)
-        if search:
-            queryset = queryset.filter(Q(name__icontains=search) | Q(description__icontains=search))
         return queryset
 
+    def price_param(self, name):
+        try:
+            price = Decimal(self.request.GET.get(name, ''))
+        except InvalidOperation:
+            return None
+        return price if price.is_finite() else None
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        # Both are only evaluated if the cached home-page fragments have to be re-rendered
+        context['categories'] = get_categories
+        context['featured_products'] = Product.objects.filter(is_featured=True, stock__gt=0).order_by('-id')[:8]
+        context['min_price'] = self.request.GET.get('min_price', '')
+        context['max_price'] = self.request.GET.get('max_price', '')
+        context['sort_by'] = self.request.GET.get('sort', '')
+        # The filters, for the pagination links
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['query_string'] = query.urlencode()
         return context
 
+# Product list with facet filters. The products come from SQL as on the home page;
+# the counts next to every facet option come from the in-memory facet index.
+class ProductListView(HomeView):
+    template_name = 'flipkart_app/product_list.html'
+
+    def get(self, request, *args, **kwargs):
+        self.selection = self.get_selection()
+        return super().get(request, *args, **kwargs)
+
+    def get_selection(self):
+        """{facet: {option keys}} ticked in the query string; only products in stock unless it says otherwise."""
+        selection = {}
+        for name in FACETS:
+            values = self.request.GET.getlist(name)
+            if name == 'category':
+                # Category options are named in the URL, as on the home page
+                ids = {category.name: str(category.pk) for category in get_categories()}
+                keys = {ids[value] for value in values if value in ids}
+            elif name == 'stock' and not values:
+                keys = {'in'}
+            else:
+                keys = {value for value in values if self.valid_option(name, value)}
+            if keys:
+                selection[name] = keys
+        return selection
+
+    def valid_option(self, name, value):
+        facet = FACETS[name]
+        if isinstance(facet, BandFacet):
+            return value.isdigit() and int(value) in facet.bounds
+        if name in ('seller', 'rating'):
+            return value.isdigit()
+        return facet.option_label(value) is not None
+
+    def filter_products(self, queryset):
+        return queryset.filter(selection_q(self.selection))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['facets'] = self.get_facets()
+        return context
+
+    def get_facets(self):
+        # Counts within the price range and search results, like the product list itself
+        within = None
+        min_price, max_price = self.price_param('min_price'), self.price_param('max_price')
+        if min_price is not None or max_price is not None:
+            within = price_range(min_price, max_price)
+        search = self.request.GET.get('search')
+        if search:
+            matches = Bitmap(search_product_ids(Product.objects.all(), search), packed=False)
+            within = matches if within is None else within & matches
+        counts = facet_counts(self.selection, within)
+
+        categories = {str(category.pk): category.name for category in get_categories()}
+        # The seller facet only counts the biggest sellers (see FACET_TOP_SELLERS)
+        sellers = set(counts['seller']) | self.selection.get('seller', set())
+        seller_names = dict(
+            Seller.objects.filter(pk__in=sellers).values_list('pk', 'company_name')
+        ) if sellers else {}
+
+        facets = []
+        for name, facet in FACETS.items():
+            selected = self.selection.get(name, set())
+            if name == 'category':
+                keys = list(categories)
+            elif name == 'seller':
+                keys = sorted(sellers, key=lambda key: (-counts['seller'].get(key, 0), key))
+            elif isinstance(facet, BandFacet):
+                keys = [str(bound) for bound in facet.bounds]
+            elif name == 'rating':
+                keys = [str(stars) for stars in range(5, -1, -1)]
+            else:
+                keys = list(counts[name])
+            options = []
+            for key in keys:
+                count = counts[name].get(key, 0)
+                if not count and key not in selected:
+                    continue
+                if name == 'category':
+                    value, label = categories[key], categories[key]
+                elif name == 'seller':
+                    value, label = key, seller_names.get(int(key), key)
+                else:
+                    value, label = key, facet.option_label(key)
+                options.append({'value': value, 'label': label, 'count': count, 'selected': key in selected})
+            if options:
+                facets.append({'name': name, 'label': facet.label, 'options': options})
+        return facets
+
 # Product Detail View
-class ProductDetailView(DetailView):
+class ProductDetailView(CatalogReadMixin, DetailView):
     model = Product
     template_name = 'flipkart_app/product_detail.html'
     context_object_name = 'product'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['related_products'] = Product.objects.filter(
-            category=self.object.category
-        ).exclude(id=self.object.id)[:4]
-        context['reviews'] = Review.objects.filter(product=self.object)
+        # Precomputed by compute_related_products; one read on the (product, rank) index
+        related = list(
+            Product.objects.filter(related_from__product=self.object).order_by('related_from__rank')[:4]
+        )
+        if not related:
+            # Nothing bought or wishlisted together yet
+            related = Product.objects.filter(category_id=self.object.category_id).exclude(id=self.object.id)[:4]
+        context['related_products'] = related
+        context['categories'] = get_categories
+        # Newest reviews first, a page at a time; the totals come from the product's stored aggregates
+        reviews = Review.objects.filter(product=self.object).select_related('user')
+        try:
+            context['reviews'], context['next_reviews'] = keyset_page(
+                reviews, self.request.GET.get('reviews_after'), settings.REVIEWS_PAGE_SIZE
+            )
+        except InvalidCursor:
+            context['reviews'], context['next_reviews'] = keyset_page(reviews, None, settings.REVIEWS_PAGE_SIZE)
         return context
 
 # User registration for both customers and sellers
@@ -126,19 +286,27 @@ def user_logout(request):
 @login_required
 def cart_detail(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all() if not created else []
-    
-    return render(request, 'flipkart_app/cart.html', {'cart': cart, 'cart_items': cart_items})
+    # One joined query for the items, their products, subtotals and the total
+    cart_items = list(cart.items.with_prices()) if not created else []
+    cart_total = cart_items[0].cart_total if cart_items else 0
+
+    return render(request, 'flipkart_app/cart.html', {
+        'cart': cart,
+        'cart_items': cart_items,
+        'cart_total': cart_total,
+        'cart_item_count': len(cart_items),  # saves base.html counting them again
+    })
 
 # Add item to cart
 @login_required
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     cart, created = Cart.objects.get_or_create(user=request.user)
+    # (cart, product) is unique, so concurrent adds end up on the same row and
+    # the increment happens in SQL rather than overwriting each other
     cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
     if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+        CartItem.objects.filter(id=cart_item.id).update(quantity=F('quantity') + 1)
     messages.success(request, f'{product.name} added to cart.')
     return redirect('cart')
 
@@ -166,9 +334,6 @@ def update_cart(request, item_id):
 @login_required
 def checkout(request):
     cart = get_object_or_404(Cart, user=request.user)
-    if cart.items.count() == 0:
-        messages.error(request, 'Your cart is empty.')
-        return redirect('cart')
 
     if request.method == 'POST':
         shipping_address = request.POST.get('shipping_address')
@@ -177,40 +342,87 @@ def checkout(request):
         if not shipping_address or not phone_number or not payment_method:
             messages.error(request, 'Please fill in all required fields.')
             return redirect('checkout')
-        
-        order = Order.objects.create(
-            user=request.user,
-            shipping_address=shipping_address,
-            phone_number=phone_number,
-            payment_method=payment_method,
-            total_amount=cart.get_total()
-        )
-
-        for item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.discounted_price(),
-            )
 
-        cart.items.all().delete()
+        try:
+            order = place_order(request.user, shipping_address, phone_number, payment_method)
+        except EmptyCart:
+            messages.error(request, 'Your cart is empty.')
+            return redirect('cart')
+        except CartChanged:
+            messages.error(request, 'Your cart changed while the order was being placed. Please check it and try again.')
+            return redirect('cart')
+        except OutOfStock as e:
+            names = ', '.join(product.name for product in e.products)
+            messages.error(request, f'Sorry, there is not enough stock left for: {names}.')
+            return redirect('cart')
 
         return redirect('order_confirmation', order_id=order.id)
 
-    return render(request, 'flipkart_app/checkout.html', {'cart': cart})
+    cart_items = list(cart.items.with_prices())
+    if not cart_items:
+        messages.error(request, 'Your cart is empty.')
+        return redirect('cart')
+
+    return render(request, 'flipkart_app/checkout.html', {
+        'cart': cart,
+        'cart_items': cart_items,
+        'cart_total': cart_items[0].cart_total,
+        'cart_item_count': len(cart_items),
+    })
 
 # Order confirmation
 @login_required
 def order_confirmation(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(
+        Order.objects.prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product'))),
+        id=order_id, user=request.user,
+    )
     return render(request, 'flipkart_app/order_confirmation.html', {'order': order})
 
 # Order history for customers
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'flipkart_app/order_history.html', {'orders': orders})
+    try:
+        orders, next_cursor = _order_history_page(request)
+    except InvalidCursor:
+        return redirect('order_history')
+    return render(request, 'flipkart_app/order_history.html', {'orders': orders, 'next_cursor': next_cursor})
+
+# The same pages as JSON; pass the returned `next` back as ?after= for the following page
+@login_required
+def order_history_api(request):
+    try:
+        orders, next_cursor = _order_history_page(request)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'orders': [
+            {
+                'id': order.id,
+                'status': order.status,
+                'total_amount': str(order.total_amount),
+                'created_at': order.created_at.isoformat(),
+                'items': [
+                    {
+                        'product_id': item.product_id,
+                        'name': item.product.name,
+                        'quantity': item.quantity,
+                        'price': str(item.price),
+                    }
+                    for item in order.items.all()
+                ],
+            }
+            for order in orders
+        ],
+        'next': next_cursor,
+    })
+
+def _order_history_page(request):
+    # Two queries per page whatever the page or order count: orders, then items joined to products
+    orders = Order.objects.filter(user=request.user).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
+    return keyset_page(orders, request.GET.get('after'), settings.ORDER_HISTORY_PAGE_SIZE)
 
 # User profile view
 @login_required
@@ -233,12 +445,13 @@ def profile(request):
             messages.success(request, 'Profile updated successfully.')
         else:
             messages.error(request, 'Please fill in all fields.')
-    return render(request, 'flipkart_app/user_profile.html', {'profile': profile})
+    reviews = request.user.review_set.select_related('product').order_by('-created_at')[:3]
+    return render(request, 'flipkart_app/user_profile.html', {'profile': profile, 'reviews': reviews})
 
 # Wishlist management
 @login_required
 def wishlist(request):
-    wishlist_items = WishlistItem.objects.filter(user=request.user)
+    wishlist_items = WishlistItem.objects.filter(user=request.user).select_related('product')
     return render(request, 'flipkart_app/wishlist.html', {'wishlist_items': wishlist_items})
 
 @login_required
@@ -261,9 +474,25 @@ def seller_dashboard(request):
         return redirect('home')
 
     seller = request.user.seller
-    orders = Order.objects.filter(items__product__seller=seller).distinct()
+    # Totals come from the daily rollups and the order list from the seller-order
+    # links, so neither joins through order items however many orders there are
+    daily_stats = SellerDailyStats.objects.filter(seller=seller)
+    totals = daily_stats.aggregate(
+        total_sales=Sum('revenue'), total_orders=Sum('orders'), units_sold=Sum('units'), pending_orders=Sum('pending'),
+    )
+    try:
+        orders, next_cursor = keyset_page(
+            SellerOrder.objects.filter(seller=seller), request.GET.get('after'), settings.SELLER_ORDERS_PAGE_SIZE
+        )
+    except InvalidCursor:
+        return redirect('seller_dashboard')
 
-    return render(request, 'flipkart_app/seller_dashboard.html', {'orders': orders})
+    return render(request, 'Seller/seller_dashboard.html', {
+        **{name: value or 0 for name, value in totals.items()},
+        'daily_stats': daily_stats.order_by('-date')[:14],
+        'orders': orders,
+        'next_cursor': next_cursor,
+    })
 
 # Manage products for sellers
 @login_required
@@ -273,7 +502,7 @@ def manage_products(request):
         return redirect('home')
 
     products = Product.objects.filter(seller=request.user.seller)
-    return render(request, 'flipkart_app/manage_products.html', {'products': products})
+    return render(request, 'Seller/manage_products.html', {'products': products})
 
 # Add or edit product for sellers
 @login_required
@@ -322,8 +551,8 @@ def add_edit_product(request, product_id=None):
 
         return redirect('manage_products')
 
-    categories = Category.objects.all()
-    return render(request, 'flipkart_app/add_edit_product.html', {'product': product, 'categories': categories})
+    categories = get_categories()
+    return render(request, 'Seller/add_edit_product.html', {'product': product, 'categories': categories})
 
 # Order processing with ML integration for sellers
 @login_required
@@ -332,8 +561,52 @@ def order_processing(request):
         messages.error(request, 'You do not have permission to process orders.')
         return redirect('home')
 
-    orders = Order.objects.filter(items__product__seller=request.user.seller, status=Order.STATUS_PENDING)
-    return render(request, 'flipkart_app/order_processing.html', {'orders': orders})
+    # The queue shows one pending order at a time, oldest first; ?after=<cursor> skips ahead
+    seller = request.user.seller
+    try:
+        rows, skip_cursor = next_orders(seller, request.GET.get('after'))
+    except InvalidCursor:
+        return redirect('order_processing')
+
+    context = {'order': None, 'upcoming': rows[1:], 'skip_cursor': skip_cursor, 'metrics': queue_metrics(seller)}
+    if rows:
+        order = rows[0].order
+        try:
+            result, job, _ = open_order(seller, order)
+        except QueueFull:
+            result, job = None, None
+            messages.error(request, 'The verification queue is full. Please try again shortly.')
+        # While the seller works on this order, the next ones are verified in the background
+        prefetch([row.order for row in rows[1:]])
+        context.update(
+            order=order,
+            items=order.items.filter(product__seller=seller).select_related('product'),
+            result=result,
+            job=job,
+        )
+    return render(request, 'Seller/order_processing.html', context)
+
+# Mark the current order of the processing queue as processed and move on to the next
+@login_required
+def complete_processing(request, order_id):
+    if not request.user.is_seller:
+        messages.error(request, 'You do not have permission to process orders.')
+        return redirect('home')
+    if request.method != 'POST':
+        return redirect('order_processing')
+
+    seller = request.user.seller
+    link = get_object_or_404(SellerOrder, seller=seller, order_id=order_id, status=Order.STATUS_PENDING)
+    complete_order(seller, link.order)
+    messages.success(request, f'Order #{order_id} moved to processing.')
+    return redirect('order_processing')
+
+# Throughput and time-to-verdict of the seller's processing queue
+@login_required
+def processing_metrics(request):
+    if not request.user.is_seller:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    return JsonResponse(queue_metrics(request.user.seller))
 
 # ML Integration Interface for order verification
 @login_required
@@ -343,8 +616,93 @@ def ml_integration(request, order_id):
         return redirect('home')
 
     order = get_object_or_404(Order, id=order_id)
-    verification_result = run_ml_model(order)
-    return render(request, 'flipkart_app/verification_summary.html', {'order': order, 'result': verification_result})
+    job_id = request.GET.get('job')
+    if job_id:
+        job = get_object_or_404(VerificationJob, id=job_id, order=order)
+        return render(request, 'Seller/verification_summary.html', {'order': order, 'job': job, 'result': job.result})
+
+    # Reuse stored results while the image and the models are unchanged
+    try:
+        with span('ml.verify_order'):
+            result, job = verify_order(order)
+    except QueueFull:
+        messages.error(request, 'The verification queue is full. Please try again shortly.')
+        response = render(request, 'Seller/verification_summary.html', {'order': order, 'job': None}, status=503)
+        response['Retry-After'] = '5'
+        return response
+    return render(request, 'Seller/verification_summary.html', {'order': order, 'job': job, 'result': result})
+
+# Status of a verification job on one of the seller's orders, polled by the verification summary page
+@login_required
+def verification_status(request, job_id):
+    if not request.user.is_seller:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+
+    job = get_object_or_404(VerificationJob, id=job_id, order__seller_orders__seller=request.user.seller)
+    return JsonResponse({
+        'id': job.id,
+        'order_id': job.order_id,
+        'status': job.status,
+        'finished': job.is_finished,
+        'result': job.result,
+        'error': job.error,
+    })
+
+# Per-view timing histograms recorded by RequestMetricsMiddleware in this process
+def request_metrics(request):
+    if not is_internal_request(request):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    return JsonResponse(metrics.snapshot())
+
+# Latest settled weight from the packing scale, or from one station's scale with
+# ?station=<id>, served by `manage.py run_scales`, which owns the serial ports.
+# Pass ?after=<timestamp>&wait=<seconds> to wait up to SCALE_READING_MAX_WAIT
+# seconds for a newer stable reading; clients ask again after that rather than
+# holding a worker.
+@login_required
+def scale_reading(request):
+    if not request.user.is_seller:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+
+    station_id = request.GET.get('station')
+    if station_id:
+        if station_id not in settings.SCALE_STATIONS:
+            return JsonResponse({'error': 'Unknown station.'}, status=404)
+    elif settings.SCALE_PORT:
+        station_id = scale_feed.DEFAULT_STATION
+    else:
+        return JsonResponse({'error': 'No scale is configured.'}, status=404)
+
+    try:
+        after = float(request.GET.get('after', 0))
+        wait = max(min(float(request.GET.get('wait', 0)), settings.SCALE_READING_MAX_WAIT), 0)
+    except ValueError:
+        return JsonResponse({'error': 'after and wait must be numbers.'}, status=400)
+    try:
+        reading = scale_feed.reading(station_id, after, wait)
+    except (scale_feed.FeedUnavailable, KeyError):
+        # run_scales is not running, or not reading this scale
+        reading = {'order_id': None, 'connected': False, 'weight': None, 'timestamp': None, 'latest_weight': None}
+    return JsonResponse({'station': station_id or None, **reading})
+
+# Bind the order being packed at a station to that station's scale
+@login_required
+def bind_station_order(request, station_id, order_id):
+    if not request.user.is_seller:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+
+    order = get_object_or_404(Order, id=order_id)
+    if station_id not in settings.SCALE_STATIONS:
+        return JsonResponse({'error': 'Unknown station.'}, status=404)
+    try:
+        scale_feed.bind_order(station_id, order.id)
+    except scale_feed.FeedUnavailable:
+        return JsonResponse({'error': 'The scales are not being read.'}, status=503)
+    except KeyError:
+        return JsonResponse({'error': 'Unknown station.'}, status=404)
+    return JsonResponse({'station': station_id, 'order_id': order.id})
 
 # Order tracking for customers
 @login_required